@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import threading
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from prometheus_client import Counter
+from pydantic import BaseModel
+
+
+COALESCED_REQUESTS = Counter(
+    "api_coalesced_requests_total",
+    "Requests answered with the result of an identical in-flight request",
+    ["endpoint"],
+)
+COALESCE_TIMEOUTS = Counter(
+    "api_coalesce_timeouts_total",
+    "Requests that stopped waiting on an in-flight request and ran their own query",
+    ["endpoint"],
+)
+
+
+LEADER, SHARED, TIMED_OUT = "leader", "shared", "timed_out"
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls into one execution.
+
+    The first caller for a key (the leader) runs the function; callers arriving
+    while it is in flight wait for and share its result or exception. A follower
+    that waits longer than `timeout` stops waiting and runs the function itself,
+    so one stuck query can't stall every request for the key.
+
+    Sync callers (threadpool handlers) and async callers (event-loop handlers)
+    are tracked separately, since they can't wait on each other's primitives.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: float = 30.0) -> Tuple[Any, str]:
+        """Run `fn` once per in-flight `key`. Returns (result, outcome): LEADER, SHARED or TIMED_OUT."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result, SHARED
+            return fn(), TIMED_OUT  # leader is too slow; don't keep waiting
+
+        try:
+            call.result = fn()
+            return call.result, LEADER
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[Any]], timeout: float = 30.0) -> Tuple[Any, str]:
+        """Async counterpart of `do` for coroutine functions."""
+        future = self._async_calls.get(key)
+        if future is not None:
+            try:
+                # shield: a follower timing out must not cancel the leader's work
+                return await asyncio.wait_for(asyncio.shield(future), timeout), SHARED
+            except asyncio.TimeoutError:
+                return await fn(), TIMED_OUT
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_calls[key] = future
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, LEADER
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved so an unawaited future doesn't warn
+            raise
+        finally:
+            del self._async_calls[key]
+
+
+_flights = SingleFlight()
+
+
+def _normalize(value: Any) -> Hashable:
+    """
+    Hashable form of a parameter. Values are otherwise keyed as given: handlers echo
+    their inputs, so '2024-01-01' and '2024-01-01T00:00:00Z' must not share a result.
+    """
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, BaseModel):
+        return value.model_dump_json()
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_normalize(v) for v in value)
+    return value
+
+
+def request_key(fn: Callable, kwargs: Dict[str, Any]) -> Hashable:
+    return (fn.__module__, fn.__qualname__) + tuple(sorted((k, _normalize(v)) for k, v in kwargs.items()))
+
+
+def coalesce(timeout: float = 30.0):
+    """
+    Decorator for FastAPI handlers: identical concurrent requests (same endpoint and
+    parameters) share one execution. Works on both `def` and `async def`
+    handlers; `timeout` bounds how long a request waits on someone else's query.
+    """
+    def decorator(fn):
+        endpoint = fn.__name__
+
+        def _record(outcome: str):
+            if outcome == SHARED:
+                COALESCED_REQUESTS.labels(endpoint).inc()
+            elif outcome == TIMED_OUT:
+                COALESCE_TIMEOUTS.labels(endpoint).inc()
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                result, outcome = await _flights.do_async(
+                    request_key(fn, kwargs), lambda: fn(*args, **kwargs), timeout
+                )
+                _record(outcome)
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            result, outcome = _flights.do(request_key(fn, kwargs), lambda: fn(*args, **kwargs), timeout)
+            _record(outcome)
+            return result
+        return wrapper
+
+    return decorator
@@ -0,0 +1,182 @@
+"""
+Wire formats for large responses, and response compression.
+
+Clients pick a format with the Accept header or a `format` query parameter (which wins,
+for links and browsers):
+    application/json                             rows as objects (default)
+    application/vnd.solarimpact.columns+json     one array per field, times as epoch seconds
+    application/msgpack                          the columnar layout as MessagePack
+CompressionMiddleware then applies brotli (if installed) or gzip to large bodies.
+"""
+import gzip
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional, Sequence
+
+import msgpack
+from fastapi import Query, Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+COLUMNS_MEDIA_TYPE = "application/vnd.solarimpact.columns+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class WireFormat(str, Enum):
+    json = "json"
+    columns = "columns"
+    msgpack = "msgpack"
+
+
+MEDIA_TYPES = {
+    "application/json": WireFormat.json,
+    COLUMNS_MEDIA_TYPE: WireFormat.columns,
+    MSGPACK_MEDIA_TYPE: WireFormat.msgpack,
+    "application/x-msgpack": WireFormat.msgpack,
+}
+
+
+def _parse_quality(header: str):
+    """Yield (token, q) from an Accept or Accept-Encoding header, highest q first."""
+    entries = []
+    for position, part in enumerate(header.split(",")):
+        token, *params = [piece.strip() for piece in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        entries.append((-q, position, token.lower(), q))
+    return [(token, q) for _, _, token, q in sorted(entries)]
+
+
+def negotiate_format(
+    request: Request,
+    response: Response,
+    format: Optional[WireFormat] = Query(None, description="Overrides the Accept header: json, columns or msgpack"),
+) -> WireFormat:
+    """
+    FastAPI dependency choosing the response format. Unknown or wildcard types get JSON.
+    Marks the response as varying by Accept, so shared caches keep the formats apart
+    (render does the same for the responses it builds).
+    """
+    response.headers.add_vary_header("Accept")
+    if format is not None:
+        return format
+    for media_type, q in _parse_quality(request.headers.get("accept", "")):
+        if q <= 0:
+            continue
+        if media_type in MEDIA_TYPES:
+            return MEDIA_TYPES[media_type]
+        if media_type in ("*/*", "application/*"):
+            break
+    return WireFormat.json
+
+
+def _epoch(value):
+    """Naive UTC datetime -> whole epoch seconds; anything else unchanged."""
+    if isinstance(value, datetime):
+        return int((value - EPOCH).total_seconds())
+    return value
+
+
+def columnar(rows: Sequence[Sequence[Any]], fields: Sequence[str]) -> Dict[str, list]:
+    """Transpose rows (tuples in `fields` order) into one list per field, datetimes as epoch seconds."""
+    columns = {field: [] for field in fields}
+    lists = [columns[field] for field in fields]
+    for row in rows:
+        for values, value in zip(lists, row):
+            values.append(_epoch(value))
+    return columns
+
+
+def render(fmt: WireFormat, content: Any) -> Response:
+    """Serialize already-columnar `content` as compact JSON or MessagePack."""
+    headers = {"Vary": "Accept"}  # the body depends on content negotiation
+    if fmt == WireFormat.msgpack:
+        return Response(msgpack.packb(content, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE, headers=headers)
+    body = json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return Response(body, media_type=COLUMNS_MEDIA_TYPE, headers=headers)
+
+
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "text/", "+json")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """'br' if the client takes it and brotli is installed, else 'gzip', else None."""
+    accepted = {token: q for token, q in _parse_quality(accept_encoding)}
+    wildcard = accepted.get("*", 0.0)
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies of at least `minimum_size` bytes with
+    brotli or gzip, per Accept-Encoding. Streaming responses pass through untouched.
+    """
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                # A copy: the headers list may belong to a Response shared with other requests
+                start = {**message, "headers": list(message.get("headers", []))}
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            if start is not None and message.get("more_body", False):
+                passthrough = True  # streaming: don't buffer
+                await send(start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            content_type = headers.get("content-type", "")
+            if (len(body) >= self.minimum_size and "content-encoding" not in headers
+                    and any(kind in content_type for kind in COMPRESSIBLE_TYPES)):
+                body = self.compress(encoding, body)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,97 +1,146 @@
 from typing import Union, Optional, Dict
 from collections import Counter
+from datetime import datetime, timedelta
+from enum import Enum
 
+import numpy as np
 from pydantic import BaseModel
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
+from api.coalesce import coalesce
+from api.snapshot import FlareSnapshot
 from common.db import DatabaseManager
-from common.models.model import SolarFlare
+from common.models.model import ActiveRegionSummary, SolarFlare
+from common.queries import (
+    RangeMode, apply_range_filter, check_dates, class_threshold_filter, epoch_seconds, to_datetime,
+)
+from common.utils import class_to_flux
+
+SECONDS_PER_DAY = 86400
+EPOCH = datetime(1970, 1, 1)
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
 
 
 router = APIRouter()
 
+
+class RegionSort(str, Enum):
+    flare_count = "flare_count"
+    x_count = "x_count"
+    m_count = "m_count"
+    strongest_flux = "strongest_flux"
+    last_flare_time = "last_flare_time"
+    first_flare_time = "first_flare_time"
+    active_region_num = "active_region_num"
+
+
+class SortOrder(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
 @router.get("/peak-frequency")
-def get_peak_frequency(start_date: str, end_date: str):
+@coalesce()
+def get_peak_frequency(start_date: str, end_date: str, mode: RangeMode = Query(RangeMode.contained)):
     """
     Analyze solar flares to find the most common class within a date range.
     """
-    with DatabaseManager.session_scope() as session:
-        solar_flares = (
-            session.query(SolarFlare)
-            .filter(SolarFlare.begin_time >= start_date, SolarFlare.end_time <= end_date)
-            .all()
-        )
+    check_dates(start_date=start_date, end_date=end_date)
+    snapshot = FlareSnapshot.current()
+    if snapshot is not None:
+        frequencies = snapshot.class_counts(snapshot.select(start_date, end_date, mode))
+    else:
+        with DatabaseManager.session_scope() as session:
+            solar_flares = apply_range_filter(session.query(SolarFlare), session, start_date, end_date, mode).all()
 
-        # Calculate frequencies
-        frequencies = {}
-        for flare in solar_flares:
-            class_type = flare.class_type
-            if class_type in frequencies:
-                frequencies[class_type] += 1
-            else:
-                frequencies[class_type] = 1
-
-        # Find the most common class
-        most_common_class = max(frequencies, key=frequencies.get) if frequencies else None
-
-        # Prepare response
-        response = {
-            "start_date": start_date,
-            "end_date": end_date,
-            "most_common_class": most_common_class,
-            "peak_frequencies": frequencies,
-        }
-        return response
+            # Calculate frequencies
+            frequencies = {}
+            for flare in solar_flares:
+                class_type = flare.class_type
+                if class_type in frequencies:
+                    frequencies[class_type] += 1
+                else:
+                    frequencies[class_type] = 1
+
+    # Find the most common class
+    most_common_class = max(frequencies, key=frequencies.get) if frequencies else None
+
+    # Prepare response
+    response = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "most_common_class": most_common_class,
+        "peak_frequencies": frequencies,
+    }
+    return response
 
 @router.get("/activity-summary")
-def get_activity_summary(start_date: str, end_date: str):
+@coalesce()
+def get_activity_summary(start_date: str, end_date: str, mode: RangeMode = Query(RangeMode.began)):
     """
     Summarize solar flare activity within a date range.
     """
-    with DatabaseManager.session_scope() as session:
-        flares = session.query(SolarFlare).filter(
-            SolarFlare.begin_time >= start_date,
-            SolarFlare.begin_time <= end_date
-        ).all()
-
-        # Calculate peak intensity and counts
-        intensities = [flare.class_type for flare in flares if flare.class_type]
-        intensity_counts = Counter(intensities)
-        peak_intensity_class = (
-            max(intensities, key=intensity_counts.get) if intensities else "No data"
-        )
+    check_dates(start_date=start_date, end_date=end_date)
+    snapshot = FlareSnapshot.current()
+    if snapshot is not None:
+        index = snapshot.select(start_date, end_date, mode)
+        total_flares = len(index)
+        intensity_counts = {name: n for name, n in snapshot.class_counts(index).items() if name}
+    else:
+        with DatabaseManager.session_scope() as session:
+            query = apply_range_filter(session.query(SolarFlare), session, start_date, end_date, mode)
+            # Same (begin, id) order as the snapshot, which the tie-break below relies on
+            flares = query.order_by(SolarFlare.begin_time, SolarFlare.id).all()
+            total_flares = len(flares)
+            intensity_counts = Counter(flare.class_type for flare in flares if flare.class_type)
 
-        # Prepare response
-        response = {
-            "start_date": start_date,
-            "end_date": end_date,
-            "total_flares": len(flares),
-            "peak_intensity_class": peak_intensity_class,  # Always a string
-            "intensity_counts": dict(intensity_counts),
-        }
-        return response
+    # Classes in order of first appearance (by begin time), so ties go to the earliest
+    peak_intensity_class = (
+        max(intensity_counts, key=intensity_counts.get) if intensity_counts else "No data"
+    )
+
+    # Prepare response
+    response = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "total_flares": total_flares,
+        "peak_intensity_class": peak_intensity_class,  # Always a string
+        "intensity_counts": dict(intensity_counts),
+    }
+    return response
 
 
 @router.get("/longest-flare", response_model=Dict[str, Union[str, float]])
-def get_longest_solar_flare(start_date: str, end_date: str):
+@coalesce()
+def get_longest_solar_flare(start_date: str, end_date: str, mode: RangeMode = Query(RangeMode.contained)):
     """
     Find the longest-duration solar flare within a date range.
     """
+    check_dates(start_date=start_date, end_date=end_date)
+    snapshot = FlareSnapshot.current()
+    if snapshot is not None:
+        index = snapshot.select(start_date, end_date, mode)
+        index = index[snapshot.has_end[index]]  # ongoing flares have no duration yet
+        if not len(index):
+            raise HTTPException(status_code=404, detail="No solar flares found in the specified date range")
+        longest = index[np.argmax(snapshot.end[index] - snapshot.begin[index])]
+        return {
+            "flr_id": str(snapshot.flr_ids[longest]),
+            "duration_seconds": float(snapshot.end[longest] - snapshot.begin[longest]),
+            "class_type": snapshot.class_names[snapshot.class_codes[longest]],
+        }
+
     with DatabaseManager.session_scope() as session:
-        solar_flares = (
-            session.query(SolarFlare)
-            .filter(SolarFlare.begin_time >= start_date, SolarFlare.end_time <= end_date)
-            .all()
-        )
+        solar_flares = apply_range_filter(session.query(SolarFlare), session, start_date, end_date, mode).all()
+        # Ongoing flares (overlap mode) have no duration yet
+        solar_flares = [flare for flare in solar_flares if flare.end_time and flare.begin_time]
         if not solar_flares:
             raise HTTPException(status_code=404, detail="No solar flares found in the specified date range")
 
         longest_flare = max(
             solar_flares,
-            key=lambda flare: (flare.end_time - flare.begin_time).total_seconds()
-            if flare.end_time and flare.begin_time
-            else 0,
+            key=lambda flare: (flare.end_time - flare.begin_time).total_seconds(),
         )
 
         duration = (longest_flare.end_time - longest_flare.begin_time).total_seconds()
@@ -99,4 +148,171 @@ def get_longest_solar_flare(start_date: str, end_date: str):
             "flr_id": longest_flare.flr_id,
             "duration_seconds": duration,
             "class_type": longest_flare.class_type,
-        }
\ No newline at end of file
+        }
+
+
+def _class_filter(min_class: Optional[str]):
+    try:
+        return class_threshold_filter(min_class)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _min_flux(min_class: Optional[str]) -> Optional[float]:
+    if not min_class:
+        return None
+    try:
+        return class_to_flux(min_class)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _filtered(query, session: Session, start_date, end_date, min_class):
+    """Flares that began in the window, at or above min_class."""
+    query = apply_range_filter(query, session, start_date, end_date, RangeMode.began)
+    threshold = _class_filter(min_class)
+    return query.filter(threshold) if threshold is not None else query
+
+
+@router.get("/waiting-times")
+@coalesce()
+def get_waiting_times(
+    start_date: str,
+    end_date: str,
+    min_class: Optional[str] = Query(None, description="Only flares at or above this class, e.g. M or M5.0"),
+    bins: int = Query(20, ge=1, le=200, description="Histogram bins (log-spaced)"),
+):
+    """
+    Distribution of waiting times between consecutive flare onsets at or above a class.
+    Gaps are computed in the database with LAG over begin_time (or from the in-memory
+    snapshot); only the gaps are returned.
+    """
+    check_dates(start_date=start_date, end_date=end_date)
+    snapshot = FlareSnapshot.current()
+    if snapshot is not None:
+        index = snapshot.select(start_date, end_date, RangeMode.began, _min_flux(min_class))
+        waits = np.diff(snapshot.begin[index]).astype(float)
+    else:
+        with DatabaseManager.session_scope() as session:
+            epoch = epoch_seconds(session)
+            gap = epoch - func.lag(epoch).over(order_by=(SolarFlare.begin_time, SolarFlare.id))
+            gaps = _filtered(session.query(gap.label("gap")), session, start_date, end_date, min_class).subquery()
+            # The first onset has no predecessor (a NULL gap); rows come back in no particular order
+            rows = session.query(gaps.c.gap).filter(gaps.c.gap.isnot(None)).all()
+        waits = np.array([row[0] for row in rows], dtype=float)
+
+    response = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "min_class": min_class,
+        "count": int(waits.size),
+        "mean_seconds": None,
+        "std_seconds": None,
+        "quantiles_seconds": {},
+        "histogram": {"bin_edges_seconds": [], "counts": []},
+    }
+    if not waits.size:
+        return response
+
+    # Waiting times span minutes to months, so bin on a log scale (sub-minute gaps go in the first bin)
+    low = max(waits.min(), 60.0)
+    high = max(waits.max(), low * 10)
+    edges = np.geomspace(low, high, bins + 1)
+    counts, _ = np.histogram(np.clip(waits, low, high), bins=edges)
+    response.update(
+        mean_seconds=float(waits.mean()),
+        std_seconds=float(waits.std()),
+        quantiles_seconds={f"p{round(q * 100)}": float(v) for q, v in zip(QUANTILES, np.quantile(waits, QUANTILES))},
+        histogram={"bin_edges_seconds": edges.tolist(), "counts": counts.tolist()},
+    )
+    return response
+
+
+@router.get("/rolling-rate")
+@coalesce()
+def get_rolling_rate(
+    start_date: str,
+    end_date: str,
+    window_days: int = Query(27, ge=1, le=366, description="Rolling window; 27 days is one solar rotation"),
+    min_class: Optional[str] = Query(None, description="Only flares at or above this class, e.g. M or M5.0"),
+):
+    """
+    Daily series of flare onsets and the rolling rate (flares/day) over the trailing window.
+    Counts per day are aggregated in the database; the rolling sum runs over the dense day grid,
+    so days without flares are included.
+    """
+    check_dates(start_date=start_date, end_date=end_date)
+    start, end = to_datetime(start_date), to_datetime(end_date)
+    first_day = (start - EPOCH).days
+    last_day = (end - EPOCH).days
+    # Reach back so the first day of the series already has a full window
+    grid_start = first_day - (window_days - 1)
+
+    snapshot = FlareSnapshot.current()
+    if snapshot is not None:
+        index = snapshot.select(EPOCH + timedelta(days=grid_start), end, RangeMode.began, _min_flux(min_class))
+        days, counts = np.unique(snapshot.begin[index] // SECONDS_PER_DAY, return_counts=True)
+    else:
+        with DatabaseManager.session_scope() as session:
+            day = (epoch_seconds(session) // SECONDS_PER_DAY).label("day")
+            days = _filtered(
+                session.query(day), session, EPOCH + timedelta(days=grid_start), end, min_class
+            ).subquery()
+            rows = session.query(days.c.day, func.count()).group_by(days.c.day).all()
+        days, counts = np.array(rows, dtype=np.int64).reshape(-1, 2).T
+
+    daily = np.zeros(last_day - grid_start + 1, dtype=np.int64)
+    daily[days - grid_start] = counts
+    cumulative = np.concatenate(([0], np.cumsum(daily)))
+    rolling = cumulative[window_days:] - cumulative[:-window_days]
+    daily = daily[window_days - 1:]
+    rate = rolling / window_days
+
+    dates = np.arange(first_day, last_day + 1).astype("datetime64[D]").astype(str)
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "window_days": window_days,
+        "min_class": min_class,
+        "total_flares": int(daily.sum()),
+        "mean_rate_per_day": float(rate.mean()),
+        "max_rate_per_day": float(rate.max()),
+        "series": [
+            {"date": d, "count": int(c), "rolling_count": int(r), "rate_per_day": float(x)}
+            for d, c, r, x in zip(dates.tolist(), daily.tolist(), rolling.tolist(), rate.tolist())
+        ],
+    }
+
+
+@router.get("/regions")
+@coalesce()
+def get_active_regions(
+    sort_by: RegionSort = Query(RegionSort.flare_count),
+    order: SortOrder = Query(SortOrder.desc),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Rank active regions by flare productivity. Served from active_region_summary,
+    which ingest keeps current, so no flares are scanned.
+    """
+    column = getattr(ActiveRegionSummary, sort_by.value)
+    ordering = column.desc() if order == SortOrder.desc else column.asc()
+    with DatabaseManager.session_scope() as session:
+        total = session.query(func.count(ActiveRegionSummary.active_region_num)).scalar()
+        regions = (
+            session.query(ActiveRegionSummary)
+            # NULLs (no classifiable flare) last either way; region number keeps pages stable
+            .order_by(column.is_(None), ordering, ActiveRegionSummary.active_region_num)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        return {
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "sort_by": sort_by.value,
+            "order": order.value,
+            "regions": [region.to_dict() for region in regions],
+        }
@@ -1,14 +1,20 @@
 import json
+import base64
+import binascii
 from datetime import datetime
 from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, HTTPException, Query, Depends
 
+from api.coalesce import coalesce
+from api.encoding import WireFormat, columnar, negotiate_format, render
 from common.db import DatabaseManager
 from common.models.model import SolarFlare
-from common.utils import send_rabbitmq_message
+from common.queries import LocationFilter, RangeMode, active_at_filter, apply_range_filter, check_dates
+from common.outbox import OutboxRelay, enqueue
+from common.queues import queue_for
 
 
 class DataCollectionRequest(BaseModel):
@@ -16,30 +22,168 @@ class DataCollectionRequest(BaseModel):
     end_date: datetime
 
 
+# Keeps the IN list (one bind parameter per id) well inside every driver's limits
+MAX_BATCH_IDS = 500
+
+
+class SolarFlareBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
+
+
 router = APIRouter()
 
+# Fields of SolarFlare.to_dict, in order, for the columnar formats
+FLARE_FIELDS = (
+    "id", "flr_id", "begin_time", "peak_time", "end_time", "class_type",
+    "source_location", "active_region_num", "linked_events", "latitude", "longitude",
+)
+
+
+def encode_sync_token(ingest_seq: int) -> str:
+    """Opaque change-feed cursor; clients must treat it as a string."""
+    return base64.urlsafe_b64encode(f"v1:{ingest_seq}".encode()).decode().rstrip("=")
+
+
+def decode_sync_token(token: str) -> int:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        version, seq = base64.urlsafe_b64decode(padded).decode().split(":", 1)
+        if version != "v1":
+            raise ValueError(version)
+        return int(seq)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
 
 @router.get("/solar-flares", response_model=List[dict])
 def get_solar_flares(
     start_date: Optional[str] = Query(None, description="Start date in YYYY-MM-DDTHH:MM:SS format"),
-    end_date: Optional[str] = Query(None, description="End date in YYYY-MM-DDTHH:MM:SS format")
+    end_date: Optional[str] = Query(None, description="End date in YYYY-MM-DDTHH:MM:SS format"),
+    mode: RangeMode = Query(RangeMode.contained, description="contained: flare entirely inside the range, "
+                            "began: flare began inside the range, overlap: flare active at any point in the range"),
+    min_lat: Optional[float] = Query(None, ge=-90, le=90, description="Minimum heliographic latitude (north positive)"),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90, description="Maximum heliographic latitude"),
+    min_lon: Optional[float] = Query(None, ge=-180, le=180, description="Minimum heliographic longitude (west positive)"),
+    max_lon: Optional[float] = Query(None, ge=-180, le=180, description="Maximum heliographic longitude"),
+    near_lat: Optional[float] = Query(None, ge=-90, le=90, description="Latitude of a point to search around"),
+    near_lon: Optional[float] = Query(None, ge=-180, le=180, description="Longitude of a point to search around"),
+    within_deg: Optional[float] = Query(None, gt=0, le=180, description="Great-circle radius around near_lat/near_lon"),
+    fmt: WireFormat = Depends(negotiate_format),
 ):
     """
-    Fetch solar flares from the database, optionally filtering by date range.
+    Fetch solar flares from the database, optionally filtering by date range and
+    heliographic location (flares without a parseable source_location are excluded then).
+    Columnar and MessagePack responses are read as plain tuples, skipping ORM objects.
     """
+    check_dates(start_date=start_date, end_date=end_date)
+    location = dict(min_lat=min_lat, max_lat=max_lat, min_lon=min_lon, max_lon=max_lon,
+                    near_lat=near_lat, near_lon=near_lon, within_deg=within_deg)
+    try:
+        LocationFilter(**location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    content = _query_solar_flares(start_date=start_date, end_date=end_date, mode=mode, fmt=fmt, **location)
+    # Coalesced requests share `content`; each gets its own Response, which middleware may mutate
+    return content if fmt == WireFormat.json else render(fmt, content)
+
+
+@coalesce()
+def _query_solar_flares(start_date, end_date, mode: RangeMode, fmt: WireFormat, **location):
+    """Flare dicts (JSON) or the columnar payload for get_solar_flares."""
+    location = LocationFilter(**location)
     with DatabaseManager.session_scope() as session:
         query = session.query(SolarFlare)
 
         # Apply date filters if provided
-        if start_date:
-            query = query.filter(SolarFlare.begin_time >= start_date)
-        if end_date:
-            query = query.filter(SolarFlare.end_time <= end_date)
+        query = apply_range_filter(query, session, start_date, end_date, mode)
+        if location.active:
+            query = query.filter(location.clause())
+
+        if fmt != WireFormat.json:
+            rows = query.with_entities(*(getattr(SolarFlare, field) for field in FLARE_FIELDS)).all()
+            lat, lon = FLARE_FIELDS.index("latitude"), FLARE_FIELDS.index("longitude")
+            rows = [row for row in rows if location.matches(row[lat], row[lon])]
+            return {"count": len(rows), "columns": columnar(rows, FLARE_FIELDS)}
 
         solar_flares = query.all()
+        return [flare.to_dict() for flare in solar_flares if location.matches(flare.latitude, flare.longitude)]
+
+
+@router.get("/solar-flares/changes", response_model=dict)
+def get_solar_flare_changes(
+    since: Optional[str] = Query(None, description="next_token from a previous call; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum changes per page"),
+    fmt: WireFormat = Depends(negotiate_format),
+):
+    """
+    Incremental sync: flares inserted or revised after `since`, oldest change first.
+    Keep calling with the returned next_token while has_more is true.
+    """
+    after = decode_sync_token(since) if since else 0
+    with DatabaseManager.session_scope() as session:
+        solar_flares = (
+            session.query(SolarFlare)
+            .filter(SolarFlare.ingest_seq > after)
+            .order_by(SolarFlare.ingest_seq)
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(solar_flares) > limit
+        solar_flares = solar_flares[:limit]
+        last_seq = solar_flares[-1].ingest_seq if solar_flares else after
+        if fmt != WireFormat.json:
+            rows = [tuple(getattr(flare, field) for field in FLARE_FIELDS) for flare in solar_flares]
+            return render(fmt, {
+                "count": len(rows),
+                "changes": columnar(rows, FLARE_FIELDS),
+                "next_token": encode_sync_token(last_seq),
+                "has_more": has_more,
+            })
+        return {
+            "changes": [flare.to_dict() for flare in solar_flares],
+            "next_token": encode_sync_token(last_seq),
+            "has_more": has_more,
+        }
+
+
+@router.get("/solar-flares/active", response_model=List[dict])
+def get_active_solar_flares(
+    at: str = Query(..., description="Moment in YYYY-MM-DDTHH:MM:SS format")
+):
+    """
+    Fetch solar flares in progress at a given time. Flares without an end time count as
+    ongoing for OPEN_FLARE_HOURS after they began.
+    """
+    check_dates(at=at)
+    with DatabaseManager.session_scope() as session:
+        solar_flares = (
+            session.query(SolarFlare)
+            .filter(active_at_filter(session, at))
+            .order_by(SolarFlare.begin_time)
+            .all()
+        )
         return [flare.to_dict() for flare in solar_flares]
 
 
+@router.post("/solar-flares/batch", response_model=dict)
+def get_solar_flares_batch(request: SolarFlareBatchRequest):
+    """
+    Fetch up to MAX_BATCH_IDS solar flares by ID in one query. Flares come back in the
+    order requested (duplicates once); IDs with no stored flare are listed under `missing`.
+    """
+    ids = list(dict.fromkeys(request.ids))
+    with DatabaseManager.session_scope() as session:
+        found = {
+            flare.flr_id: flare.to_dict()
+            for flare in session.query(SolarFlare).filter(SolarFlare.flr_id.in_(ids))
+        }
+        return {
+            "solar_flares": [found[flr_id] for flr_id in ids if flr_id in found],
+            "missing": [flr_id for flr_id in ids if flr_id not in found],
+        }
+
+
 @router.get("/solar-flares/{flr_id}", response_model=dict)
 def get_solar_flare(flr_id: str):
     """
@@ -52,10 +196,13 @@ def get_solar_flare(flr_id: str):
         return solar_flare.to_dict()
 
  
-@router.post("/start-data-collection")
+@router.post("/start-data-collection", status_code=202)
 def start_data_collection(request: DataCollectionRequest):
     """
-    Start data collection by sending a message to RabbitMQ.
+    Start data collection. The request is stored in the collection outbox and
+    published to RabbitMQ by the outbox relay, so a slow or unavailable broker
+    neither delays nor loses it. Long ranges go to the bulk queue, which the
+    collector works through between interactive requests.
     """
     try:
         # Convert datetime objects to string in ISO 8601 format
@@ -64,14 +211,16 @@ def start_data_collection(request: DataCollectionRequest):
 
         # Prepare the message to be sent to RabbitMQ
         message = {"start_date": start_date_str, "end_date": end_date_str}
-        
-        # Send the message to RabbitMQ 
-        send_rabbitmq_message("data_collection_queue", message)
 
-        return {"status": "Data collection triggered successfully", "message": message}
+        with DatabaseManager.session_scope() as session:
+            queue = queue_for(request.start_date, request.end_date)
+            outbox_id = enqueue(session, queue, message).id
+        OutboxRelay.notify()
+
+        return {"status": "Data collection queued", "message": message, "queue": queue, "outbox_id": outbox_id}
     
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to trigger data collection: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to queue data collection: {e}")
     
 # @router.get("/solar-flares-debug", response_model=List[dict])
 # def debug_get_all_flares(db: Session = Depends(get_db)):
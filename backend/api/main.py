@@ -1,11 +1,43 @@
-from fastapi import FastAPI 
+import threading
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 
+import common.environment as env
+from common.db import DatabaseManager, QueryProfiler
+from common.outbox import OutboxRelay
+from common.queries import InvalidDate
 from api.endpoints.solar_flare import router as solar_flare_router
 from api.endpoints.analysis import router as analysis_router
+from api.encoding import CompressionMiddleware
+from api.snapshot import FlareSnapshot
+
+
+def _warmup_database():
+    try:
+        DatabaseManager.warmup()
+    except Exception as e:
+        print(f"Database warmup failed: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so the dyno starts accepting traffic immediately
+    if env.get_db_warmup_enabled():
+        threading.Thread(target=_warmup_database, name="db-warmup", daemon=True).start()
+    if env.get_analysis_snapshot_enabled():
+        FlareSnapshot.start()
+    if env.get_outbox_relay_enabled():
+        OutboxRelay.start()
+    yield
+    FlareSnapshot.stop()
+    OutboxRelay.stop()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 # Exposes prometheus /metrics endpoint for grafana dashboard
 instrumentator = Instrumentator()
 instrumentator.instrument(app).expose(app)  
@@ -17,7 +49,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Queries", "X-DB-Rows", "X-DB-Time-Ms"],
 )
+# brotli or gzip for bodies over ~1KB, per Accept-Encoding
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+
+@app.exception_handler(InvalidDate)
+async def invalid_date(request: Request, exc: InvalidDate):
+    """Bad date parameters (common.queries.check_dates) are the client's fault."""
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+if env.get_db_profiling_enabled():
+    @app.middleware("http")
+    async def profile_db_queries(request: Request, call_next):
+        """Attach per-request DB query count, rows and time as headers and histograms."""
+        stats, token = QueryProfiler.start_request()
+        try:
+            response = await call_next(request)
+        finally:
+            QueryProfiler.end_request(token)
+
+        route = request.scope.get("route")
+        QueryProfiler.observe_request(route.path if route else "unmatched", stats)
+        response.headers["X-DB-Queries"] = str(stats.queries)
+        response.headers["X-DB-Rows"] = str(stats.rows)
+        response.headers["X-DB-Time-Ms"] = f"{stats.db_time * 1000:.2f}"
+        return response
 
 # Solar Flare routes
 app.include_router(solar_flare_router, prefix="/api")
@@ -0,0 +1,210 @@
+"""
+Optional per-worker columnar snapshot of solar_flares for the analysis endpoints.
+
+With ANALYSIS_SNAPSHOT=1 each API worker keeps the catalog as NumPy arrays sorted by
+begin time, loaded at startup and refreshed in the background from rows whose
+ingest_seq is newer than the snapshot's. Range queries become searchsorted plus
+vectorized masks, with no database round trip. Without the flag (or until the first
+load finishes) the endpoints query the database as before.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+
+import common.environment as env
+from common import db
+from common.models.model import OPEN_FLARE_HOURS, SolarFlare
+from common.queries import RangeMode, to_datetime
+from common.utils import class_to_flux
+
+FIELDS = (
+    SolarFlare.id, SolarFlare.flr_id, SolarFlare.begin_time, SolarFlare.peak_time,
+    SolarFlare.end_time, SolarFlare.class_type, SolarFlare.active_region_num, SolarFlare.ingest_seq,
+)
+
+
+def _epochs(values: Sequence[Optional[datetime]]) -> np.ndarray:
+    """Naive UTC datetimes (None allowed) -> datetime64[s]; None becomes NaT."""
+    return np.array(values, dtype="datetime64[s]")
+
+
+def _epoch(value) -> Optional[int]:
+    value = to_datetime(value)
+    return None if value is None else int(np.datetime64(value, "s").astype(np.int64))
+
+
+def _flux(class_type: str) -> float:
+    try:
+        return class_to_flux(class_type)
+    except ValueError:
+        return np.nan
+
+
+class FlareColumns:
+    """Immutable column arrays for a set of flares, sorted by (begin, id)."""
+    __slots__ = ("ids", "flr_ids", "begin", "peak", "end", "has_end",
+                 "class_codes", "class_names", "flux", "region", "max_seq")
+
+    @classmethod
+    def from_rows(cls, rows: List[tuple], class_names: List[str]) -> "FlareColumns":
+        """Build from FIELDS tuples. New classes are appended to `class_names` (dictionary encoding)."""
+        self = cls()
+        codes = {name: i for i, name in enumerate(class_names)}
+        ids, flr_ids, begins, peaks, ends, classes, regions, seqs = zip(*rows) if rows else ([],) * 8
+        for name in classes:
+            if name not in codes:
+                codes[name] = len(class_names)
+                class_names.append(name)
+        self.ids = np.array(ids, dtype=np.int64)
+        self.flr_ids = np.array(flr_ids, dtype=str)
+        self.begin = _epochs(begins).astype(np.int64)
+        self.peak = _epochs(peaks).astype(np.int64)
+        end = _epochs(ends)
+        self.has_end = ~np.isnat(end)
+        self.end = np.where(self.has_end, end.astype(np.int64), 0)
+        self.class_codes = np.array([codes[name] for name in classes], dtype=np.int32)
+        self.class_names = class_names
+        self.flux = np.array([_flux(name) for name in class_names], dtype=np.float64)[self.class_codes] \
+            if len(self.class_codes) else np.empty(0, dtype=np.float64)
+        self.region = np.array([-1 if r is None else r for r in regions], dtype=np.int32)
+        self.max_seq = max((seq for seq in seqs if seq is not None), default=0)
+        return self._sorted()
+
+    def _sorted(self) -> "FlareColumns":
+        order = np.lexsort((self.ids, self.begin))
+        for name in ("ids", "flr_ids", "begin", "peak", "end", "has_end", "class_codes", "flux", "region"):
+            setattr(self, name, getattr(self, name)[order])
+        return self
+
+    def merged(self, newer: "FlareColumns") -> "FlareColumns":
+        """Rows of `newer` (same class_names list) replace or add to this snapshot's."""
+        keep = ~np.isin(self.ids, newer.ids)
+        merged = FlareColumns()
+        for name in ("ids", "flr_ids", "begin", "peak", "end", "has_end", "class_codes", "region"):
+            setattr(merged, name, np.concatenate((getattr(self, name)[keep], getattr(newer, name))))
+        merged.class_names = newer.class_names
+        merged.flux = np.array([_flux(name) for name in merged.class_names], dtype=np.float64)[merged.class_codes]
+        merged.max_seq = max(self.max_seq, newer.max_seq)
+        return merged._sorted()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in
+                   ("ids", "flr_ids", "begin", "peak", "end", "has_end", "class_codes", "flux", "region"))
+
+    def select(self, start_date=None, end_date=None, mode: RangeMode = RangeMode.contained,
+               min_flux: Optional[float] = None) -> np.ndarray:
+        """
+        Indices (in begin order) of flares matching common.queries.apply_range_filter for the
+        same window and mode, optionally at or above `min_flux`.
+        """
+        start, end = _epoch(start_date), _epoch(end_date)
+        # begin <= end holds in every mode; in 'began' and 'contained' begin >= start does too
+        hi = np.searchsorted(self.begin, end, side="right") if end is not None else len(self)
+        lo = 0
+        if start is not None and mode != RangeMode.overlap:
+            lo = np.searchsorted(self.begin, start, side="left")
+        index = np.arange(lo, max(lo, hi))
+
+        mask = None
+        if mode == RangeMode.overlap and start is not None:
+            open_end = self.begin[index] + OPEN_FLARE_HOURS * 3600  # common.queries.open_flare_end
+            mask = np.where(self.has_end[index], self.end[index], open_end) >= start
+        elif mode == RangeMode.contained and end is not None:
+            mask = self.has_end[index] & (self.end[index] <= end)
+        if min_flux is not None:
+            above = self.flux[index] >= min_flux  # NaN (unparseable class) compares False
+            mask = above if mask is None else mask & above
+        return index if mask is None else index[mask]
+
+    def class_counts(self, index: np.ndarray) -> Dict[str, int]:
+        """Flares per class_type, in order of first appearance."""
+        codes, first, counts = np.unique(self.class_codes[index], return_index=True, return_counts=True)
+        order = np.argsort(first, kind="stable")
+        return {self.class_names[codes[i]]: int(counts[i]) for i in order}
+
+
+class FlareSnapshot:
+    """Process-wide holder of the current FlareColumns; refreshed by a background thread."""
+    _data: Optional[FlareColumns] = None
+    _lock = threading.Lock()
+    _stop = threading.Event()
+    _thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def current(cls) -> Optional[FlareColumns]:
+        return cls._data
+
+    @classmethod
+    def load(cls) -> FlareColumns:
+        """Read the whole catalog."""
+        with cls._lock:
+            return cls._load()
+
+    @classmethod
+    def _load(cls) -> FlareColumns:
+        started = time.perf_counter()
+        with db.DatabaseManager.session_scope() as session:
+            rows = session.query(*FIELDS).all()
+        data = FlareColumns.from_rows(rows, [])
+        cls._data = data
+        print(f"Loaded analysis snapshot: {len(data)} flares, {data.nbytes() / 1e6:.1f} MB "
+              f"in {time.perf_counter() - started:.2f}s")
+        return data
+
+    @classmethod
+    def refresh(cls) -> FlareColumns:
+        """
+        Apply rows inserted or revised since the last refresh (ingest_seq above the snapshot's).
+        Falls back to a full load if the row count doesn't add up, e.g. after deletes or rows
+        written without an ingest_seq.
+        """
+        with cls._lock:
+            current = cls._data
+            if current is None:
+                return cls._load()
+            with db.DatabaseManager.session_scope() as session:
+                max_seq, count = session.query(func.max(SolarFlare.ingest_seq), func.count(SolarFlare.id)).one()
+                if (max_seq or 0) == current.max_seq and count == len(current):
+                    return current
+                rows = session.query(*FIELDS).filter(SolarFlare.ingest_seq > current.max_seq).all()
+            merged = current.merged(FlareColumns.from_rows(rows, list(current.class_names)))
+            if len(merged) != count:
+                return cls._load()
+            cls._data = merged
+            return merged
+
+    @classmethod
+    def invalidate(cls):
+        cls._data = None
+
+    @classmethod
+    def _run(cls, interval: float):
+        while not cls._stop.is_set():
+            try:
+                cls.refresh()
+            except Exception as e:
+                print(f"Analysis snapshot refresh failed: {e}")
+            cls._stop.wait(interval)
+
+    @classmethod
+    def start(cls, interval: float = None):
+        """Load now and keep refreshing every `interval` seconds in a daemon thread."""
+        interval = interval or env.get_analysis_snapshot_refresh_seconds()
+        cls._stop.clear()
+        cls._thread = threading.Thread(target=cls._run, args=(interval,), name="analysis-snapshot", daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def stop(cls, timeout: float = None):
+        """Stop refreshing; waits for a refresh in progress to finish."""
+        cls._stop.set()
+        thread, cls._thread = cls._thread, None
+        if thread is not None:
+            thread.join(timeout)
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api.coalesce import LEADER, TIMED_OUT, SingleFlight, coalesce, request_key
+
+
+def test_concurrent_sync_calls_share_one_execution():
+    calls = []
+
+    @coalesce(timeout=5)
+    def summary(start_date: str, end_date: str):
+        calls.append(1)
+        time.sleep(0.2)
+        return {"total": 3}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: summary(start_date="2024-01-01T00:00:00Z",
+                                                  end_date="2024-02-01T00:00:00"), range(8)))
+
+    assert results == [{"total": 3}] * 8
+    assert len(calls) == 1
+
+
+def test_concurrent_async_calls_share_one_execution():
+    calls = []
+
+    @coalesce(timeout=5)
+    async def summary(start_date: str):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(*(summary(start_date="2024-01-01") for _ in range(5)))
+
+    assert asyncio.run(main()) == [1] * 5
+
+
+def test_errors_are_shared_and_timeouts_run_independently():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def slow_fail():
+        started.set()
+        time.sleep(0.2)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, "k", slow_fail)
+        started.wait()
+        follower = pool.submit(flights.do, "k", lambda: "unused")
+        with pytest.raises(ValueError):
+            leader.result()
+        with pytest.raises(ValueError):
+            follower.result()
+
+    def slow():
+        started.set()
+        time.sleep(0.3)
+        return "leader"
+
+    started.clear()
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flights.do, "k", slow)
+        started.wait()
+        follower = pool.submit(flights.do, "k", lambda: "own", 0.05)
+        assert follower.result() == ("own", TIMED_OUT)
+        assert leader.result() == ("leader", LEADER)
+
+
+def test_request_key_uses_params_as_given():
+    def handler():
+        pass
+    a = request_key(handler, {"start_date": "2024-01-01T00:00:00Z", "mode": "overlap"})
+    assert a == request_key(handler, {"mode": "overlap", "start_date": "2024-01-01T00:00:00Z"})
+    # Same instant, but handlers echo start_date back, so each spelling gets its own result
+    assert a != request_key(handler, {"start_date": "2024-01-01T00:00:00+00:00", "mode": "overlap"})
@@ -0,0 +1,78 @@
+import gzip
+from datetime import datetime
+
+import msgpack
+from fastapi import Depends, FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from api import encoding
+from api.encoding import CompressionMiddleware, WireFormat, choose_encoding, columnar, negotiate_format
+
+
+def _app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/fmt")
+    def fmt(f: WireFormat = Depends(negotiate_format)):
+        return {"format": f.value}
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse("flare " * 100)
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("flare")
+
+    return app
+
+
+def test_negotiate_format_from_accept_and_query():
+    client = TestClient(_app())
+    assert client.get("/fmt").json() == {"format": "json"}
+    assert client.get("/fmt", headers={"Accept": "application/msgpack"}).json() == {"format": "msgpack"}
+    accept = "application/json;q=0.5, application/vnd.solarimpact.columns+json"
+    assert client.get("/fmt", headers={"Accept": accept}).json() == {"format": "columns"}
+    assert client.get("/fmt", headers={"Accept": "text/html, */*;q=0.8"}).json() == {"format": "json"}
+    assert client.get("/fmt?format=columns", headers={"Accept": "application/msgpack"}).json() == {"format": "columns"}
+
+
+def test_negotiated_responses_vary_by_accept():
+    app = _app()
+
+    @app.get("/rendered")
+    def rendered(f: WireFormat = Depends(negotiate_format)):
+        return encoding.render(f, {"a": [1] * 200}) if f != WireFormat.json else {"a": [1] * 200}
+
+    client = TestClient(app)
+    for accept in ("application/json", "application/msgpack", "application/vnd.solarimpact.columns+json"):
+        r = client.get("/rendered", headers={"Accept": accept, "Accept-Encoding": "gzip"})
+        vary = [v.strip().lower() for v in r.headers["vary"].split(",")]
+        assert "accept" in vary and "accept-encoding" in vary, accept
+    assert "accept" in client.get("/fmt").headers["vary"].lower()
+
+
+def test_columnar_converts_datetimes_to_epoch_seconds():
+    rows = [(1, datetime(2024, 1, 1), None), (2, datetime(1970, 1, 1, 0, 1), ["CME"])]
+    assert columnar(rows, ("id", "begin_time", "linked_events")) == {
+        "id": [1, 2], "begin_time": [1704067200, 60], "linked_events": [None, ["CME"]],
+    }
+    assert msgpack.unpackb(encoding.render(WireFormat.msgpack, {"a": [1]}).body) == {"a": [1]}
+
+
+def test_compression_negotiation(monkeypatch):
+    client = TestClient(_app())
+    r = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.text == "flare " * 100  # httpx decodes transparently
+    assert "accept-encoding" in r.headers["vary"].lower()
+
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+    monkeypatch.setattr(encoding, "brotli", None)
+    assert choose_encoding("br, gzip;q=0.5") == "gzip"
+    assert choose_encoding("gzip;q=0, br") is None
+    assert gzip.decompress(CompressionMiddleware(None).compress("gzip", b"x" * 10)) == b"x" * 10
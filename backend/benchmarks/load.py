@@ -0,0 +1,328 @@
+"""
+Load-test harness: sweeps concurrency over a mix of dashboard requests and
+checks the results against a stored baseline.
+
+Examples:
+    # In-process against the ASGI app over a seeded in-memory SQLite
+    python -m benchmarks.load --concurrency 1,8,32 --duration 10
+
+    # Start a local uvicorn over a SQLite file (or --db postgresql://...) and hit it over HTTP
+    python -m benchmarks.load --serve --db sqlite:///load.db
+
+    # Against an already running server
+    python -m benchmarks.load --url http://127.0.0.1:8000
+
+    # Record a baseline on this machine (latencies don't transfer between hosts, so
+    # baselines are untracked), then fail later runs that regress beyond the thresholds
+    python -m benchmarks.load --save-baseline
+    python -m benchmarks.load --baseline benchmarks/baselines/load.json
+
+The exit code is 1 when any concurrency level regresses beyond the thresholds.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+os.environ.setdefault("NASA_API_KEY", "DEMO_KEY")
+
+import httpx
+
+from benchmarks.run import git_commit, make_engine, use_engine
+from benchmarks.stats import summarize
+from benchmarks.synthetic import parse_scale, seed_solar_flares
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "load.json")
+
+# Relative weight of each request kind in the dashboard mix
+REQUEST_MIX = {"list": 5, "flare": 3, "analysis": 2}
+ANALYSIS_PATHS = [
+    "/api/analysis/peak-frequency",
+    "/api/analysis/activity-summary",
+    "/api/analysis/longest-flare",
+]
+
+
+class RequestMix:
+    """Builds randomized (kind, path, params) tuples for the dashboard workload."""
+    def __init__(self, flr_ids: List[str], span: Tuple[Any, Any], seed: int = 42,
+                 list_days: int = 30, analysis_days: int = 365):
+        self.flr_ids = flr_ids
+        self.span_start, self.span_end = span
+        self.rng = random.Random(seed)
+        self.list_days = list_days
+        self.analysis_days = analysis_days
+
+    def _window(self, days: int) -> Dict[str, str]:
+        window = timedelta(days=days)
+        usable = max((self.span_end - self.span_start - window).total_seconds(), 0)
+        start = self.span_start + timedelta(seconds=self.rng.uniform(0, usable))
+        return {
+            "start_date": start.isoformat(timespec="seconds"),
+            "end_date": (start + window).isoformat(timespec="seconds"),
+        }
+
+    def next(self) -> Tuple[str, str, Dict[str, str]]:
+        kind = self.rng.choices(list(REQUEST_MIX), weights=list(REQUEST_MIX.values()))[0]
+        if kind == "flare" and self.flr_ids:
+            return kind, f"/api/solar-flares/{self.rng.choice(self.flr_ids)}", {}
+        if kind == "analysis":
+            return kind, self.rng.choice(ANALYSIS_PATHS), self._window(self.analysis_days)
+        return "list", "/api/solar-flares", self._window(self.list_days)
+
+
+async def run_level(client: httpx.AsyncClient, mix: RequestMix, concurrency: int, duration: float) -> Dict[str, Any]:
+    """Drive `concurrency` closed-loop workers for `duration` seconds."""
+    latencies: List[float] = []
+    kinds: Counter = Counter()
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            kind, path, params = mix.next()
+            began = time.perf_counter()
+            try:
+                response = await client.get(path, params=params)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - began)
+            kinds[kind] += 1
+            errors += failed
+
+    began = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - began
+
+    summary = summarize(latencies, wall_seconds=wall)
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": summary["throughput_per_s"],
+        "p50_ms": summary["p50_ms"],
+        "p95_ms": summary["p95_ms"],
+        "p99_ms": summary["p99_ms"],
+        "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+        "mix": dict(kinds),
+    }
+
+
+async def sweep(client: httpx.AsyncClient, mix: RequestMix, levels: List[int], duration: float) -> List[Dict[str, Any]]:
+    results = []
+    for level in levels:
+        result = await run_level(client, mix, level, duration)
+        print(
+            f"c={level:<4} rps={result['rps']:<9} p50={result['p50_ms']}ms "
+            f"p95={result['p95_ms']}ms p99={result['p99_ms']}ms errors={result['error_rate']:.2%}",
+            file=sys.stderr,
+        )
+        results.append(result)
+    return results
+
+
+def workload_from_db(engine, sample: int = 500) -> Tuple[List[str], Tuple[Any, Any]]:
+    """Sample flare ids and the covered date span straight from a seeded database."""
+    from sqlalchemy import func, select
+    from common.models.model import SolarFlare
+
+    with engine.connect() as conn:
+        span = conn.execute(select(func.min(SolarFlare.begin_time), func.max(SolarFlare.begin_time))).one()
+        ids = conn.execute(select(SolarFlare.flr_id).order_by(func.random()).limit(sample)).scalars().all()
+    if not ids:
+        raise SystemExit("Database has no solar flares; seed it first.")
+    return list(ids), tuple(span)
+
+
+async def discover_workload(client: httpx.AsyncClient, start_date: str, end_date: str,
+                            sample: int = 500) -> Tuple[List[str], Tuple[Any, Any]]:
+    """Sample flare ids and the covered date span from flares a running API has in [start_date, end_date]."""
+    response = await client.get("/api/solar-flares", params={
+        "start_date": start_date, "end_date": end_date, "mode": "began", "format": "columns",
+    })
+    response.raise_for_status()
+    columns = response.json()["columns"]
+    if not columns["flr_id"]:
+        raise SystemExit(f"Target API has no solar flares between {start_date} and {end_date}; "
+                         "seed it first or pass --start-date/--end-date.")
+    begins = sorted(datetime.fromtimestamp(t, timezone.utc).replace(tzinfo=None) for t in columns["begin_time"])
+    ids = random.Random(0).sample(columns["flr_id"], min(sample, len(columns["flr_id"])))
+    return ids, (begins[0], begins[-1])
+
+
+def check_regressions(baseline: Dict[str, Any], results: List[Dict[str, Any]],
+                      max_latency_regression: float, max_rps_regression: float,
+                      max_error_rate: float) -> List[str]:
+    """Return a description of every threshold the results break."""
+    failures = []
+    by_level = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    for result in results:
+        c = result["concurrency"]
+        if result["error_rate"] > max_error_rate:
+            failures.append(f"c={c}: error rate {result['error_rate']:.2%} > {max_error_rate:.2%}")
+        old = by_level.get(c)
+        if not old:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if old[key] and result[key] > old[key] * (1 + max_latency_regression):
+                failures.append(f"c={c}: {key} {result[key]} vs baseline {old[key]} "
+                                f"(> +{max_latency_regression:.0%})")
+        if old["rps"] and result["rps"] < old["rps"] * (1 - max_rps_regression):
+            failures.append(f"c={c}: rps {result['rps']} vs baseline {old['rps']} "
+                            f"(> -{max_rps_regression:.0%})")
+    return failures
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_uvicorn(db_url: str, port: int, workers: int = 1) -> subprocess.Popen:
+    """Start `uvicorn api.main:app` against `db_url` and wait until it answers."""
+    env = dict(os.environ, DATABASE_URL=db_url)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("uvicorn exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("uvicorn did not start within 30s")
+
+
+def seed(db_url: str, rows: int, seed_value: int):
+    """Create the schema and fill an empty database with synthetic flares."""
+    from sqlalchemy import func, select
+    from common.models.model import SolarFlare
+
+    engine = make_engine(db_url)
+    use_engine(engine)
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(SolarFlare.__table__)).scalar()
+    if not existing:
+        print(f"Seeding {rows} solar flares...", file=sys.stderr)
+        seed_solar_flares(engine, rows, seed=seed_value)
+    return engine
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test for the solar flare API")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="base URL of a running API (skips seeding)")
+    target.add_argument("--serve", action="store_true", help="start a local uvicorn over --db")
+    parser.add_argument("--db", default="sqlite:///:memory:", help="database to seed (in-process or --serve)")
+    parser.add_argument("--scale", default="10k", help="rows to seed when the database is empty")
+    parser.add_argument("--start-date", help="with --url: first day of flares to sample (default: a year ago)")
+    parser.add_argument("--end-date", help="with --url: last day of flares to sample (default: today)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --serve")
+    parser.add_argument("--concurrency", default="1,4,16,32", help="comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", help=f"baseline JSON to check against (e.g. {DEFAULT_BASELINE})")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="write results as the new baseline")
+    parser.add_argument("--max-latency-regression", type=float, default=0.25, help="allowed p95/p99 increase")
+    parser.add_argument("--max-rps-regression", type=float, default=0.20, help="allowed throughput drop")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="allowed fraction of failed requests")
+    parser.add_argument("--output", help="write JSON results to this file")
+    return parser.parse_args(argv)
+
+
+async def _run(args) -> List[Dict[str, Any]]:
+    levels = [int(c) for c in args.concurrency.split(",")]
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+
+    server: Optional[subprocess.Popen] = None
+    workload = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60)
+    elif args.serve:
+        if args.db == "sqlite:///:memory:":
+            raise SystemExit("--serve needs a database the server process can open, e.g. sqlite:///load.db")
+        engine = seed(args.db, parse_scale(args.scale), args.seed)
+        workload = workload_from_db(engine)
+        engine.dispose()
+        port = _free_port()
+        server = start_uvicorn(args.db, port, args.workers)
+        client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60)
+    else:
+        workload = workload_from_db(seed(args.db, parse_scale(args.scale), args.seed))
+        from api.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=60)
+
+    try:
+        async with client:
+            if workload is None:
+                today = datetime.now(timezone.utc).date()
+                workload = await discover_workload(
+                    client, args.start_date or (today - timedelta(days=365)).isoformat(),
+                    args.end_date or today.isoformat(),
+                )
+            flr_ids, span = workload
+            mix = RequestMix(flr_ids, span, seed=args.seed)
+            return await sweep(client, mix, levels, args.duration)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    levels = asyncio.run(_run(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "target": args.url or ("uvicorn" if args.serve else "in-process"),
+            "database": args.db.split(":", 1)[0],
+            "scale": args.scale,
+            "duration": args.duration,
+        },
+        "levels": levels,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}", file=sys.stderr)
+
+    baseline = {}
+    if args.baseline and not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; skipping the regression check "
+              "(record one with --save-baseline).", file=sys.stderr)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check_regressions(baseline, levels, args.max_latency_regression,
+                                 args.max_rps_regression, args.max_error_rate)
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+from urllib.parse import parse_qs, urlparse
+
+
+class NASAStubServer:
+    """
+    Local stand-in for api.nasa.gov/DONKI so collection can be benchmarked
+    without network access or burning the real API quota.
+
+    Serves the given payloads on /DONKI/FLR, filtered by startDate/endDate the
+    same way DONKI does (inclusive, by day of beginTime).
+
+    Usage:
+        with NASAStubServer(payloads) as stub:
+            client.url = stub.url_for("FLR")
+    """
+    def __init__(self, payloads: List[Dict[str, Any]], host: str = "127.0.0.1", port: int = 0):
+        self.payloads = sorted(payloads, key=lambda p: p["beginTime"])
+        self.requests_served = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if not parsed.path.startswith("/DONKI/"):
+                    self.send_error(404)
+                    return
+                params = parse_qs(parsed.query)
+                start = params.get("startDate", [None])[0]
+                end = params.get("endDate", [None])[0]
+                body = json.dumps(stub.select(start, end)).encode()
+
+                stub.requests_served += 1
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-RateLimit-Limit", "1000")
+                self.send_header("X-RateLimit-Remaining", str(max(0, 1000 - stub.requests_served)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # keep benchmark output clean
+
+        return Handler
+
+    def select(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """Return payloads whose beginTime day falls within [start_date, end_date]."""
+        out = self.payloads
+        if start_date:
+            out = [p for p in out if p["beginTime"][:10] >= start_date]
+        if end_date:
+            out = [p for p in out if p["beginTime"][:10] <= end_date]
+        return out
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, event_type: str) -> str:
+        return f"{self.base_url}/DONKI/{event_type}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
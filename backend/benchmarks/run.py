@@ -0,0 +1,221 @@
+"""
+Reproducible benchmark suite for the ingest pipeline and API endpoints.
+
+Examples:
+    python -m benchmarks.run --scale 10k
+    python -m benchmarks.run --scale 100k --output bench-100k.json
+    python -m benchmarks.run --scale 100k --compare bench-100k.json
+
+Results are written as JSON (with the git commit) so runs can be compared across commits.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+os.environ.setdefault("NASA_API_KEY", "DEMO_KEY")
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from common import db
+from common.models.model import ActiveRegionSummary, SolarFlare
+from benchmarks.nasa_stub import NASAStubServer
+from benchmarks.stats import summarize, time_calls
+from benchmarks.synthetic import generate_donki_payloads, parse_scale, seed_solar_flares
+
+ANALYSIS_ENDPOINTS = ["peak-frequency", "activity-summary", "longest-flare"]
+
+
+def make_engine(url: str):
+    """Engine for benchmarks; in-memory SQLite needs a single shared connection."""
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    return create_engine(url)
+
+
+def use_engine(engine):
+    """Point DatabaseManager at the benchmark engine and set up the schema the way the API does."""
+    db.DatabaseManager._engine = engine
+    with contextlib.redirect_stdout(sys.stderr):  # stdout is kept for the JSON report
+        db.DatabaseManager.initialize_database()  # tables, added columns, indexes and region summaries
+    db.DatabaseManager._SessionLocal = sessionmaker(bind=engine)
+
+
+def clear_flares(engine):
+    with engine.begin() as conn:
+        conn.execute(ActiveRegionSummary.__table__.delete())
+        conn.execute(SolarFlare.__table__.delete())
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def bench_process(payloads: List[Dict[str, Any]], repeat: int) -> Dict[str, float]:
+    from data_collector.clients import NASAClient
+
+    latencies = time_calls(lambda: NASAClient.process_solar_flares(payloads), repeat)
+    return summarize(latencies, items=len(payloads) * repeat)
+
+
+def bench_fetch_and_insert(payloads: List[Dict[str, Any]], engine, repeat: int) -> Dict[str, float]:
+    from data_collector.clients import NASAClient
+
+    client = NASAClient(rate_limiter=None)  # the stub has no quota to protect
+    with NASAStubServer(payloads) as stub:
+        client.url = stub.url_for("FLR")
+        latencies = time_calls(
+            lambda: client.fetch_and_insert_solar_flares(),
+            repeat,
+            setup=lambda: clear_flares(engine),
+        )
+    return summarize(latencies, items=len(payloads) * repeat)
+
+
+def _random_windows(span_start: datetime, span_end: datetime, days: int, count: int, seed: int):
+    rng = random.Random(seed)
+    window = timedelta(days=days)
+    usable = max((span_end - span_start - window).total_seconds(), 0)
+    for _ in range(count):
+        start = span_start + timedelta(seconds=rng.uniform(0, usable))
+        yield start.isoformat(timespec="seconds"), (start + window).isoformat(timespec="seconds")
+
+
+def bench_api(engine, requests: int, list_days: int, analysis_days: int, seed: int) -> Dict[str, Dict[str, float]]:
+    from fastapi.testclient import TestClient
+    from api.main import app
+
+    with engine.connect() as conn:
+        span_start, span_end = conn.execute(
+            SolarFlare.__table__.select().with_only_columns(
+                func.min(SolarFlare.begin_time), func.max(SolarFlare.begin_time)
+            )
+        ).one()
+
+    client = TestClient(app)
+    results = {}
+
+    def run(path: str, days: int, **params) -> Dict[str, float]:
+        latencies, items, errors = [], 0, 0
+        for start, end in _random_windows(span_start, span_end, days, requests, seed):
+            began = time.perf_counter()
+            response = client.get(path, params={"start_date": start, "end_date": end, **params})
+            latencies.append(time.perf_counter() - began)
+            if response.status_code >= 500:
+                errors += 1
+            body = response.json()
+            if isinstance(body, list):
+                items += len(body)
+            else:
+                items += len(body["regions"]) if "regions" in body else 1
+        summary = summarize(latencies, items=items)
+        summary["server_errors"] = errors
+        return summary
+
+    results["GET /api/solar-flares"] = run("/api/solar-flares", list_days)
+    results["GET /api/solar-flares (near)"] = run(
+        "/api/solar-flares", analysis_days, near_lat=10, near_lon=-20, within_deg=15,
+    )
+    for name in ANALYSIS_ENDPOINTS:
+        results[f"GET /api/analysis/{name}"] = run(f"/api/analysis/{name}", analysis_days)
+    results["GET /api/analysis/regions"] = run("/api/analysis/regions", analysis_days)  # ignores the window
+    return results
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """Render a p50/p95/throughput comparison between two result files."""
+    lines = [
+        f"baseline {baseline['meta']['commit']} vs current {current['meta']['commit']}",
+        f"{'benchmark':45} {'p50 ms':>18} {'p95 ms':>18} {'throughput/s':>22}",
+    ]
+    for name, cur in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+
+        def cell(key):
+            delta = (cur[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            return f"{cur[key]:.2f} ({delta:+.1f}%)"
+
+        lines.append(f"{name:45} {cell('p50_ms'):>18} {cell('p95_ms'):>18} {cell('throughput_per_s'):>22}")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingest and API performance")
+    parser.add_argument("--scale", default="10k", help="rows to seed: 10k, 100k, 1m or an integer")
+    parser.add_argument("--db", default="sqlite:///:memory:", help="SQLAlchemy URL of a scratch database")
+    parser.add_argument("--ingest-batch", type=int, default=5_000,
+                        help="payloads per ingest run (a collection window, capped at --scale)")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions for ingest benchmarks")
+    parser.add_argument("--requests", type=int, default=50, help="requests per API endpoint")
+    parser.add_argument("--list-days", type=int, default=30, help="date window for listing requests")
+    parser.add_argument("--analysis-days", type=int, default=365, help="date window for analysis requests")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--output", help="write JSON results to this file")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    rows = parse_scale(args.scale)
+    engine = make_engine(args.db)
+    use_engine(engine)
+    clear_flares(engine)
+
+    results: Dict[str, Dict[str, float]] = {}
+
+    if not args.skip_ingest:
+        batch = list(generate_donki_payloads(min(args.ingest_batch, rows), seed=args.seed))
+        print(f"Benchmarking ingest with {len(batch)} payloads x {args.repeat}...", file=sys.stderr)
+        # The collector logs with print(); keep stdout for the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            results["process_solar_flares"] = bench_process(batch, args.repeat)
+            results["fetch_and_insert_solar_flares"] = bench_fetch_and_insert(batch, engine, args.repeat)
+        clear_flares(engine)
+
+    if not args.skip_api:
+        print(f"Seeding {rows} solar flares...", file=sys.stderr)
+        seed_solar_flares(engine, rows, seed=args.seed)
+        print(f"Benchmarking API with {args.requests} requests per endpoint...", file=sys.stderr)
+        results.update(bench_api(engine, args.requests, args.list_days, args.analysis_days, args.seed))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "scale": rows,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare_reports(json.load(f), report), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
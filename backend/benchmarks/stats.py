@@ -0,0 +1,45 @@
+import math
+import time
+from typing import Callable, Dict, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; `values` need not be sorted."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: List[float], items: int = None, wall_seconds: float = None) -> Dict[str, float]:
+    """
+    Summarize a list of per-call latencies (seconds).
+    `items` is the number of logical records processed (defaults to the number of calls),
+    used for throughput. `wall_seconds` defaults to the sum of latencies.
+    """
+    calls = len(latencies)
+    items = calls if items is None else items
+    wall = sum(latencies) if wall_seconds is None else wall_seconds
+    return {
+        "calls": calls,
+        "items": items,
+        "throughput_per_s": round(items / wall, 2) if wall else 0.0,
+        "mean_ms": round(sum(latencies) / calls * 1000, 3) if calls else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3) if calls else 0.0,
+    }
+
+
+def time_calls(fn: Callable[[], object], repeat: int, setup: Callable[[], object] = None) -> List[float]:
+    """Run `fn` `repeat` times (calling `setup` untimed before each run) and return latencies."""
+    latencies = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
@@ -0,0 +1,128 @@
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from common.models.model import SolarFlare
+from common.regions import rebuild_region_summaries
+
+
+# Rough share of GOES classes in the DONKI catalog (C dominates, X is rare)
+CLASS_WEIGHTS = {"B": 0.08, "C": 0.70, "M": 0.20, "X": 0.02}
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# ~30 flares a day over a solar maximum, so 1M rows span roughly a century
+FLARE_SPACING_MINUTES = 48
+
+
+def parse_scale(scale: str) -> int:
+    """Accept '10k' / '100k' / '1m' or a plain integer."""
+    key = scale.lower()
+    if key in SCALES:
+        return SCALES[key]
+    return int(scale)
+
+
+def _fmt(ts: datetime) -> str:
+    """DONKI timestamps look like 2024-05-10T06:27Z."""
+    return ts.strftime("%Y-%m-%dT%H:%MZ")
+
+
+def _class_type(rng: random.Random) -> str:
+    letter = rng.choices(list(CLASS_WEIGHTS), weights=list(CLASS_WEIGHTS.values()))[0]
+    return f"{letter}{rng.uniform(1.0, 9.9):.1f}"
+
+
+def _source_location(rng: random.Random) -> str:
+    lat = rng.randint(0, 35)
+    lon = rng.randint(0, 90)
+    return f"{rng.choice('NS')}{lat:02d}{rng.choice('EW')}{lon:02d}"
+
+
+def generate_donki_payloads(
+    n: int,
+    start: datetime = datetime(1990, 1, 1),
+    seed: int = 42,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield `n` synthetic DONKI FLR payloads shaped like api.nasa.gov responses.
+    Output is deterministic for a given seed so runs are comparable across commits.
+    """
+    rng = random.Random(seed)
+    begin = start
+    for i in range(n):
+        begin += timedelta(minutes=rng.randint(1, 2 * FLARE_SPACING_MINUTES))
+        peak = begin + timedelta(minutes=rng.randint(2, 30))
+        # A few recent flares have no endTime yet, same as the live feed
+        end = peak + timedelta(minutes=rng.randint(5, 90)) if rng.random() > 0.03 else None
+
+        linked = None
+        if rng.random() < 0.15:
+            linked = [{"activityID": f"{begin.strftime('%Y-%m-%dT%H:%M:%S')}-CME-001"}]
+
+        yield {
+            "flrID": f"{begin.strftime('%Y-%m-%dT%H:%M:%S')}-FLR-{i % 1000:03d}",
+            "catalog": "M2M_CATALOG",
+            "instruments": [{"displayName": "GOES-P: EXIS 1.0-8.0"}],
+            "beginTime": _fmt(begin),
+            "peakTime": _fmt(peak),
+            "endTime": _fmt(end) if end else None,
+            "classType": _class_type(rng),
+            "sourceLocation": _source_location(rng),
+            "activeRegionNum": rng.randint(10000, 14000) if rng.random() > 0.1 else None,
+            "note": "",
+            "submissionTime": _fmt(peak + timedelta(hours=1)),
+            "versionId": 1,
+            "link": "https://webtools.ccmc.gsfc.nasa.gov/DONKI/view/FLR/0/-1",
+            "linkedEvents": linked,
+        }
+
+
+def generate_flare_rows(n: int, start: datetime = datetime(1990, 1, 1), seed: int = 42) -> Iterator[Dict[str, Any]]:
+    """
+    Yield `n` dicts ready for a Core insert into `solar_flares`.
+    Bypasses the ORM so seeding 1M rows takes seconds rather than minutes.
+    """
+    from common.utils import parse_source_location, parse_time
+
+    for seq, payload in enumerate(generate_donki_payloads(n, start=start, seed=seed), start=1):
+        latitude, longitude = parse_source_location(payload["sourceLocation"]) or (None, None)
+        yield {
+            "flr_id": payload["flrID"],
+            "begin_time": parse_time(payload["beginTime"]),
+            "peak_time": parse_time(payload["peakTime"]),
+            "end_time": parse_time(payload["endTime"]) if payload["endTime"] else None,
+            "class_type": payload["classType"],
+            "source_location": payload["sourceLocation"],
+            "active_region_num": payload["activeRegionNum"],
+            "linked_events": payload["linkedEvents"],
+            "ingest_seq": seq,
+            "latitude": latitude,
+            "longitude": longitude,
+        }
+
+
+def seed_solar_flares(engine, n: int, chunk_size: int = 10_000, seed: int = 42) -> int:
+    """
+    Bulk insert `n` synthetic SolarFlare rows and rebuild active_region_summary, which
+    ingest would otherwise keep current. Returns the number of rows written.
+    """
+    table = SolarFlare.__table__
+    written = 0
+    chunk: List[Dict[str, Any]] = []
+    with engine.begin() as conn:
+        for row in generate_flare_rows(n, seed=seed):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                conn.execute(insert(table), chunk)
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            conn.execute(insert(table), chunk)
+            written += len(chunk)
+    with Session(engine) as session, session.begin():
+        rebuild_region_summaries(session)
+    return written
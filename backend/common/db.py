@@ -1,11 +1,51 @@
-import psycopg2
+import time
+import threading
 from contextlib import contextmanager
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from common.models.model import Base
+from contextvars import ContextVar
+from prometheus_client import Histogram
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import Session, sessionmaker
+from common.models.model import Base, postgres_index_ddl
 import common.environment as env
 
 
+def _backfill_coordinates(conn, batch_size: int = 5000):
+    """Parse source_location of existing flares into latitude/longitude, one page of ids at a time."""
+    from common.utils import parse_source_location
+
+    page = text(
+        "SELECT id, source_location FROM solar_flares"
+        " WHERE source_location IS NOT NULL AND latitude IS NULL AND id > :last"
+        " ORDER BY id LIMIT :limit"
+    )
+    statement = text("UPDATE solar_flares SET latitude = :latitude, longitude = :longitude WHERE id = :id")
+    last = 0
+    while True:
+        rows = conn.execute(page, {"last": last, "limit": batch_size}).fetchall()
+        if not rows:
+            return
+        # Unparseable locations stay NULL, so paging is by id rather than by what's left
+        last = rows[-1][0]
+        updates = [
+            {"id": row_id, "latitude": coords[0], "longitude": coords[1]}
+            for row_id, location in rows
+            if (coords := parse_source_location(location))
+        ]
+        if updates:
+            conn.execute(statement, updates)
+
+
+# Backfills for columns added to a model after its table was first created,
+# run once by DatabaseManager.upgrade_schema after the table's missing columns are added.
+# Values are SQL strings or callables taking a Connection.
+SCHEMA_BACKFILLS = {
+    # Existing rows enter the change feed in insertion order
+    ("solar_flares", "ingest_seq"): "UPDATE solar_flares SET ingest_seq = id WHERE ingest_seq IS NULL",
+    # Fills longitude too
+    ("solar_flares", "latitude"): _backfill_coordinates,
+}
+
+
 class DatabaseManager:
     """
     Singleton-like manager to handle database initialization and session handling.
@@ -13,10 +53,13 @@ class DatabaseManager:
     """
     _engine = None
     _SessionLocal = None
+    _lock = threading.Lock()
 
     @classmethod
     def create_database(cls):
         """Check if the database exists; if not, create it."""
+        import psycopg2  # only needed for local auto-create, keep it off the import path
+
         user, password = env.get_db_credentials()
         host = env.get_db_host()
         port = env.get_db_port()
@@ -53,17 +96,24 @@ class DatabaseManager:
     
     @classmethod
     def get_engine(cls):
-        """Lazy initialize the engine."""
-        if cls._engine is None:
-            db_url = env.get_database_url()
+        """
+        Lazy initialize the engine. Thread-safe, so the startup warmup and early requests
+        don't race; the session factory is only published once the schema is ready.
+        """
+        if cls._SessionLocal is None:
+            with cls._lock:
+                if cls._SessionLocal is None:
+                    db_url = env.get_database_url()
 
-            # Only try to auto-create DB if using local credentials, not DATABASE_URL
-            if "localhost" in db_url or "127.0.0.1" in db_url:
-                cls.create_database()
+                    # Only try to auto-create DB if using local credentials, not DATABASE_URL
+                    if "localhost" in db_url or "127.0.0.1" in db_url:
+                        cls.create_database()
 
-            cls._engine = create_engine(db_url, echo=True)
-            cls._SessionLocal = sessionmaker(bind=cls._engine)
-            cls.initialize_database()
+                    cls._engine = create_engine(db_url, echo=True)
+                    if env.get_db_profiling_enabled():
+                        QueryProfiler.install(cls._engine)
+                    cls.initialize_database()
+                    cls._SessionLocal = sessionmaker(bind=cls._engine)
         return cls._engine
 
     @classmethod
@@ -72,10 +122,77 @@ class DatabaseManager:
         try:
             print("Initializing database schema...")
             Base.metadata.create_all(bind=cls._engine)
+            cls.upgrade_schema()
+            from common.regions import ensure_region_summaries
+            with Session(cls._engine) as session, session.begin():
+                ensure_region_summaries(session)
+            if cls._engine.dialect.name == "postgresql":
+                with cls._engine.begin() as conn:
+                    for ddl in postgres_index_ddl():
+                        conn.exec_driver_sql(ddl)
+                if env.get_db_partitioning_enabled():
+                    from common.partitioning import ensure_partitioned
+                    ensure_partitioned(cls._engine)
         except Exception as e:
             print(f"Error initializing database: {e}")
             raise
 
+    @classmethod
+    def upgrade_schema(cls, engine=None):
+        """
+        Add model columns missing from existing tables (create_all only creates whole tables),
+        create their indexes and run any SCHEMA_BACKFILLS. New columns must be nullable.
+        """
+        engine = engine or cls._engine
+        inspector = inspect(engine)
+        with engine.begin() as conn:
+            for table in Base.metadata.sorted_tables:
+                if not inspector.has_table(table.name):
+                    continue
+                present = {column["name"] for column in inspector.get_columns(table.name)}
+                added = [column for column in table.columns if column.name not in present]
+                for column in added:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    print(f"Adding column {table.name}.{column.name} ({column_type})")
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                # Backfills run once every new column exists, so one may fill several
+                for column in added:
+                    backfill = SCHEMA_BACKFILLS.get((table.name, column.name))
+                    if callable(backfill):
+                        backfill(conn)
+                    elif backfill:
+                        conn.exec_driver_sql(backfill)
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+
+    @classmethod
+    def warmup(cls):
+        """
+        Initialize the engine, open the connection pool and run the hot API queries once,
+        so the first requests after a restart don't pay for schema setup, connects and
+        statement compilation. Meant to run in the background at startup.
+        """
+        from common.models.model import SolarFlare
+
+        started = time.perf_counter()
+        engine = cls.get_engine()
+
+        pool_size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+        connections = [engine.connect() for _ in range(pool_size)]
+        for conn in connections:
+            conn.exec_driver_sql("SELECT 1")
+            conn.close()  # back to the pool, still open
+
+        # Same statement shapes as the endpoints, with parameters that match nothing,
+        # so SQLAlchemy's compiled cache (and the server's catalog cache) are warm
+        with cls.session_scope() as session:
+            session.query(SolarFlare).filter_by(flr_id="").first()
+            session.query(SolarFlare).filter(
+                SolarFlare.begin_time >= "9999-12-31", SolarFlare.end_time <= "0001-01-01"
+            ).all()
+
+        print(f"Database warmup finished in {time.perf_counter() - started:.2f}s ({pool_size} connections)")
+
     @classmethod
     @contextmanager
     def session_scope(cls):
@@ -99,3 +216,118 @@ class DatabaseManager:
             raise
         finally:
             session.close()
+
+
+class QueryStats:
+    """Per-request tally of statements, rows and time spent in the database."""
+    __slots__ = ("queries", "rows", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.db_time = 0.0
+
+
+class QueryProfiler:
+    """
+    Opt-in statement profiling through SQLAlchemy engine events (DB_PROFILING=1).
+    Times every statement, tallies it into the current request's QueryStats and
+    logs statements slower than DB_SLOW_QUERY_MS together with their EXPLAIN plan.
+    Usage:
+        stats, token = QueryProfiler.start_request()
+        ...  # handle request
+        QueryProfiler.end_request(token)
+    """
+    _current: ContextVar = ContextVar("query_stats", default=None)
+
+    STATEMENT_DURATION = Histogram(
+        "db_statement_duration_seconds",
+        "Time spent executing a single SQL statement",
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    )
+    REQUEST_QUERIES = Histogram(
+        "http_request_db_queries",
+        "SQL statements executed per HTTP request",
+        ["handler"],
+        buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100, 250),
+    )
+    REQUEST_ROWS = Histogram(
+        "http_request_db_rows",
+        "Rows reported by the DB driver per HTTP request",
+        ["handler"],
+        buckets=(0, 1, 10, 100, 1000, 10000, 100000),
+    )
+    REQUEST_DB_TIME = Histogram(
+        "http_request_db_duration_seconds",
+        "Time spent in the database per HTTP request",
+        ["handler"],
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )
+
+    EXPLAIN_PREFIX = {"postgresql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}
+
+    @classmethod
+    def install(cls, engine):
+        """Attach timing hooks to an engine."""
+        if not event.contains(engine, "before_cursor_execute", cls._before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", cls._before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", cls._after_cursor_execute)
+
+    @classmethod
+    def uninstall(cls, engine):
+        if event.contains(engine, "before_cursor_execute", cls._before_cursor_execute):
+            event.remove(engine, "before_cursor_execute", cls._before_cursor_execute)
+            event.remove(engine, "after_cursor_execute", cls._after_cursor_execute)
+
+    @classmethod
+    def start_request(cls):
+        """Begin collecting stats for the current request context. Returns (stats, token)."""
+        stats = QueryStats()
+        return stats, cls._current.set(stats)
+
+    @classmethod
+    def end_request(cls, token):
+        cls._current.reset(token)
+
+    @classmethod
+    def observe_request(cls, handler: str, stats: QueryStats):
+        """Record a finished request's totals in the Prometheus histograms."""
+        cls.REQUEST_QUERIES.labels(handler).observe(stats.queries)
+        cls.REQUEST_ROWS.labels(handler).observe(stats.rows)
+        cls.REQUEST_DB_TIME.labels(handler).observe(stats.db_time)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @classmethod
+    def _after_cursor_execute(cls, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        cls.STATEMENT_DURATION.observe(elapsed)
+
+        stats = cls._current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.rows += max(cursor.rowcount, 0)  # -1 when the driver doesn't know
+            stats.db_time += elapsed
+
+        if elapsed * 1000 >= env.get_slow_query_ms():
+            plan = None if executemany else cls._explain(conn, cursor, statement, parameters)
+            print(f"[slow query] {elapsed * 1000:.1f}ms: {statement} params={parameters}")
+            if plan:
+                print(f"[slow query] plan:\n{plan}")
+
+    @classmethod
+    def _explain(cls, conn, cursor, statement, parameters):
+        """Run EXPLAIN for a slow SELECT on a raw cursor so it isn't profiled itself."""
+        prefix = cls.EXPLAIN_PREFIX.get(conn.dialect.name)
+        if not prefix or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+        try:
+            explain_cursor = cursor.connection.cursor()
+            explain_cursor.execute(prefix + statement, parameters)
+            rows = explain_cursor.fetchall()
+            explain_cursor.close()
+            return "\n".join(" ".join(str(col) for col in row) for row in rows)
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
@@ -0,0 +1,74 @@
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Intervals given without an end are open-ended (callers cap them first where that's wrong,
+# see common.queries.FlareIntervalIndex)
+OPEN_END = datetime.max
+
+
+class IntervalTree(Generic[T]):
+    """
+    Static interval tree over closed intervals [start, end].
+
+    Intervals are sorted by start and viewed as an implicit balanced BST (the
+    middle element of each slice is the node), augmented with the maximum end
+    of every subtree. An overlap query only descends into subtrees whose max
+    end reaches the query start, and only into starts <= query end, so it runs
+    in O(log n + k) for k results instead of scanning every interval.
+
+    Usage:
+        tree = IntervalTree([(begin, end, flare_id), ...])
+        tree.overlapping(window_start, window_end)  # -> [flare_id, ...]
+        tree.at(moment)
+    """
+    def __init__(self, intervals: Iterable[Tuple[Any, Optional[Any], T]]):
+        items = sorted(
+            ((start, OPEN_END if end is None else end, value) for start, end, value in intervals),
+            key=lambda item: item[0],
+        )
+        self._starts = [item[0] for item in items]
+        self._ends = [item[1] for item in items]
+        self._values = [item[2] for item in items]
+        self._max_end: List[Any] = [None] * len(items)
+        if items:
+            self._build(0, len(items))
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def _build(self, lo: int, hi: int):
+        """Fill _max_end for the subtree rooted at the middle of [lo, hi). Returns its max end."""
+        mid = (lo + hi) // 2
+        best = self._ends[mid]
+        if lo < mid:
+            best = max(best, self._build(lo, mid))
+        if mid + 1 < hi:
+            best = max(best, self._build(mid + 1, hi))
+        self._max_end[mid] = best
+        return best
+
+    def overlapping(self, start: Any, end: Any) -> List[T]:
+        """Values of all intervals that intersect [start, end], in start order."""
+        limit = bisect_right(self._starts, end)  # only intervals starting by `end` can overlap
+        found: List[T] = []
+        self._collect(0, len(self._starts), start, limit, found)
+        return found
+
+    def _collect(self, lo: int, hi: int, start: Any, limit: int, found: List[T]):
+        """In-order walk of the subtree for [lo, hi), pruned by start index and max end."""
+        if lo >= hi or lo >= limit:
+            return
+        mid = (lo + hi) // 2
+        if self._max_end[mid] < start:
+            return  # nothing in this subtree reaches the window
+        self._collect(lo, mid, start, limit, found)
+        if mid < limit and self._ends[mid] >= start:
+            found.append(self._values[mid])
+        self._collect(mid + 1, hi, start, limit, found)
+
+    def at(self, moment: Any) -> List[T]:
+        """Values of all intervals active at `moment`."""
+        return self.overlapping(moment, moment)
@@ -1,8 +1,31 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, JSON
+from sqlalchemy import create_engine, Column, Index, Integer, BigInteger, String, Text, DateTime, Float, JSON
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
+# A flare DONKI never gave an endTime counts as active for this long after it began, so
+# a stale record doesn't match every later overlap query (long-duration events last hours)
+OPEN_FLARE_HOURS = 12
+
+# Postgres-only indexes on solar_flares that create_all can't express portably
+# (name -> definition); applied by DatabaseManager.initialize_database. The GiST
+# index backs interval overlap lookups, see common.queries.flare_range_expr.
+POSTGRES_INDEXES = {
+    "ix_solar_flares_active_span":
+        "USING gist (tsrange(begin_time, COALESCE(end_time, begin_time + "
+        f"interval '{OPEN_FLARE_HOURS} hours'), '[]'))",
+}
+# Earlier definitions the queries no longer match; dropped when the schema is set up
+RETIRED_POSTGRES_INDEXES = ("ix_solar_flares_active_range",)
+
+
+def postgres_index_ddl(table: str = "solar_flares", suffix: str = "") -> list:
+    """CREATE INDEX statements for POSTGRES_INDEXES on `table`, index names suffixed with `suffix`."""
+    return [f"DROP INDEX IF EXISTS {name}{suffix}" for name in RETIRED_POSTGRES_INDEXES] + [
+        f"CREATE INDEX IF NOT EXISTS {name}{suffix} ON {table} {definition}"
+        for name, definition in POSTGRES_INDEXES.items()
+    ]
+
 class SolarFlare(Base):
     __tablename__ = "solar_flares"
 
@@ -13,9 +36,25 @@ class SolarFlare(Base):
     end_time = Column(DateTime)
     class_type = Column(String(5), nullable=False)
     source_location = Column(String(20))
-    active_region_num = Column(Integer)
+    active_region_num = Column(Integer, index=True)
     linked_events = Column(JSON)
+    # Increases with every insert or revision; drives /api/solar-flares/changes
+    ingest_seq = Column(BigInteger, index=True)
+    ingested_at = Column(DateTime)
+    # Heliographic degrees parsed from source_location (north and west positive)
+    latitude = Column(Float)
+    longitude = Column(Float)
+
+    __table_args__ = (
+        Index("ix_solar_flares_lat_lon", "latitude", "longitude"),
+    )
 
+    # Fields DONKI may revise after first publication
+    REVISABLE_FIELDS = (
+        "begin_time", "peak_time", "end_time", "class_type",
+        "source_location", "active_region_num", "linked_events",
+        "latitude", "longitude",
+    )
 
     def to_dict(self):
         """
@@ -31,4 +70,139 @@ class SolarFlare(Base):
             "source_location": self.source_location,
             "active_region_num": self.active_region_num,
             "linked_events": self.linked_events,
-        }
\ No newline at end of file
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+        }
+
+
+class ActiveRegionSummary(Base):
+    """
+    Per-active-region rollup of solar_flares, kept current at ingest by
+    common.regions.refresh_region_summaries; backs /api/analysis/regions.
+    """
+    __tablename__ = "active_region_summary"
+
+    active_region_num = Column(Integer, primary_key=True, autoincrement=False)
+    flare_count = Column(Integer, nullable=False, default=0)
+    a_count = Column(Integer, nullable=False, default=0)
+    b_count = Column(Integer, nullable=False, default=0)
+    c_count = Column(Integer, nullable=False, default=0)
+    m_count = Column(Integer, nullable=False, default=0)
+    x_count = Column(Integer, nullable=False, default=0)
+    first_flare_time = Column(DateTime)
+    last_flare_time = Column(DateTime)
+    strongest_flr_id = Column(String(50))
+    strongest_class = Column(String(5))
+    strongest_flux = Column(Float)
+    updated_at = Column(DateTime)
+
+    def to_dict(self):
+        return {
+            "active_region_num": self.active_region_num,
+            "flare_count": self.flare_count,
+            "class_counts": {
+                "A": self.a_count, "B": self.b_count, "C": self.c_count,
+                "M": self.m_count, "X": self.x_count,
+            },
+            "first_flare_time": self.first_flare_time,
+            "last_flare_time": self.last_flare_time,
+            "strongest_flr_id": self.strongest_flr_id,
+            "strongest_class": self.strongest_class,
+            "strongest_flux": self.strongest_flux,
+        }
+
+
+class CoronalMassEjection(Base):
+    """DONKI CME event; solar flares link to these through linked_events."""
+    __tablename__ = "coronal_mass_ejections"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    activity_id = Column(String(50), unique=True, nullable=False)
+    start_time = Column(DateTime, nullable=False, index=True)
+    source_location = Column(String(20))
+    active_region_num = Column(Integer)
+    # From the most accurate cmeAnalyses entry, if any
+    speed = Column(Float)
+    half_angle = Column(Float)
+    analysis_type = Column(String(5))
+    linked_events = Column(JSON)
+
+    REVISABLE_FIELDS = (
+        "start_time", "source_location", "active_region_num",
+        "speed", "half_angle", "analysis_type", "linked_events",
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "activity_id": self.activity_id,
+            "start_time": self.start_time,
+            "source_location": self.source_location,
+            "active_region_num": self.active_region_num,
+            "speed": self.speed,
+            "half_angle": self.half_angle,
+            "analysis_type": self.analysis_type,
+            "linked_events": self.linked_events,
+        }
+
+
+class GeomagneticStorm(Base):
+    """DONKI GST event."""
+    __tablename__ = "geomagnetic_storms"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    gst_id = Column(String(50), unique=True, nullable=False)
+    start_time = Column(DateTime, nullable=False, index=True)
+    max_kp_index = Column(Float)
+    linked_events = Column(JSON)
+
+    REVISABLE_FIELDS = ("start_time", "max_kp_index", "linked_events")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "gst_id": self.gst_id,
+            "start_time": self.start_time,
+            "max_kp_index": self.max_kp_index,
+            "linked_events": self.linked_events,
+        }
+
+
+class SolarEnergeticParticle(Base):
+    """DONKI SEP event."""
+    __tablename__ = "solar_energetic_particles"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sep_id = Column(String(50), unique=True, nullable=False)
+    event_time = Column(DateTime, nullable=False, index=True)
+    instruments = Column(JSON)
+    linked_events = Column(JSON)
+
+    REVISABLE_FIELDS = ("event_time", "instruments", "linked_events")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "sep_id": self.sep_id,
+            "event_time": self.event_time,
+            "instruments": self.instruments,
+            "linked_events": self.linked_events,
+        }
+
+
+class CollectionOutbox(Base):
+    """
+    Collection requests waiting to be published to RabbitMQ. The API inserts a row in
+    its own transaction and common.outbox.OutboxRelay publishes it; published_at is
+    NULL until the broker confirms the message.
+    """
+    __tablename__ = "collection_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    queue = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    available_at = Column(DateTime, nullable=False, index=True)  # next attempt, pushed back on failure
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    published_at = Column(DateTime, index=True)
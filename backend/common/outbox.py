@@ -0,0 +1,194 @@
+"""
+Transactional outbox for collection requests.
+
+The API records a request with `enqueue` inside its own DB transaction and returns;
+OutboxRelay publishes pending rows to RabbitMQ in batches with publisher confirms and
+marks them published. A broker outage only delays delivery: failed rows are retried
+with capped exponential backoff. Delivery is at-least-once (a crash between the
+confirm and the commit republishes), which the collector's upserts tolerate.
+
+The relay runs in the API process (OUTBOX_RELAY, on by default) or standalone:
+    python -m common.outbox
+On Postgres, several relays can run at once; rows are claimed with FOR UPDATE SKIP LOCKED.
+"""
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from prometheus_client import Counter
+
+import common.environment as env
+from common import db
+from common.models.model import CollectionOutbox
+
+OUTBOX_PUBLISHED = Counter(
+    "collection_outbox_published_total",
+    "Outbox rows published to RabbitMQ and confirmed by the broker",
+)
+OUTBOX_FAILURES = Counter(
+    "collection_outbox_publish_failures_total",
+    "Outbox publish attempts that failed and will be retried",
+)
+
+MAX_RETRY_DELAY = 300  # seconds
+PRUNE_AFTER = timedelta(days=7)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue(session, queue: str, message: dict) -> CollectionOutbox:
+    """Add a message for `queue` to the outbox; it is sent once `session` commits."""
+    now = _utcnow()
+    entry = CollectionOutbox(queue=queue, payload=message, created_at=now, available_at=now, attempts=0)
+    session.add(entry)
+    session.flush()  # assigns the id
+    return entry
+
+
+class RabbitMQPublisher:
+    """Keeps one confirming channel open between batches."""
+    def __init__(self, url: str = None):
+        self.url = url
+        self._connection = None
+        self._channel = None
+        self._declared = set()
+
+    def _open(self):
+        # Imported on first use so the API process doesn't pay for pika at startup
+        import pika
+
+        if self._channel is None or self._channel.is_closed:
+            self.close()
+            self._connection = pika.BlockingConnection(pika.URLParameters(self.url or env.get_rabbitmq_url()))
+            self._channel = self._connection.channel()
+            self._channel.confirm_delivery()
+            self._declared = set()
+        return self._channel
+
+    def publish(self, queue: str, message: dict):
+        """Publish and wait for the broker's confirm. Raises on nack, unroutable or connection errors."""
+        import pika
+
+        channel = self._open()
+        if queue not in self._declared:
+            channel.queue_declare(queue=queue, durable=True)
+            self._declared.add(queue)
+        channel.basic_publish(
+            exchange='',
+            routing_key=queue,
+            body=json.dumps(message),
+            properties=pika.BasicProperties(
+                delivery_mode=2,  # Make the message persistent
+                timestamp=int(time.time()),  # Lets the worker measure queue lag
+            ),
+            mandatory=True,
+        )
+
+    def close(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+
+
+class OutboxRelay:
+    """Publishes pending outbox rows; one instance per process."""
+    _wakeup = threading.Event()
+    _stop = threading.Event()
+    _thread: Optional[threading.Thread] = None
+
+    def __init__(self, publisher=None, batch_size: int = 100):
+        self.publisher = publisher or RabbitMQPublisher()
+        self.batch_size = batch_size
+
+    @classmethod
+    def notify(cls):
+        """Wake the in-process relay right away instead of at its next poll."""
+        cls._wakeup.set()
+
+    @staticmethod
+    def retry_delay(attempts: int) -> float:
+        return min(MAX_RETRY_DELAY, 2 ** attempts)
+
+    def publish_pending(self) -> int:
+        """Publish one batch of due rows. Returns how many were confirmed."""
+        now = _utcnow()
+        published = 0
+        with db.DatabaseManager.session_scope() as session:
+            query = (
+                session.query(CollectionOutbox)
+                .filter(CollectionOutbox.published_at.is_(None), CollectionOutbox.available_at <= now)
+                .order_by(CollectionOutbox.id)
+                .limit(self.batch_size)
+            )
+            if session.get_bind().dialect.name == "postgresql":
+                query = query.with_for_update(skip_locked=True)
+
+            for entry in query.all():
+                try:
+                    self.publisher.publish(entry.queue, entry.payload)
+                except Exception as e:
+                    entry.attempts += 1
+                    entry.last_error = str(e)[:1000] or type(e).__name__
+                    entry.available_at = now + timedelta(seconds=self.retry_delay(entry.attempts))
+                    OUTBOX_FAILURES.inc()
+                    print(f"Outbox publish of #{entry.id} failed (attempt {entry.attempts}): {e!r}")
+                    self.publisher.close()  # reconnect for the next batch
+                    break  # the broker is likely down; leave the rest for later
+                entry.published_at = _utcnow()
+                entry.attempts += 1
+                published += 1
+        OUTBOX_PUBLISHED.inc(published)
+        return published
+
+    def prune(self, older_than: timedelta = PRUNE_AFTER) -> int:
+        """Delete rows published more than `older_than` ago."""
+        with db.DatabaseManager.session_scope() as session:
+            return session.query(CollectionOutbox).filter(
+                CollectionOutbox.published_at < _utcnow() - older_than
+            ).delete(synchronize_session=False)
+
+    def run(self, poll_seconds: float = None):
+        """Publish until stopped, draining full batches back to back."""
+        poll_seconds = poll_seconds or env.get_outbox_poll_seconds()
+        last_prune = 0.0
+        while not self._stop.is_set():
+            self._wakeup.clear()  # before publishing, so a notify() during the batch isn't lost
+            try:
+                if self.publish_pending() == self.batch_size:
+                    continue
+                if time.monotonic() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.monotonic()
+            except Exception as e:
+                print(f"Outbox relay error: {e}")
+            self._wakeup.wait(poll_seconds)
+        self.publisher.close()
+
+    @classmethod
+    def start(cls, **kwargs) -> "OutboxRelay":
+        relay = cls(**kwargs)
+        cls._stop.clear()
+        cls._thread = threading.Thread(target=relay.run, name="outbox-relay", daemon=True)
+        cls._thread.start()
+        return relay
+
+    @classmethod
+    def stop(cls):
+        cls._stop.set()
+        cls._wakeup.set()
+
+
+if __name__ == "__main__":
+    try:
+        OutboxRelay().run()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,281 @@
+"""
+Optional declarative range partitioning of solar_flares by year of begin_time (Postgres only).
+
+Converting the table is an explicit deployment step, never done at startup (the API and
+the worker both start up and would race on the swap). Empty or not, it is moved online,
+in batches, with:
+    python -m common.partitioning migrate --batch-size 10000
+With DB_PARTITIONING=1, partitions for the coming years are then created at startup and
+before each collection run, or by hand:
+    python -m common.partitioning ensure --years-ahead 2
+
+Postgres requires the partition key in every unique constraint, so the partitioned table
+has PRIMARY KEY (id, begin_time) and UNIQUE (flr_id, begin_time). flr_id stays globally
+unique through the solar_flares_flr_ids registry: a trigger adds every inserted flr_id
+to it (its primary key rejects a duplicate, even one with a different begin_time) and
+removes deleted ones. Revisions that move begin_time update the row in place, across
+partitions, so they keep their registry entry.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List
+
+from sqlalchemy import text
+
+from common.models.model import POSTGRES_INDEXES, SolarFlare
+
+TABLE = SolarFlare.__tablename__
+NEW_TABLE = f"{TABLE}_partitioned"
+OLD_TABLE = f"{TABLE}_unpartitioned"
+LOG_TABLE = f"{TABLE}_migration_log"
+FLR_ID_REGISTRY = f"{TABLE}_flr_ids"
+DEFAULT_PARTITION = f"{TABLE}_default"
+FLR_ID_INDEX = f"ix_{TABLE}_flr_id"
+NEW_SUFFIX = "_new"
+
+
+def partition_name(year: int) -> str:
+    return f"{TABLE}_y{year}"
+
+
+def is_partitioned(conn, table: str = TABLE) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+             "WHERE c.relname = :table"),
+        {"table": table},
+    ).first() is not None
+
+
+def _table_exists(conn, table: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}).scalar()
+
+
+def create_year_partition(conn, year: int, parent: str = TABLE):
+    """Partition holding flares that began in `year`."""
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(year)} PARTITION OF {parent} "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+    )
+
+
+def ensure_future_partitions(engine, years_ahead: int = 1) -> List[int]:
+    """
+    Create partitions for the current year and `years_ahead` following years, so new
+    flares never land in the default partition. Returns the years now covered.
+    """
+    current = datetime.now(timezone.utc).year
+    years = list(range(current, current + years_ahead + 1))
+    with engine.connect() as conn:
+        if not is_partitioned(conn):
+            return []
+    for year in years:
+        try:
+            with engine.begin() as conn:
+                create_year_partition(conn, year)
+        except Exception as e:
+            # Typically rows for that year already sit in the default partition
+            print(f"Could not create partition for {year}: {e}")
+    return years
+
+
+def _index_ddl(table: str, suffix: str) -> List[str]:
+    """Indexes for the partitioned table; created on the parent, so every partition gets them."""
+    statements = [f"CREATE INDEX IF NOT EXISTS {FLR_ID_INDEX}{suffix} ON {table} (flr_id)"]
+    for index in SolarFlare.__table__.indexes:
+        columns = [column.name for column in index.columns]
+        if index.unique and "begin_time" not in columns:
+            columns.append("begin_time")  # unique indexes must contain the partition key
+        unique = "UNIQUE " if index.unique else ""
+        statements.append(
+            f"CREATE {unique}INDEX IF NOT EXISTS {index.name}{suffix} ON {table} ({', '.join(columns)})"
+        )
+    statements += [
+        f"CREATE INDEX IF NOT EXISTS {name}{suffix} ON {table} {definition}"
+        for name, definition in POSTGRES_INDEXES.items()
+    ]
+    return statements
+
+
+def _index_names() -> List[str]:
+    return [FLR_ID_INDEX] + [index.name for index in SolarFlare.__table__.indexes] + list(POSTGRES_INDEXES)
+
+
+def _install_flr_id_registry(conn, table: str):
+    """
+    Keep flr_id unique across partitions: a table keyed on flr_id, maintained by a
+    trigger on `table`. Idempotent; registers flr_ids already in `table`.
+    """
+    conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {FLR_ID_REGISTRY} (flr_id varchar(50) PRIMARY KEY)")
+    conn.exec_driver_sql(f"""
+        CREATE OR REPLACE FUNCTION {FLR_ID_REGISTRY}_fn() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.flr_id = NEW.flr_id THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM {FLR_ID_REGISTRY} WHERE flr_id = OLD.flr_id;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'INSERT') THEN
+                INSERT INTO {FLR_ID_REGISTRY} (flr_id) VALUES (NEW.flr_id);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {FLR_ID_REGISTRY}_trg ON {table}")
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER {FLR_ID_REGISTRY}_trg AFTER INSERT OR DELETE OR UPDATE OF flr_id ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {FLR_ID_REGISTRY}_fn()"
+    )
+    conn.exec_driver_sql(
+        f"INSERT INTO {FLR_ID_REGISTRY} (flr_id) SELECT flr_id FROM {table} ON CONFLICT DO NOTHING"
+    )
+
+
+def _create_partitioned_copy(conn, years: Iterable[int]):
+    """Empty partitioned twin of solar_flares (same columns and id sequence)."""
+    conn.exec_driver_sql(
+        f"CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (begin_time)"
+    )
+    conn.exec_driver_sql(f"ALTER TABLE {NEW_TABLE} ADD PRIMARY KEY (id, begin_time)")
+    conn.exec_driver_sql(
+        f"ALTER TABLE {NEW_TABLE} ADD CONSTRAINT {TABLE}_flr_id_begin_key UNIQUE (flr_id, begin_time)"
+    )
+    for year in years:
+        create_year_partition(conn, year, parent=NEW_TABLE)
+    conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {NEW_TABLE} DEFAULT")
+    for ddl in _index_ddl(NEW_TABLE, NEW_SUFFIX):
+        conn.exec_driver_sql(ddl)
+    _install_flr_id_registry(conn, NEW_TABLE)
+
+
+def _install_change_log(conn):
+    """Record ids of rows updated or deleted in the old table while it is being copied."""
+    conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {LOG_TABLE} (id integer PRIMARY KEY)")
+    conn.exec_driver_sql(f"""
+        CREATE OR REPLACE FUNCTION {LOG_TABLE}_fn() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO {LOG_TABLE} (id) VALUES (OLD.id) ON CONFLICT DO NOTHING;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {LOG_TABLE}_trg ON {TABLE}")
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER {LOG_TABLE}_trg AFTER UPDATE OR DELETE ON {TABLE} "
+        f"FOR EACH ROW EXECUTE FUNCTION {LOG_TABLE}_fn()"
+    )
+
+
+def migrate_to_partitioned(engine, batch_size: int = 10_000, years_ahead: int = 1,
+                           drop_old: bool = False, pause: float = 0.0):
+    """
+    Move solar_flares into a year-partitioned table without blocking readers or the collector.
+
+    1. Create the partitioned twin and a trigger logging updates/deletes on the old table.
+    2. Copy rows in id batches, one short transaction each (resumable if interrupted).
+    3. Under a brief ACCESS EXCLUSIVE lock: copy rows inserted meanwhile, replay logged
+       changes, then swap table and index names.
+    """
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            _install_flr_id_registry(conn, TABLE)  # tables partitioned before the registry existed
+            print(f"{TABLE} is already partitioned.")
+            return
+        first, last, max_id = conn.execute(text(
+            f"SELECT EXTRACT(YEAR FROM MIN(begin_time)), EXTRACT(YEAR FROM MAX(begin_time)), MAX(id) FROM {TABLE}"
+        )).one()
+        current = datetime.now(timezone.utc).year
+        years = range(int(first or current), max(int(last or current), current) + years_ahead + 1)
+
+        if not _table_exists(conn, NEW_TABLE):
+            _create_partitioned_copy(conn, years)
+        _install_change_log(conn)
+        copied = conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {NEW_TABLE}")).scalar()
+
+    max_id = max_id or 0
+    started = time.perf_counter()
+    while copied < max_id:
+        upto = copied + batch_size
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"INSERT INTO {NEW_TABLE} SELECT * FROM {TABLE} "
+                f"WHERE id > {copied} AND id <= {upto} ON CONFLICT DO NOTHING"
+            )
+        copied = upto
+        print(f"Copied ids up to {min(copied, max_id)}/{max_id} ({time.perf_counter() - started:.1f}s)")
+        if pause:
+            time.sleep(pause)  # give the primary some room between batches
+
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        conn.exec_driver_sql(
+            f"INSERT INTO {NEW_TABLE} SELECT * FROM {TABLE} WHERE id > {max_id} ON CONFLICT DO NOTHING"
+        )
+        conn.exec_driver_sql(f"DELETE FROM {NEW_TABLE} WHERE id IN (SELECT id FROM {LOG_TABLE})")
+        conn.exec_driver_sql(
+            f"INSERT INTO {NEW_TABLE} SELECT * FROM {TABLE} WHERE id IN (SELECT id FROM {LOG_TABLE})"
+        )
+        conn.exec_driver_sql(f"DROP TRIGGER {LOG_TABLE}_trg ON {TABLE}")
+        conn.exec_driver_sql(f"DROP FUNCTION {LOG_TABLE}_fn()")
+        conn.exec_driver_sql(f"DROP TABLE {LOG_TABLE}")
+
+        for name in _index_names():
+            conn.exec_driver_sql(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old")
+            conn.exec_driver_sql(f"ALTER INDEX {name}{NEW_SUFFIX} RENAME TO {name}")
+        conn.exec_driver_sql(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+        conn.exec_driver_sql(f"ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}")
+        conn.exec_driver_sql(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        if drop_old:
+            conn.exec_driver_sql(f"DROP TABLE {OLD_TABLE}")
+
+    print(f"{TABLE} is now partitioned by year of begin_time "
+          f"({len(years)} partitions, {time.perf_counter() - started:.1f}s).")
+    if not drop_old:
+        print(f"The previous table was kept as {OLD_TABLE}; drop it once verified.")
+
+
+def ensure_partitioned(engine, years_ahead: int = 1) -> bool:
+    """
+    Startup hook: keep future partitions ahead of time. Never migrates; points at the
+    migration command when the table isn't partitioned yet. Returns whether it is.
+    """
+    with engine.connect() as conn:
+        partitioned = is_partitioned(conn)
+    if not partitioned:
+        print(f"DB_PARTITIONING is set but {TABLE} is not partitioned; run "
+              f"`python -m common.partitioning migrate` once to partition it online.")
+        return False
+    ensure_future_partitions(engine, years_ahead)
+    return True
+
+
+def main(argv=None) -> int:
+    from common.db import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Manage year partitions of solar_flares (Postgres)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="move an unpartitioned table online, in batches")
+    migrate.add_argument("--batch-size", type=int, default=10_000)
+    migrate.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    migrate.add_argument("--drop-old", action="store_true", help=f"drop {OLD_TABLE} after the swap")
+    migrate.add_argument("--years-ahead", type=int, default=1)
+    ensure = sub.add_parser("ensure", help="create partitions for upcoming years")
+    ensure.add_argument("--years-ahead", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    engine = DatabaseManager.get_engine()
+    if engine.dialect.name != "postgresql":
+        print("Partitioning is only supported on PostgreSQL.")
+        return 1
+    if args.command == "migrate":
+        migrate_to_partitioned(engine, args.batch_size, args.years_ahead, args.drop_old, args.pause)
+    else:
+        print(f"Partitions ensured for {ensure_future_partitions(engine, args.years_ahead)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
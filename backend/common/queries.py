@@ -0,0 +1,325 @@
+import itertools
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import List, Optional
+
+from sqlalchemy import (
+    BigInteger, Column, DateTime, Float, Integer, MetaData, Table, and_, bindparam, cast, event, func,
+    insert, literal_column, or_, select,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql.functions import FunctionElement
+
+import common.environment as env
+from common.intervals import IntervalTree
+from common.models.model import OPEN_FLARE_HOURS, SolarFlare
+from common.utils import GOES_CLASS_FLUX, parse_class_type
+
+
+class RangeMode(str, Enum):
+    """How a [start_date, end_date] window selects flares."""
+    contained = "contained"  # flare lies entirely inside the window (needs an end_time)
+    began = "began"          # flare began inside the window
+    overlap = "overlap"      # flare was active at any point in the window (see OPEN_FLARE_HOURS)
+
+
+def to_datetime(value) -> Optional[datetime]:
+    """Parse an ISO 8601 query parameter into a naive UTC datetime (how times are stored)."""
+    if value is None or isinstance(value, datetime):
+        dt = value
+    else:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt is not None and dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+class InvalidDate(ValueError):
+    """A date query parameter the API rejects; api.main answers it with a 400."""
+
+
+def check_dates(**dates):
+    """
+    Raise InvalidDate for a date parameter (name=value) that to_datetime can't parse,
+    or for a start_date after the end_date.
+    """
+    parsed = {}
+    for name, value in dates.items():
+        try:
+            parsed[name] = to_datetime(value)
+        except ValueError:
+            raise InvalidDate(f"Invalid {name} {value!r}; expected ISO 8601")
+    _check_order(parsed.get("start_date"), parsed.get("end_date"))
+
+
+def _check_order(start: Optional[datetime], end: Optional[datetime]):
+    # Postgres can't even build tsrange(start, end) for such a window
+    if start is not None and end is not None and start > end:
+        raise InvalidDate("start_date must not be after end_date")
+
+
+def open_flare_end(begin: datetime) -> datetime:
+    """Where a flare without an end_time is taken to end."""
+    return begin + timedelta(hours=OPEN_FLARE_HOURS)
+
+
+def flare_range_expr(begin=SolarFlare.begin_time, end=SolarFlare.end_time):
+    """
+    Postgres tsrange of a flare's activity. Must match the GiST expression index
+    ix_solar_flares_active_span exactly, hence the literal interval.
+    """
+    open_end = begin + literal_column(f"interval '{OPEN_FLARE_HOURS} hours'")
+    return func.tsrange(begin, func.coalesce(end, open_end), literal_column("'[]'"))
+
+
+def _window_range_expr(start: Optional[datetime], end: Optional[datetime]):
+    lower = bindparam(None, start, DateTime) if start else literal_column("'-infinity'::timestamp")
+    upper = bindparam(None, end, DateTime) if end else literal_column("'infinity'::timestamp")
+    return func.tsrange(lower, upper, literal_column("'[]'"))
+
+
+class FlareIntervalIndex:
+    """
+    In-process interval tree over (begin_time, end_time) for databases without
+    range types (SQLite). Rebuilt only when the table changes. Writes made by this
+    process bump a counter (an engine hook), so they are seen right away; writes by
+    other processes (the collector) are caught by a count/max(id)/max(ingest_seq)
+    probe that runs at most every INTERVAL_INDEX_PROBE_SECONDS.
+    """
+    _tree: Optional[IntervalTree] = None
+    _version = None
+    _writes = 0          # solar_flares writes seen by this process
+    _tree_writes = None  # value of _writes when _version was probed
+    _probed_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _note_write(conn, cursor, statement, parameters, context, executemany):
+        if "solar_flares" in statement and statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            FlareIntervalIndex._writes += 1
+
+    @classmethod
+    def _table_version(cls, session: Session):
+        return session.query(
+            func.count(SolarFlare.id), func.max(SolarFlare.id), func.max(SolarFlare.ingest_seq)
+        ).one()
+
+    @classmethod
+    def _fresh(cls) -> bool:
+        return (cls._tree is not None and cls._tree_writes == cls._writes
+                and time.monotonic() - cls._probed_at < env.get_interval_index_probe_seconds())
+
+    @classmethod
+    def get(cls, session: Session) -> IntervalTree:
+        if cls._fresh():
+            return cls._tree
+        with cls._lock:
+            if cls._fresh():
+                return cls._tree
+            writes = cls._writes
+            version = tuple(cls._table_version(session))
+            if cls._tree is None or version != cls._version:
+                rows = session.query(SolarFlare.begin_time, SolarFlare.end_time, SolarFlare.id).all()
+                cls._tree = IntervalTree(
+                    (begin, open_flare_end(begin) if end is None else end, flare_id) for begin, end, flare_id in rows
+                )
+                cls._version = version
+            cls._tree_writes = writes
+            cls._probed_at = time.monotonic()
+        return cls._tree
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._tree = None
+            cls._version = None
+
+    @classmethod
+    def overlapping_ids(cls, session: Session, start: Optional[datetime], end: Optional[datetime]) -> List[int]:
+        return cls.get(session).overlapping(start or datetime.min, end or datetime.max)
+
+
+event.listen(Engine, "after_cursor_execute", FlareIntervalIndex._note_write)
+
+
+# Per-connection scratch table holding the ids an interval lookup matched; queries
+# semi-join against it instead of carrying thousands of ids in the SQL text
+_interval_ids = Table(
+    "interval_ids", MetaData(),
+    Column("token", Integer, primary_key=True),
+    Column("id", Integer, primary_key=True),
+    prefixes=["TEMPORARY"],
+)
+_tokens = itertools.count(1)
+
+
+def _ids_filter(session: Session, ids: List[int]):
+    """WHERE clause for SolarFlare.id in `ids`, staged in the session's temp table."""
+    conn = session.connection()
+    transaction = conn.get_transaction()
+    if not conn.info.get("interval_ids_created"):
+        _interval_ids.create(conn, checkfirst=True)
+        conn.info["interval_ids_created"] = True
+    if conn.info.get("interval_ids_transaction") is not transaction:
+        # Rows staged by earlier transactions on this connection are no longer needed
+        conn.execute(_interval_ids.delete())
+        conn.info["interval_ids_transaction"] = transaction
+    token = next(_tokens)
+    if ids:
+        conn.execute(insert(_interval_ids), [{"token": token, "id": flare_id} for flare_id in ids])
+    return SolarFlare.id.in_(select(_interval_ids.c.id).where(_interval_ids.c.token == token))
+
+
+def overlap_filter(session: Session, start, end):
+    """WHERE clause for flares active at any point in [start, end]."""
+    start, end = to_datetime(start), to_datetime(end)
+    if session.get_bind().dialect.name == "postgresql":
+        return flare_range_expr().op("&&")(_window_range_expr(start, end))
+    return _ids_filter(session, FlareIntervalIndex.overlapping_ids(session, start, end))
+
+
+def active_at_filter(session: Session, moment):
+    """WHERE clause for flares active at `moment` (begin <= moment <= end, capped by open_flare_end)."""
+    moment = to_datetime(moment)
+    if session.get_bind().dialect.name == "postgresql":
+        return flare_range_expr().op("@>")(bindparam(None, moment, DateTime))
+    return _ids_filter(session, FlareIntervalIndex.overlapping_ids(session, moment, moment))
+
+
+def apply_range_filter(query: Query, session: Session, start_date=None, end_date=None,
+                       mode: RangeMode = RangeMode.contained) -> Query:
+    """Restrict a SolarFlare query to a date window using the given RangeMode. Raises InvalidDate for start > end."""
+    # Compare as datetimes; raw strings compare lexically on SQLite ('T' vs ' ')
+    start_date, end_date = to_datetime(start_date), to_datetime(end_date)
+    _check_order(start_date, end_date)
+    if mode == RangeMode.overlap:
+        if start_date or end_date:
+            query = query.filter(overlap_filter(session, start_date, end_date))
+    else:
+        if start_date:
+            query = query.filter(SolarFlare.begin_time >= start_date)
+        if end_date and mode == RangeMode.contained:
+            query = query.filter(SolarFlare.end_time <= end_date)
+
+    # A flare can't begin after it ends, so this is implied in every mode; stating it on
+    # begin_time lets Postgres prune year partitions (and use a begin_time index)
+    if end_date:
+        query = query.filter(SolarFlare.begin_time <= end_date)
+    return query
+
+
+def epoch_seconds(session: Session, column=SolarFlare.begin_time):
+    """Whole seconds since 1970 for a naive UTC timestamp column, in the session's dialect."""
+    if session.get_bind().dialect.name == "postgresql":
+        return cast(func.floor(func.extract("epoch", column)), BigInteger)
+    return cast(func.strftime("%s", column), Integer)
+
+
+class LocationFilter:
+    """
+    Heliographic location criteria: a latitude/longitude box and/or flares within
+    `within_deg` great-circle degrees of (near_lat, near_lon). The SQL clause is a
+    bounding box that can use ix_solar_flares_lat_lon; `matches` applies the exact
+    distance to the rows it returns. Raises ValueError for an incomplete 'near' query.
+    """
+    def __init__(self, min_lat: Optional[float] = None, max_lat: Optional[float] = None,
+                 min_lon: Optional[float] = None, max_lon: Optional[float] = None,
+                 near_lat: Optional[float] = None, near_lon: Optional[float] = None,
+                 within_deg: Optional[float] = None):
+        near = (near_lat, near_lon, within_deg)
+        if any(value is not None for value in near) and any(value is None for value in near):
+            raise ValueError("near_lat, near_lon and within_deg must be given together")
+        self.min_lat, self.max_lat, self.min_lon, self.max_lon = min_lat, max_lat, min_lon, max_lon
+        self.near_lat, self.near_lon, self.within_deg = near
+
+    @property
+    def active(self) -> bool:
+        return any(value is not None for value in
+                   (self.min_lat, self.max_lat, self.min_lon, self.max_lon, self.within_deg))
+
+    def _near_box(self):
+        """(min_lat, max_lat, min_lon, max_lon) enclosing the 'near' circle; lon bounds None near a pole."""
+        lat_lo, lat_hi = self.near_lat - self.within_deg, self.near_lat + self.within_deg
+        if lat_lo <= -90 or lat_hi >= 90:
+            return lat_lo, lat_hi, None, None
+        # Widest longitude span of a spherical cap, reached off its central latitude
+        half_width = math.degrees(math.asin(
+            min(1.0, math.sin(math.radians(self.within_deg)) / math.cos(math.radians(self.near_lat)))
+        ))
+        lon_lo, lon_hi = self.near_lon - half_width, self.near_lon + half_width
+        if lon_lo < -180 or lon_hi > 180:
+            return lat_lo, lat_hi, None, None  # wraps the antimeridian; rare on the visible disk
+        return lat_lo, lat_hi, lon_lo, lon_hi
+
+    def clause(self):
+        """WHERE clause for the bounding box, or None without location criteria."""
+        if not self.active:
+            return None
+        bounds = [(SolarFlare.latitude, self.min_lat, self.max_lat), (SolarFlare.longitude, self.min_lon, self.max_lon)]
+        if self.within_deg is not None:
+            lat_lo, lat_hi, lon_lo, lon_hi = self._near_box()
+            bounds += [(SolarFlare.latitude, lat_lo, lat_hi), (SolarFlare.longitude, lon_lo, lon_hi)]
+        conditions = [SolarFlare.latitude.isnot(None), SolarFlare.longitude.isnot(None)]
+        for column, low, high in bounds:
+            if low is not None:
+                conditions.append(column >= low)
+            if high is not None:
+                conditions.append(column <= high)
+        return and_(*conditions)
+
+    def distance(self, latitude: float, longitude: float) -> float:
+        """Great-circle degrees from (near_lat, near_lon), by the haversine formula."""
+        phi1, phi2 = math.radians(self.near_lat), math.radians(latitude)
+        dphi = phi2 - phi1
+        dlambda = math.radians(longitude - self.near_lon)
+        a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+        return math.degrees(2 * math.asin(min(1.0, math.sqrt(a))))
+
+    def matches(self, latitude: Optional[float], longitude: Optional[float]) -> bool:
+        """Exact check for a row the bounding box let through."""
+        if self.within_deg is None:
+            return True
+        if latitude is None or longitude is None:
+            return False
+        return self.distance(latitude, longitude) <= self.within_deg
+
+
+class class_magnitude(FunctionElement):
+    """Numeric part of a GOES class ('M5.2' -> 5.2); NULL where it isn't a number ('M', '')."""
+    type = Float()
+    inherit_cache = True
+
+
+@compiles(class_magnitude)
+def _compile_class_magnitude(element, compiler, **kw):
+    # SQLite casts a non-numeric string to 0 instead of raising
+    return "CAST(substr(%s, 2) AS FLOAT)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(class_magnitude, "postgresql")
+def _compile_class_magnitude_pg(element, compiler, **kw):
+    # Postgres raises on CAST('' AS FLOAT), so only numeric suffixes are cast
+    magnitude = "substr(%s, 2)" % compiler.process(element.clauses, **kw)
+    return f"CASE WHEN {magnitude} ~ '^[0-9]+([.][0-9]+)?$' THEN CAST({magnitude} AS FLOAT) END"
+
+
+def class_threshold_filter(min_class: Optional[str]):
+    """
+    WHERE clause for flares at or above a GOES class ('M' or 'M5.0'). Class letters sort
+    alphabetically by strength, so only the threshold's own letter compares magnitudes.
+    Raises ValueError for an unparseable class.
+    """
+    if not min_class:
+        return None
+    letter, magnitude = parse_class_type(min_class)
+    stronger = [other for other in GOES_CLASS_FLUX if other > letter]
+    class_letter = func.substr(SolarFlare.class_type, 1, 1)
+    same_letter = class_letter == letter
+    if magnitude > 1.0:
+        same_letter = and_(same_letter, class_magnitude(SolarFlare.class_type) >= magnitude)
+    return or_(class_letter.in_(stronger), same_letter) if stronger else same_letter
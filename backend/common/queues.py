@@ -0,0 +1,47 @@
+"""
+RabbitMQ queues for collection requests.
+
+Short ranges (a user asking for the last few days) go to the interactive queue; longer
+ones go to the bulk queue, which the worker drains one window at a time and only when
+no interactive request is waiting. The legacy single queue is still consumed, and its
+messages are re-routed, so requests published before an upgrade aren't lost.
+"""
+from datetime import date, datetime
+from typing import Optional, Union
+
+import common.environment as env
+
+INTERACTIVE_QUEUE = "data_collection_interactive"
+BULK_QUEUE = "data_collection_bulk"
+LEGACY_QUEUE = "data_collection_queue"
+
+
+def _to_date(value: Union[str, date, datetime, None]) -> Optional[date]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def range_days(start_date, end_date) -> Optional[int]:
+    """Days covered by an inclusive [start_date, end_date] range; None if either end is open."""
+    start, end = _to_date(start_date), _to_date(end_date)
+    if start is None or end is None:
+        return None
+    return (end - start).days + 1
+
+
+def queue_for(start_date, end_date, threshold_days: int = None) -> str:
+    """
+    Queue for a collection request. Open-ended ranges use DONKI's default window
+    (the last 30 days), so they are sized as such.
+    """
+    threshold_days = threshold_days or env.get_collect_bulk_threshold_days()
+    days = range_days(start_date, end_date)
+    return BULK_QUEUE if (days or 30) > threshold_days else INTERACTIVE_QUEUE
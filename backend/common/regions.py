@@ -0,0 +1,108 @@
+"""
+Maintenance of active_region_summary, the per-region rollup behind /api/analysis/regions.
+
+Ingest calls refresh_region_summaries for the regions its upsert touched; each is
+recomputed from its own flares (an indexed lookup on active_region_num), so DONKI
+revisions that move a flare between regions or change its class stay correct.
+"""
+from datetime import datetime, timezone
+from typing import Iterable, List, Set
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+
+from common.models.model import ActiveRegionSummary, SolarFlare
+from common.utils import class_to_flux, parse_class_type
+
+CHUNK_SIZE = 500
+
+
+def touched_regions(flares: Iterable[SolarFlare]) -> Set[int]:
+    """
+    Regions whose summary changes with these inserted or updated flares, including a
+    region a revised flare just left. Call before the session flushes.
+    """
+    regions = set()
+    for flare in flares:
+        history = inspect(flare).attrs.active_region_num.history
+        regions.update(history.added or ())
+        regions.update(history.unchanged or ())
+        regions.update(history.deleted or ())
+        regions.add(flare.active_region_num)
+    regions.discard(None)
+    return regions
+
+
+def _summarize(region: int, flares: List[tuple], now: datetime) -> ActiveRegionSummary:
+    summary = ActiveRegionSummary(active_region_num=region, flare_count=len(flares),
+                                  a_count=0, b_count=0, c_count=0, m_count=0, x_count=0)
+    strongest = None
+    for flr_id, class_type, begin_time in flares:
+        try:
+            letter, _ = parse_class_type(class_type)
+            flux = class_to_flux(class_type)
+        except ValueError:
+            continue  # counted in flare_count, but not by class
+        column = f"{letter.lower()}_count"
+        setattr(summary, column, getattr(summary, column) + 1)
+        if strongest is None or flux > strongest[0]:
+            strongest = (flux, flr_id, class_type)
+    times = [begin_time for _, _, begin_time in flares]
+    summary.first_flare_time = min(times)
+    summary.last_flare_time = max(times)
+    if strongest:
+        summary.strongest_flux, summary.strongest_flr_id, summary.strongest_class = strongest
+    summary.updated_at = now
+    return summary
+
+
+def refresh_region_summaries(session: Session, regions: Iterable[int]) -> int:
+    """Recompute the summaries of `regions` from solar_flares. Returns how many were refreshed."""
+    regions = sorted({region for region in regions if region is not None})
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    for i in range(0, len(regions), CHUNK_SIZE):
+        chunk = regions[i:i + CHUNK_SIZE]
+        flares = {}
+        for region, flr_id, class_type, begin_time in session.query(
+            SolarFlare.active_region_num, SolarFlare.flr_id, SolarFlare.class_type, SolarFlare.begin_time
+        ).filter(SolarFlare.active_region_num.in_(chunk)):
+            flares.setdefault(region, []).append((flr_id, class_type, begin_time))
+
+        stored = {
+            summary.active_region_num: summary
+            for summary in session.query(ActiveRegionSummary)
+            .filter(ActiveRegionSummary.active_region_num.in_(chunk))
+        }
+        for region in chunk:
+            if region not in flares:
+                if region in stored:
+                    session.delete(stored[region])  # its last flare moved elsewhere
+                continue
+            fresh = _summarize(region, flares[region], now)
+            if region in stored:
+                for column in ActiveRegionSummary.__table__.columns.keys():
+                    setattr(stored[region], column, getattr(fresh, column))
+            else:
+                session.add(fresh)
+    return len(regions)
+
+
+def rebuild_region_summaries(session: Session) -> int:
+    """Recompute every summary from scratch."""
+    session.query(ActiveRegionSummary).delete()
+    regions = [
+        region for (region,) in
+        session.query(SolarFlare.active_region_num).filter(SolarFlare.active_region_num.isnot(None)).distinct()
+    ]
+    return refresh_region_summaries(session, regions)
+
+
+def ensure_region_summaries(session: Session) -> int:
+    """Build the summaries once for a database that has flares but predates the table."""
+    if session.query(ActiveRegionSummary.active_region_num).first() is not None:
+        return 0
+    if session.query(SolarFlare.id).filter(SolarFlare.active_region_num.isnot(None)).first() is None:
+        return 0
+    count = rebuild_region_summaries(session)
+    print(f"Built active region summaries for {count} regions")
+    return count
@@ -1,9 +1,7 @@
-import json
+import math
+import re
 from datetime import datetime
-
-import pika
-
-import common.environment as env
+from typing import Optional, Tuple
 
 
 def parse_time(time_str: str) -> datetime:
@@ -20,30 +18,49 @@ def parse_time(time_str: str) -> datetime:
     return datetime.strptime(time_str, "%Y-%m-%dT%H:%M:%S")
 
 
-def send_rabbitmq_message(queue_name: str, message: dict):
+# Peak X-ray flux (W/m^2) at magnitude 1.0 of each GOES class
+GOES_CLASS_FLUX = {"A": 1e-8, "B": 1e-7, "C": 1e-6, "M": 1e-5, "X": 1e-4}
+
+
+def parse_class_type(class_type: str) -> tuple:
     """
-    Sends a message to a RabbitMQ queue.
+    Split a GOES class like 'M2.5' into ('M', 2.5). A bare letter means magnitude 1.0.
+    Magnitudes run from 1.0 to below 10 (X is open-ended), so every class sits between
+    its letter and the next; raises ValueError for anything else.
     """
+    class_type = (class_type or "").strip().upper()
+    letter, magnitude = class_type[:1], class_type[1:]
+    if letter not in GOES_CLASS_FLUX:
+        raise ValueError(f"Invalid flare class: {class_type!r}")
     try:
-        # Establish connection to RabbitMQ server
-        connection = pika.BlockingConnection(pika.URLParameters(env.get_rabbitmq_url())) 
-        channel = connection.channel()
-
-        # Ensure the queue exists
-        channel.queue_declare(queue=queue_name, durable=True)
-
-        # Send the message (convert dict to JSON)
-        channel.basic_publish(
-            exchange='',
-            routing_key=queue_name,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(
-                delivery_mode=2,  # Make the message persistent
-            )
-        )
-
-        print(f" [x] Sent {message}")
-        connection.close()
-
-    except Exception as e:
-        print(f"Error sending message to RabbitMQ: {e}")
\ No newline at end of file
+        value = float(magnitude) if magnitude else 1.0
+    except ValueError:
+        raise ValueError(f"Invalid flare class: {class_type!r}")
+    if not (math.isfinite(value) and value >= 1.0 and (value < 10 or letter == "X")):
+        raise ValueError(f"Invalid flare class: {class_type!r}; magnitude must be 1.0 to 9.9 (X: 1.0 and up)")
+    return letter, value
+
+
+def class_to_flux(class_type: str) -> float:
+    """Peak flux in W/m^2 for a GOES class, e.g. 'X1.0' -> 1e-4."""
+    letter, magnitude = parse_class_type(class_type)
+    return GOES_CLASS_FLUX[letter] * magnitude
+
+
+_SOURCE_LOCATION = re.compile(r"^\s*([NS])(\d{1,2}(?:\.\d+)?)\s*([EW])(\d{1,3}(?:\.\d+)?)\s*$", re.IGNORECASE)
+
+
+def parse_source_location(source_location: str) -> Optional[Tuple[float, float]]:
+    """
+    Heliographic (latitude, longitude) in degrees from a DONKI sourceLocation like 'N12E34'.
+    North and west are positive, so 'N12E34' -> (12.0, -34.0). None if it doesn't parse.
+    """
+    match = _SOURCE_LOCATION.match(source_location or "")
+    if not match:
+        return None
+    ns, lat, ew, lon = match.groups()
+    latitude = float(lat) * (1 if ns.upper() == "N" else -1)
+    longitude = float(lon) * (1 if ew.upper() == "W" else -1)
+    if abs(latitude) > 90 or abs(longitude) > 180:
+        return None
+    return latitude, longitude
@@ -1,12 +1,27 @@
 import re
+import threading
 import requests
-from datetime import datetime
-from typing import Any, Dict, List, Union
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import func, select
 
 from common import environment as env
 from common import db
-from common.utils import parse_time
+from common.utils import parse_source_location, parse_time
 from common.models.model import SolarFlare
+from common.regions import refresh_region_summaries, touched_regions
+from data_collector.metrics import STAGE_DURATION, record_rate_limit
+from data_collector.ratelimit import NASA_API_BUDGET, TokenBucket
+
+DONKI_BASE_URL = 'https://api.nasa.gov/DONKI'
+
+
+# Serializes ingest within the worker (scheduler thread + queue consumer) so ingest_seq
+# values are handed out, and committed, in order
+_INGEST_LOCK = threading.Lock()
+# Same across processes on Postgres, held until the transaction commits
+INGEST_ADVISORY_LOCK = 0x501A4F1A
 
 
 def _to_ymd(s: str | None) -> str | None:
@@ -24,46 +39,74 @@ def _to_ymd(s: str | None) -> str | None:
 class Client:
     """
     Base class for API clients.
-    Provides a generic method for making GET requests.
+    Provides a generic method for making GET requests, optionally paced by a
+    shared TokenBucket.
     """
-    def get_data(self, url: str, params: Dict[str, Any] = None) -> Union[Dict[str, Any], List[Any]]:
+    def __init__(self, rate_limiter: Optional[TokenBucket] = None):
+        self.rate_limiter = rate_limiter
+
+    def get_data(self, url: str, params: Dict[str, Any] = None,
+                 raise_errors: bool = False) -> Union[Dict[str, Any], List[Any]]:
         """
         Fetch data from the given URL with optional query parameters.
-        Handles common HTTP errors gracefully.
+        Handles common HTTP errors gracefully (an empty list), or re-raises them with `raise_errors`.
         """
         try:
-            response = requests.get(url, params=params)  
-            response.raise_for_status()  
-            return response.json()  
-        except requests.exceptions.Timeout:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            with STAGE_DURATION.labels("fetch").time():
+                response = requests.get(url, params=params)
+            remaining = record_rate_limit(getattr(response, "headers", None))
+            if self.rate_limiter is not None and remaining is not None:
+                self.rate_limiter.limit_to(remaining)  # other users of the key count too
+            response.raise_for_status()
+            with STAGE_DURATION.labels("parse").time():
+                return response.json()
+        except requests.exceptions.Timeout as e:
             print("Error: Request timed out.")
-        except requests.exceptions.ConnectionError:
+            error = e
+        except requests.exceptions.ConnectionError as e:
             print("Error: Connection issue.")
+            error = e
         except requests.exceptions.HTTPError as http_err:
             print(f"HTTP error {http_err}")
+            error = http_err
         except ValueError as json_err:
             print(f"Error decoding JSON: {json_err}")
+            error = json_err
         except Exception as e:
             print(f"Unexpected error: {e}")
+            error = e
+        if raise_errors:
+            raise error
         return []  # Return an empty list on error
 
 
 class NASAClient(Client):
     """
-    Client to interact with NASA's Solar Flare API.
-    Handles fetching, processing, and inserting solar flare data into the database.
+    Client to interact with NASA's DONKI API.
+    Handles fetching, processing, and inserting solar flare data into the database;
+    other DONKI event types are handled by the sources in data_collector.donki.
+    By default every instance draws on the process-wide NASA_API_BUDGET.
     """
-    def __init__(self):
+    def __init__(self, rate_limiter: Optional[TokenBucket] = NASA_API_BUDGET):
         # Fetch the API key from environment variables
         self.API_KEY = env.get_nasa_api_key()
-        # Base URL for the API
-        self.url = f'https://api.nasa.gov/DONKI/FLR'
-        super().__init__()  # Initialize the parent class
+        # Base URLs for the API
+        self.base_url = DONKI_BASE_URL
+        self.url = self.url_for('FLR')
+        super().__init__(rate_limiter)  # Initialize the parent class
 
-    def fetch_flare_data(self, start_date=None, end_date=None) -> Union[Dict[str, Any], List[Any]]:
+    def url_for(self, event_type: str) -> str:
+        """Endpoint for a DONKI event type, e.g. 'CME' -> .../DONKI/CME."""
+        return f'{self.base_url}/{event_type}'
+
+    def fetch_event_data(self, event_type: str, start_date=None, end_date=None,
+                         url: str = None, raise_errors: bool = False) -> Union[Dict[str, Any], List[Any]]:
         """
-        Fetch solar flare data from NASA API.
-        Allows filtering by optional start and end dates.
+        Fetch events of one DONKI type from NASA API.
+        Allows filtering by optional start and end dates. Errors give an empty list
+        unless `raise_errors` is set.
         """
         params = {"api_key": self.API_KEY}
         sd, ed = _to_ymd(start_date), _to_ymd(end_date)
@@ -73,15 +116,25 @@ class NASAClient(Client):
         # Fetch data using the inherited method
         try:
             print('-------------------------------------')
-            print(f"[NASA] params={params}")
-            data = self.get_data(self.url, params=params) or []
-            print(f"[NASA] returned count={len(data)}")
+            print(f"[NASA] {event_type} params={params}")
+            data = self.get_data(url or self.url_for(event_type), params=params, raise_errors=raise_errors) or []
+            print(f"[NASA] {event_type} returned count={len(data)}")
             print('-------------------------------------')
             return data
         except Exception as e:
-            print(f"Error fetching solar flare data: {e}")
+            print(f"Error fetching {event_type} data: {e}")
+            if raise_errors:
+                raise
             return []
 
+    def fetch_flare_data(self, start_date=None, end_date=None,
+                         raise_errors: bool = False) -> Union[Dict[str, Any], List[Any]]:
+        """
+        Fetch solar flare data from NASA API.
+        Allows filtering by optional start and end dates.
+        """
+        return self.fetch_event_data('FLR', start_date, end_date, url=self.url, raise_errors=raise_errors)
+
     @staticmethod
     def extract_flr_id(payload_flr_id: str) -> Union[str, None]:
         """
@@ -110,6 +163,7 @@ class NASAClient(Client):
             if not flr_id:
                 print("[map] skipping payload with no flrID")
                 return None
+            latitude, longitude = parse_source_location(payload.get("sourceLocation")) or (None, None)
             return SolarFlare(
                 flr_id=flr_id,
                 begin_time=parse_time(payload["beginTime"]),
@@ -119,6 +173,8 @@ class NASAClient(Client):
                 source_location=payload.get("sourceLocation", ""),
                 active_region_num=payload.get("activeRegionNum"),
                 linked_events=payload.get("linkedEvents"),  
+                latitude=latitude,
+                longitude=longitude,
             )
         except KeyError as e:
             print(f"Missing expected field in payload: {e}")
@@ -143,29 +199,83 @@ class NASAClient(Client):
                 processed_flares.append(solar_flare)
         return processed_flares
 
-    def fetch_and_insert_solar_flares(self, start_date: str = None, end_date: str = None):
+    @staticmethod
+    def upsert_solar_flares(session, solar_flares: List[SolarFlare]) -> Tuple[List[SolarFlare], List[SolarFlare]]:
+        """
+        Insert new flares and apply DONKI revisions (e.g. a late endTime) to stored ones.
+        Every inserted or changed row gets the next ingest_seq, which drives the change feed.
+        Callers must hold _INGEST_LOCK until the session commits.
+        :return: (inserted, updated) SolarFlare rows.
+        """
+        if session.get_bind().dialect.name == "postgresql":
+            session.execute(select(func.pg_advisory_xact_lock(INGEST_ADVISORY_LOCK)))
+
+        # Last payload wins if DONKI repeats an id within the window
+        incoming = {flare.flr_id: flare for flare in solar_flares}
+        existing = {}
+        ids = list(incoming)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            for flare in session.query(SolarFlare).filter(SolarFlare.flr_id.in_(chunk)):
+                existing[flare.flr_id] = flare
+
+        next_seq = (session.query(func.max(SolarFlare.ingest_seq)).scalar() or 0) + 1
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        inserted, updated = [], []
+        for flr_id, flare in incoming.items():
+            stored = existing.get(flr_id)
+            if stored is None:
+                target = flare
+                session.add(flare)
+                inserted.append(flare)
+            else:
+                changed = False
+                for field in SolarFlare.REVISABLE_FIELDS:
+                    value = getattr(flare, field)
+                    if getattr(stored, field) != value:
+                        setattr(stored, field, value)
+                        changed = True
+                if not changed:
+                    continue
+                target = stored
+                updated.append(stored)
+            target.ingest_seq = next_seq
+            target.ingested_at = now
+            next_seq += 1
+        return inserted, updated
+
+    def fetch_and_insert_solar_flares(self, start_date: str = None, end_date: str = None) -> Dict[str, int]:
         """
         Fetch solar flare data from NASA API and insert them into the database.
         Allows optional filtering by start and end dates.
+        :return: Record counts for the window: fetched, invalid, inserted, updated (revised by DONKI)
+                 and skipped (already stored unchanged).
         """
+        stats = {"fetched": 0, "invalid": 0, "inserted": 0, "updated": 0, "skipped": 0}
         print('-------------------------------------')
         print(f"Fetching solar flare data for date range: {start_date} to {end_date}")
         print('-------------------------------------')
-        solar_flare_data = self.fetch_flare_data(start_date=start_date, end_date=end_date)
+        # Raise on fetch errors, so a DONKI outage isn't counted as an empty window
+        solar_flare_data = self.fetch_flare_data(start_date=start_date, end_date=end_date, raise_errors=True)
         
         # Process raw data into SolarFlare instances
         if not isinstance(solar_flare_data, list):  # Validate response format
             print("Invalid API response format.")
-            return
+            return stats
 
-        solar_flares = self.process_solar_flares(solar_flare_data)
+        with STAGE_DURATION.labels("map").time():
+            solar_flares = self.process_solar_flares(solar_flare_data)
+        stats["fetched"] = len(solar_flare_data)
+        stats["invalid"] = len(solar_flare_data) - len(solar_flares)
 
-        #Set of ids already inserted to reduce db inserts
-        inserted_flr_ids = set()
+        with _INGEST_LOCK, STAGE_DURATION.labels("upsert").time(), db.DatabaseManager.session_scope() as session:
+            inserted, updated = self.upsert_solar_flares(session, solar_flares)
+            regions = touched_regions(inserted + updated)
+            session.flush()
+            refresh_region_summaries(session, regions)
 
-        with db.DatabaseManager.session_scope() as session:
-            for solar_flare in solar_flares:
-                if solar_flare.flr_id not in inserted_flr_ids: 
-                    if not session.query(SolarFlare).filter_by(flr_id=solar_flare.flr_id).first():
-                        session.add(solar_flare)  # Add only unique entries
-                        inserted_flr_ids.add(solar_flare.flr_id)
+        stats["inserted"] = len(inserted)
+        stats["updated"] = len(updated)
+        stats["skipped"] = len(solar_flares) - stats["inserted"] - stats["updated"]
+        print(f"[NASA] window {start_date} to {end_date}: {stats}")
+        return stats
@@ -0,0 +1,132 @@
+"""
+Priority-aware consumption of the collection queues (see common.queues).
+
+The worker pulls one message at a time with basic_get instead of a push consumer, so it
+decides before every job which queue goes next:
+  - interactive requests are served first, up to COLLECT_INTERACTIVE_WEIGHT in a row
+    while bulk work is waiting, then one bulk window runs so backfills still progress
+  - a bulk request collects only its first COLLECT_BULK_WINDOW_DAYS, then republishes
+    the rest to the back of the bulk queue; an interactive request therefore waits at
+    most one window, and concurrent backfills take turns
+  - legacy-queue messages are re-routed to the queue their range belongs in
+Messages are acked only after their window is collected (or re-routed), so a crashed
+worker redelivers the current window rather than dropping it. A failing job is
+republished up to `max_attempts` times; so is one whose collect stats report errors (a
+DONKI window that couldn't be fetched), even though collect itself returned.
+"""
+import json
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Optional
+
+import pika
+
+from common import environment as env
+from common.queues import BULK_QUEUE, INTERACTIVE_QUEUE, LEGACY_QUEUE, queue_for
+from data_collector.donki import collection_errors, date_windows
+from data_collector.metrics import record_queue_lag
+
+
+def split_bulk(message: Dict[str, Any], window_days: int):
+    """
+    (first window, remainder message or None) of a bulk request. Ranges that can't be
+    split (open-ended) come back whole.
+    """
+    windows = date_windows(message.get("start_date"), message.get("end_date"), window_days)
+    if len(windows) <= 1:
+        return (message.get("start_date"), message.get("end_date")), None
+    first = windows[0]
+    remainder = dict(message, start_date=(date.fromisoformat(first[1]) + timedelta(days=1)).isoformat(), attempts=0)
+    return first, remainder
+
+
+class PriorityConsumer:
+    """Weighted consumer of the interactive, bulk and legacy collection queues on one channel."""
+    def __init__(self, channel, collect: Callable[[Optional[str], Optional[str], Optional[list]], Any],
+                 weight: int = None, window_days: int = None, max_attempts: int = 3,
+                 sleep: Callable[[float], None] = None):
+        self.channel = channel
+        self.collect = collect
+        self.weight = weight or env.get_collect_interactive_weight()
+        self.window_days = window_days or env.get_collect_bulk_window_days()
+        self.max_attempts = max_attempts
+        self.sleep = sleep or channel.connection.sleep  # keeps heartbeats flowing while idle
+        self.interactive_streak = 0
+
+    def declare(self):
+        for queue in (INTERACTIVE_QUEUE, BULK_QUEUE, LEGACY_QUEUE):
+            self.channel.queue_declare(queue=queue, durable=True)
+
+    def publish(self, queue: str, message: Dict[str, Any]):
+        self.channel.basic_publish(
+            exchange='',
+            routing_key=queue,
+            body=json.dumps(message),
+            properties=pika.BasicProperties(
+                delivery_mode=2,  # Make the message persistent
+                timestamp=int(time.time()),
+            ),
+        )
+
+    def _get(self, queue: str):
+        method, properties, body = self.channel.basic_get(queue=queue, auto_ack=False)
+        if method is None:
+            return None
+        record_queue_lag(getattr(properties, 'timestamp', None), queue)
+        return method, json.loads(body)
+
+    def _order(self):
+        if self.interactive_streak >= self.weight:
+            return (BULK_QUEUE, INTERACTIVE_QUEUE, LEGACY_QUEUE)
+        return (INTERACTIVE_QUEUE, LEGACY_QUEUE, BULK_QUEUE)
+
+    def step(self) -> Optional[str]:
+        """Handle the next message by priority. Returns the queue it came from, None if all are empty."""
+        for queue in self._order():
+            got = self._get(queue)
+            if got is None:
+                if queue == INTERACTIVE_QUEUE:
+                    self.interactive_streak = 0
+                continue
+            method, message = got
+            if queue == LEGACY_QUEUE:
+                self.publish(queue_for(message.get("start_date"), message.get("end_date")), message)
+            elif queue == BULK_QUEUE:
+                self.interactive_streak = 0
+                self._run_bulk(message)
+            else:
+                self.interactive_streak += 1
+                self._run(queue, message, (message.get("start_date"), message.get("end_date")))
+            self.channel.basic_ack(delivery_tag=method.delivery_tag)
+            return queue
+        return None
+
+    def _run(self, queue: str, message: Dict[str, Any], window) -> bool:
+        """Collect `window` of `message`. Returns False if the message was requeued to retry."""
+        start_date, end_date = window
+        print(f"Collection from {queue} for {start_date} to {end_date}")
+        try:
+            results = self.collect(start_date, end_date, message.get("event_types"))
+            if isinstance(results, dict) and collection_errors(results):
+                raise RuntimeError(f"{collection_errors(results)} DONKI window(s) failed: {results}")
+        except Exception as e:
+            attempts = message.get("attempts", 0) + 1
+            if attempts < self.max_attempts:
+                print(f"Collection for {start_date} to {end_date} failed, requeueing: {e}")
+                self.publish(queue, dict(message, attempts=attempts))
+                return False
+            print(f"Giving up on collection for {start_date} to {end_date} after {attempts} attempts: {e}")
+        return True
+
+    def _run_bulk(self, message: Dict[str, Any]):
+        window, remainder = split_bulk(message, self.window_days)
+        if not self._run(BULK_QUEUE, message, window):
+            return  # retried from this window on
+        if remainder is not None:
+            self.publish(BULK_QUEUE, remainder)
+
+    def run(self, poll_seconds: float = None):
+        poll_seconds = poll_seconds or env.get_collect_queue_poll_seconds()
+        while True:
+            if self.step() is None:
+                self.sleep(poll_seconds)
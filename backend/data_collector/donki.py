@@ -0,0 +1,259 @@
+"""
+Pluggable DONKI event sources and the scheduler that drives them.
+
+Each EventSource knows how to fetch one DONKI event type and map its payloads to a
+model; DonkiScheduler runs (event type, date window) tasks on a thread pool. All
+sources fetch through the same NASAClient, so they share its TokenBucket and the
+API key's hourly budget no matter how many types are enabled.
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from common import db
+from common import environment as env
+from common.models.model import (
+    Base,
+    CoronalMassEjection,
+    GeomagneticStorm,
+    SolarEnergeticParticle,
+    SolarFlare,
+)
+from common.utils import parse_time
+from data_collector.clients import NASAClient, _to_ymd
+from data_collector.metrics import STAGE_DURATION
+
+
+class EventSource(ABC):
+    """Fetcher and mapper for one DONKI event type."""
+    event_type: str = None
+    model = None
+    key_field: str = None     # unique column on `model`
+    payload_key: str = None   # matching field in the DONKI payload
+
+    def __init__(self, client: NASAClient):
+        self.client = client
+
+    def fetch(self, start_date=None, end_date=None) -> List[Dict[str, Any]]:
+        """Raises if DONKI can't be reached, so the window is reported as an error, not as empty."""
+        return self.client.fetch_event_data(self.event_type, start_date, end_date, raise_errors=True)
+
+    @abstractmethod
+    def map_payload(self, payload: Dict[str, Any]) -> Optional[Base]:
+        """Model instance for one DONKI record, or None to skip it."""
+
+    def map_payloads(self, payloads: List[Dict[str, Any]]) -> List[Base]:
+        records = []
+        for payload in payloads:
+            try:
+                record = self.map_payload(payload)
+            except (KeyError, ValueError, TypeError) as e:
+                print(f"[{self.event_type}] invalid payload: {e}")
+                record = None
+            if record is not None:
+                records.append(record)
+        return records
+
+    def upsert(self, session, records: List[Base]) -> Tuple[List[Base], List[Base]]:
+        """Insert new events and apply revisions to stored ones. Returns (inserted, updated)."""
+        key = getattr(self.model, self.key_field)
+        incoming = {getattr(record, self.key_field): record for record in records}
+        existing = {}
+        ids = list(incoming)
+        for i in range(0, len(ids), 500):
+            for stored in session.query(self.model).filter(key.in_(ids[i:i + 500])):
+                existing[getattr(stored, self.key_field)] = stored
+
+        inserted, updated = [], []
+        for event_id, record in incoming.items():
+            stored = existing.get(event_id)
+            if stored is None:
+                session.add(record)
+                inserted.append(record)
+                continue
+            changed = False
+            for field in self.model.REVISABLE_FIELDS:
+                value = getattr(record, field)
+                if getattr(stored, field) != value:
+                    setattr(stored, field, value)
+                    changed = True
+            if changed:
+                updated.append(stored)
+        return inserted, updated
+
+    def collect(self, start_date=None, end_date=None) -> Dict[str, int]:
+        """Fetch, map and upsert one window. Returns the same counts as fetch_and_insert_solar_flares."""
+        stats = {"fetched": 0, "invalid": 0, "inserted": 0, "updated": 0, "skipped": 0}
+        payloads = self.fetch(start_date, end_date)
+        if not isinstance(payloads, list):
+            print(f"[{self.event_type}] invalid API response format.")
+            return stats
+
+        with STAGE_DURATION.labels("map").time():
+            records = self.map_payloads(payloads)
+        stats["fetched"] = len(payloads)
+        stats["invalid"] = len(payloads) - len(records)
+
+        with STAGE_DURATION.labels("upsert").time(), db.DatabaseManager.session_scope() as session:
+            inserted, updated = self.upsert(session, records)
+
+        stats["inserted"] = len(inserted)
+        stats["updated"] = len(updated)
+        stats["skipped"] = len(records) - stats["inserted"] - stats["updated"]
+        print(f"[{self.event_type}] window {start_date} to {end_date}: {stats}")
+        return stats
+
+
+class FlareSource(EventSource):
+    """FLR keeps its existing pipeline (ingest_seq, ingest lock) in NASAClient."""
+    event_type = "FLR"
+    model = SolarFlare
+    key_field = "flr_id"
+    payload_key = "flrID"
+
+    def map_payload(self, payload):
+        return NASAClient.map_nasa_payload_to_solar_flare(payload)
+
+    def collect(self, start_date=None, end_date=None):
+        return self.client.fetch_and_insert_solar_flares(start_date=start_date, end_date=end_date)
+
+
+class CMESource(EventSource):
+    event_type = "CME"
+    model = CoronalMassEjection
+    key_field = "activity_id"
+    payload_key = "activityID"
+
+    @staticmethod
+    def _best_analysis(analyses) -> Dict[str, Any]:
+        analyses = analyses or []
+        for analysis in analyses:
+            if analysis.get("isMostAccurate"):
+                return analysis
+        return analyses[0] if analyses else {}
+
+    def map_payload(self, payload):
+        if not payload.get(self.payload_key):
+            return None
+        analysis = self._best_analysis(payload.get("cmeAnalyses"))
+        return CoronalMassEjection(
+            activity_id=payload[self.payload_key],
+            start_time=parse_time(payload["startTime"]),
+            source_location=payload.get("sourceLocation") or None,
+            active_region_num=payload.get("activeRegionNum"),
+            speed=analysis.get("speed"),
+            half_angle=analysis.get("halfAngle"),
+            analysis_type=analysis.get("type"),
+            linked_events=payload.get("linkedEvents"),
+        )
+
+
+class GSTSource(EventSource):
+    event_type = "GST"
+    model = GeomagneticStorm
+    key_field = "gst_id"
+    payload_key = "gstID"
+
+    def map_payload(self, payload):
+        if not payload.get(self.payload_key):
+            return None
+        kp_values = [v["kpIndex"] for v in payload.get("allKpValues") or [] if v.get("kpIndex") is not None]
+        return GeomagneticStorm(
+            gst_id=payload[self.payload_key],
+            start_time=parse_time(payload["startTime"]),
+            max_kp_index=max(kp_values) if kp_values else None,
+            linked_events=payload.get("linkedEvents"),
+        )
+
+
+class SEPSource(EventSource):
+    event_type = "SEP"
+    model = SolarEnergeticParticle
+    key_field = "sep_id"
+    payload_key = "sepID"
+
+    def map_payload(self, payload):
+        if not payload.get(self.payload_key):
+            return None
+        return SolarEnergeticParticle(
+            sep_id=payload[self.payload_key],
+            event_time=parse_time(payload["eventTime"]),
+            instruments=payload.get("instruments"),
+            linked_events=payload.get("linkedEvents"),
+        )
+
+
+SOURCES = {source.event_type: source for source in (FlareSource, CMESource, GSTSource, SEPSource)}
+
+
+def date_windows(start_date, end_date, days: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Split [start_date, end_date] into inclusive windows of at most `days` days (YYYY-MM-DD)."""
+    sd, ed = _to_ymd(start_date), _to_ymd(end_date)
+    if not sd or not ed:
+        return [(start_date, end_date)]  # let DONKI apply its default range
+    start, end = date.fromisoformat(sd), date.fromisoformat(ed)
+    windows = []
+    while start <= end:
+        stop = min(start + timedelta(days=days - 1), end)
+        windows.append((start.isoformat(), stop.isoformat()))
+        start = stop + timedelta(days=1)
+    return windows
+
+
+class DonkiScheduler:
+    """
+    Runs collection for several DONKI event types concurrently. Long ranges are split
+    into `window_days` windows (DONKI_WINDOW_DAYS, a year by default) so a backfill
+    spreads over the pool; each window costs one request per type, all bounded by the
+    client's TokenBucket, shared by every worker thread. A failed window shows up as
+    `errors` in its type's stats (see collection_errors).
+    """
+    def __init__(self, client: NASAClient, event_types: Iterable[str] = None,
+                 max_workers: int = None, window_days: int = None):
+        event_types = list(event_types or env.get_donki_event_types())
+        unknown = [t for t in event_types if t not in SOURCES]
+        if unknown:
+            raise ValueError(f"Unknown DONKI event types: {unknown}; expected some of {list(SOURCES)}")
+        self.sources = {t: SOURCES[t](client) for t in event_types}
+        self.max_workers = max_workers or env.get_donki_max_workers()
+        self.window_days = window_days or env.get_donki_window_days()
+
+    def requests_for(self, start_date=None, end_date=None, event_types: Iterable[str] = None) -> int:
+        """API requests `collect` makes for the range: one per date window and event type."""
+        types = [t for t in (event_types or self.sources) if t in self.sources]
+        return len(date_windows(start_date, end_date, self.window_days)) * len(types)
+
+    def collect(self, start_date=None, end_date=None,
+                event_types: Iterable[str] = None) -> Dict[str, Dict[str, int]]:
+        """Collect every enabled (or the given) event type. Returns summed stats per type."""
+        types = [t for t in (event_types or self.sources) if t in self.sources]
+        # Window-major order, so every type makes progress during a long backfill
+        tasks = [
+            (event_type, sd, ed)
+            for sd, ed in date_windows(start_date, end_date, self.window_days)
+            for event_type in types
+        ]
+        results: Dict[str, Dict[str, int]] = {t: {} for t in types}
+        if not tasks:
+            return results
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tasks)),
+                                thread_name_prefix="donki") as pool:
+            futures = {pool.submit(self.sources[t].collect, sd, ed): (t, sd, ed) for t, sd, ed in tasks}
+            for future in as_completed(futures):
+                event_type, sd, ed = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    print(f"[{event_type}] collection failed for {sd} to {ed}: {e}")
+                    stats = {"errors": 1}
+                totals = results[event_type]
+                for outcome, count in stats.items():
+                    totals[outcome] = totals.get(outcome, 0) + count
+        return results
+
+
+def collection_errors(results: Dict[str, Dict[str, int]]) -> int:
+    """Windows that failed across the per-type stats returned by DonkiScheduler.collect."""
+    return sum(stats.get("errors", 0) for stats in results.values())
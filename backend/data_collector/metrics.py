@@ -0,0 +1,118 @@
+import time
+from typing import Dict, Optional
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    push_to_gateway,
+    start_http_server,
+)
+
+from common import environment as env
+
+# Prometheus registry for the worker. The worker has no web server of its own,
+# so the registry is either served on METRICS_PORT or pushed to PUSHGATEWAY_URL.
+registry = CollectorRegistry()
+
+PUSH_JOB = "solar_flare_collector"
+
+# Define Prometheus metrics (bind to custom registry)
+COLLECTION_COUNTER = Counter(
+    'solar_flare_collection_total',
+    'Total number of solar flare collection events triggered',
+    registry=registry
+)
+COLLECTION_DURATION = Histogram(
+    'solar_flare_collection_duration_seconds',
+    'Time in seconds spent collecting and inserting solar flare data',
+    registry=registry
+)
+STAGE_DURATION = Histogram(
+    'solar_flare_collection_stage_duration_seconds',
+    'Time in seconds spent in each collection stage (fetch, parse, map, upsert)',
+    ['stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+    registry=registry
+)
+RECORDS_TOTAL = Counter(
+    'solar_flare_collection_records_total',
+    'DONKI records seen by the collector, by event type and outcome',
+    ['event_type', 'outcome'],
+    registry=registry
+)
+LAST_WINDOW_RECORDS = Gauge(
+    'solar_flare_collection_last_window_records',
+    'Records fetched/inserted/skipped/invalid in the most recent collection window, by event type',
+    ['event_type', 'outcome'],
+    registry=registry
+)
+RATE_LIMIT_REMAINING = Gauge(
+    'nasa_api_rate_limit_remaining',
+    'Requests left in the current NASA API rate-limit window (X-RateLimit-Remaining)',
+    registry=registry
+)
+QUEUE_LAG = Histogram(
+    'solar_flare_collection_queue_lag_seconds',
+    'Time between a collection request being published and the worker picking it up, by queue',
+    ['queue'],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600),
+    registry=registry
+)
+NEXT_INTERVAL = Gauge(
+    'solar_flare_collection_next_interval_seconds',
+    'Delay the adaptive scheduler chose before the next collection',
+    registry=registry
+)
+LAST_SUCCESS = Gauge(
+    'solar_flare_collection_last_success_timestamp_seconds',
+    'Unix time of the last collection that completed without raising',
+    registry=registry
+)
+
+
+def record_window(stats: Dict[str, int], event_type: str = "FLR"):
+    """Record the per-window record counts returned by an event source's collect()."""
+    for outcome, count in stats.items():
+        RECORDS_TOTAL.labels(event_type, outcome).inc(count)
+        LAST_WINDOW_RECORDS.labels(event_type, outcome).set(count)
+
+
+def record_rate_limit(headers) -> Optional[int]:
+    """Track X-RateLimit-Remaining from an api.nasa.gov response, if present."""
+    remaining = (headers or {}).get("X-RateLimit-Remaining")
+    if remaining is None:
+        return None
+    try:
+        remaining = int(remaining)
+    except ValueError:
+        return None
+    RATE_LIMIT_REMAINING.set(remaining)
+    return remaining
+
+
+def record_queue_lag(published_at: Optional[float], queue: str = "data_collection_queue"):
+    """Observe how long a message waited in RabbitMQ (AMQP timestamp, seconds)."""
+    if published_at:
+        QUEUE_LAG.labels(queue).observe(max(0.0, time.time() - published_at))
+
+
+def start_metrics_server():
+    """Serve the worker registry over HTTP if METRICS_PORT is set."""
+    port = env.get_metrics_port()
+    if port is None:
+        return None
+    print(f"Serving collector metrics on :{port}/metrics")
+    return start_http_server(port, registry=registry)
+
+
+def push_metrics():
+    """Push the worker registry to a Pushgateway if PUSHGATEWAY_URL is set. Never raises."""
+    gateway = env.get_pushgateway_url()
+    if not gateway:
+        return
+    try:
+        push_to_gateway(gateway, job=PUSH_JOB, registry=registry)
+    except Exception as e:
+        print(f"Error pushing metrics to {gateway}: {e}")
@@ -0,0 +1,63 @@
+import threading
+import time
+from typing import Optional
+
+from common import environment as env
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second refill up to `capacity`.
+    Every request to api.nasa.gov takes one token, so all event types fetched
+    with the same key share a single budget however many run concurrently.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """Block until `tokens` are available. Returns False if `timeout` seconds pass first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def limit_to(self, available: float):
+        """Never hold more tokens than the server says are left (X-RateLimit-Remaining)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, max(0.0, available))
+
+    @classmethod
+    def for_nasa_api(cls) -> "TokenBucket":
+        """Bucket sized from NASA_RATE_LIMIT_PER_HOUR (api.nasa.gov allows 1000/hour per key)."""
+        per_hour = env.get_nasa_rate_limit_per_hour()
+        return cls(rate=per_hour / 3600.0, capacity=env.get_nasa_rate_limit_burst())
+
+
+# One budget per process for the NASA API key, shared by every client and event type
+NASA_API_BUDGET = TokenBucket.for_nasa_api()
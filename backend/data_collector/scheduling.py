@@ -0,0 +1,163 @@
+"""
+Adaptive scheduling of periodic collection.
+
+Instead of a fixed 24h interval, every run picks the delay before the next one:
+  - strong flares in the last day, or a run that inserted/updated records, shorten it
+    (down to COLLECT_MIN_INTERVAL_MINUTES); quiet runs double it (up to COLLECT_MAX_INTERVAL_HOURS)
+  - failed runs, including runs where some event type reported errors, back off
+    exponentially from the minimum
+  - the delay is stretched until the shared NASA token bucket covers the requests the
+    next run will make (one per date window and event type)
+  - +/-10% jitter keeps several workers from polling in lockstep
+Each run re-fetches the trailing COLLECT_TRAILING_DAYS (DONKI revises recent endTimes) and,
+after downtime, everything since the newest stored flare.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import func
+
+from common import db
+from common import environment as env
+from common.models.model import SolarFlare
+from common.queries import class_threshold_filter
+from data_collector.donki import collection_errors
+from data_collector.metrics import NEXT_INTERVAL
+from data_collector.ratelimit import NASA_API_BUDGET, TokenBucket
+
+JOB_ID = "adaptive_collection"
+
+
+def collection_range(trailing_days: int, now: Optional[datetime] = None) -> Tuple[str, str]:
+    """
+    Window for a scheduled run: the trailing `trailing_days`, reaching back further to
+    the newest stored flare after downtime. An empty database collects the last 7 days.
+    """
+    now = now or datetime.now(timezone.utc)
+    with db.DatabaseManager.session_scope() as session:
+        last = session.query(func.max(SolarFlare.begin_time)).scalar()
+
+    start = now.replace(tzinfo=None) - timedelta(days=trailing_days)
+    if last is None:
+        start = min(start, now.replace(tzinfo=None) - timedelta(days=7))
+    elif last < start:
+        start = last  # catch up on everything missed while we were down
+    return start.date().isoformat(), now.date().isoformat()
+
+
+def recent_strong_flares(hours: int = 24, min_class: str = "M") -> int:
+    """M-class and stronger flares that began in the last `hours`."""
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=hours)
+    with db.DatabaseManager.session_scope() as session:
+        return session.query(func.count(SolarFlare.id)).filter(
+            SolarFlare.begin_time >= since, class_threshold_filter(min_class)
+        ).scalar()
+
+
+class AdaptivePolicy:
+    """Chooses the delay (seconds) before the next collection from the last run's outcome."""
+    def __init__(self, min_interval: float, max_interval: float, backoff: float = 2.0,
+                 jitter: float = 0.1, rng: random.Random = None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def from_env(cls) -> "AdaptivePolicy":
+        return cls(
+            min_interval=env.get_collect_min_interval_minutes() * 60,
+            max_interval=env.get_collect_max_interval_hours() * 3600,
+        )
+
+    def _clamp(self, interval: float) -> float:
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def after_success(self, current: float, changed: int, strong_flares: int) -> float:
+        if strong_flares:
+            return self.min_interval  # active region flaring: poll as often as allowed
+        if changed:
+            return self._clamp(current / self.backoff)
+        return self._clamp(current * self.backoff)
+
+    def after_failure(self, failures: int) -> float:
+        return self._clamp(self.min_interval * self.backoff ** failures)
+
+    def respect_quota(self, interval: float, budget: Optional[TokenBucket], tokens_needed: float) -> float:
+        """Wait at least until the bucket has refilled enough for a full run."""
+        if budget is None:
+            return interval
+        deficit = tokens_needed - budget.available
+        if deficit > 0:
+            interval = max(interval, deficit / budget.rate)
+        return interval
+
+    def jittered(self, interval: float) -> float:
+        return interval * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class AdaptiveCollector:
+    """
+    Drives `collect(start_date, end_date)` from an APScheduler scheduler with a one-shot
+    job that every run reschedules at the delay the policy picks. `tokens_for(start_date,
+    end_date)` is the number of API requests collecting that range takes
+    (DonkiScheduler.requests_for).
+    """
+    def __init__(self, scheduler, collect: Callable[[str, str], Dict[str, Dict[str, int]]],
+                 policy: AdaptivePolicy = None, budget: Optional[TokenBucket] = NASA_API_BUDGET,
+                 tokens_for: Callable[[str, str], float] = None, trailing_days: int = None):
+        self.scheduler = scheduler
+        self.collect = collect
+        self.policy = policy or AdaptivePolicy.from_env()
+        self.budget = budget
+        self.tokens_for = tokens_for or (lambda start_date, end_date: 1)
+        self.tokens_needed = 0
+        self.trailing_days = env.get_collect_trailing_days() if trailing_days is None else trailing_days
+        self.interval = self.policy.max_interval
+        self.failures = 0
+
+    def start(self):
+        """Run once right away (catching up after downtime), then adaptively."""
+        self._schedule(0)
+
+    def _schedule(self, delay: float):
+        NEXT_INTERVAL.set(delay)
+        self.scheduler.add_job(
+            self.run, "date", id=JOB_ID, replace_existing=True,
+            run_date=datetime.now(timezone.utc) + timedelta(seconds=delay),
+        )
+
+    def next_delay(self, results: Optional[Dict[str, Dict[str, int]]], strong_flares: int = 0) -> float:
+        """
+        Update the interval from a run's results (None = the run failed; so does any type
+        reporting errors) and return the jittered delay.
+        """
+        if results is None or collection_errors(results):
+            self.failures += 1
+            delay = self.policy.after_failure(self.failures)
+        else:
+            self.failures = 0
+            changed = sum(stats.get("inserted", 0) + stats.get("updated", 0) for stats in results.values())
+            self.interval = self.policy.after_success(self.interval, changed, strong_flares)
+            delay = self.interval
+        delay = self.policy.respect_quota(delay, self.budget, self.tokens_needed)
+        return self.policy.jittered(delay)
+
+    def run(self):
+        results, strong, window = None, 0, None
+        try:
+            window = collection_range(self.trailing_days)
+            print(f"Adaptive data collection for {window[0]} to {window[1]}")
+            results = self.collect(*window)
+            strong = recent_strong_flares()
+            window = collection_range(self.trailing_days)  # what the next run will fetch
+        except Exception as e:
+            print(f"Scheduled collection failed: {e}")
+        finally:
+            if window is not None:  # a failed run's window is retried whole
+                self.tokens_needed = self.tokens_for(*window)
+            delay = self.next_delay(results, strong)
+            print(f"Next collection in {delay / 60:.1f} minutes")
+            self._schedule(delay)
@@ -53,3 +53,20 @@ def test_client_get_data_http_error(monkeypatch):
     monkeypatch.setattr("requests.get", lambda *a, **k: R())
     out = c.get_data("http://x")
     assert out == []
+
+
+def test_client_get_data_records_rate_limit_and_stages(monkeypatch):
+    from data_collector.metrics import RATE_LIMIT_REMAINING, STAGE_DURATION, registry
+
+    class R:
+        headers = {"X-RateLimit-Remaining": "42"}
+        def raise_for_status(self):
+            pass
+        def json(self):
+            return [{"flrID": "x"}]
+
+    before = registry.get_sample_value("solar_flare_collection_stage_duration_seconds_count", {"stage": "parse"}) or 0
+    monkeypatch.setattr("requests.get", lambda *a, **k: R())
+    assert Client().get_data("http://x") == [{"flrID": "x"}]
+    assert registry.get_sample_value("nasa_api_rate_limit_remaining") == 42
+    assert registry.get_sample_value("solar_flare_collection_stage_duration_seconds_count", {"stage": "parse"}) == before + 1
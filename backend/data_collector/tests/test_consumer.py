@@ -0,0 +1,126 @@
+import json
+from collections import deque
+from types import SimpleNamespace
+
+import requests
+
+from common.queues import BULK_QUEUE, INTERACTIVE_QUEUE, LEGACY_QUEUE, queue_for
+from data_collector.clients import NASAClient
+from data_collector.consumer import PriorityConsumer, split_bulk
+from data_collector.donki import DonkiScheduler
+
+
+class FakeChannel:
+    def __init__(self):
+        self.queues = {INTERACTIVE_QUEUE: deque(), BULK_QUEUE: deque(), LEGACY_QUEUE: deque()}
+        self.acked = []
+        self._tag = 0
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.queues[routing_key].append(body)
+
+    def basic_get(self, queue, auto_ack=False):
+        if not self.queues[queue]:
+            return None, None, None
+        self._tag += 1
+        return SimpleNamespace(delivery_tag=self._tag), SimpleNamespace(timestamp=None), self.queues[queue].popleft()
+
+    def basic_ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    def put(self, queue, start_date, end_date, **extra):
+        self.queues[queue].append(json.dumps({"start_date": start_date, "end_date": end_date, **extra}))
+
+
+def _consumer(channel, calls, weight=2, fail=0):
+    def collect(start_date, end_date, event_types):
+        nonlocal fail
+        if fail:
+            fail -= 1
+            raise RuntimeError("DONKI unavailable")
+        calls.append((start_date, end_date))
+
+    return PriorityConsumer(channel, collect, weight=weight, window_days=30, sleep=lambda s: None)
+
+
+def test_queue_for_classifies_by_range_length():
+    assert queue_for("2024-06-18T00:00:00", "2024-06-20T00:00:00", threshold_days=14) == INTERACTIVE_QUEUE
+    assert queue_for("2020-01-01", "2024-01-01", threshold_days=14) == BULK_QUEUE
+    assert queue_for(None, None, threshold_days=14) == BULK_QUEUE  # DONKI's default 30 days
+
+
+def test_split_bulk_keeps_the_rest_for_later():
+    window, rest = split_bulk({"start_date": "2024-01-01", "end_date": "2024-03-15", "attempts": 2}, 30)
+    assert window == ("2024-01-01", "2024-01-30")
+    assert rest == {"start_date": "2024-01-31", "end_date": "2024-03-15", "attempts": 0}
+    assert split_bulk({"start_date": "2024-01-01", "end_date": "2024-01-10"}, 30)[1] is None
+
+
+def test_interactive_request_preempts_backfill_between_windows():
+    channel, calls = FakeChannel(), []
+    consumer = _consumer(channel, calls)
+    channel.put(BULK_QUEUE, "2024-01-01", "2024-03-15")
+
+    assert consumer.step() == BULK_QUEUE
+    channel.put(INTERACTIVE_QUEUE, "2024-06-18", "2024-06-20")  # arrives mid-backfill
+    assert consumer.step() == INTERACTIVE_QUEUE
+    while consumer.step():
+        pass
+
+    assert calls == [
+        ("2024-01-01", "2024-01-30"),
+        ("2024-06-18", "2024-06-20"),
+        ("2024-01-31", "2024-02-29"),
+        ("2024-03-01", "2024-03-15"),
+    ]
+    assert len(channel.acked) == 4
+
+
+def test_weighting_lets_bulk_progress_under_interactive_load():
+    channel, calls = FakeChannel(), []
+    consumer = _consumer(channel, calls, weight=2)
+    channel.put(BULK_QUEUE, "2024-01-01", "2024-01-20")
+    for day in range(1, 4):
+        channel.put(INTERACTIVE_QUEUE, f"2024-06-0{day}", f"2024-06-0{day}")
+
+    order = [consumer.step() for _ in range(4)]
+    assert order == [INTERACTIVE_QUEUE, INTERACTIVE_QUEUE, BULK_QUEUE, INTERACTIVE_QUEUE]
+    assert consumer.step() is None
+
+
+def test_legacy_messages_are_rerouted():
+    channel, calls = FakeChannel(), []
+    consumer = _consumer(channel, calls)
+    channel.put(LEGACY_QUEUE, "2019-01-01", "2024-01-01")
+
+    assert consumer.step() == LEGACY_QUEUE
+    assert calls == [] and len(channel.queues[BULK_QUEUE]) == 1
+
+
+def test_failed_window_is_retried_then_dropped():
+    channel, calls = FakeChannel(), []
+    consumer = _consumer(channel, calls, fail=3)
+    channel.put(INTERACTIVE_QUEUE, "2024-06-18", "2024-06-20")
+
+    for attempts in (1, 2):
+        assert consumer.step() == INTERACTIVE_QUEUE
+        assert json.loads(channel.queues[INTERACTIVE_QUEUE][0])["attempts"] == attempts
+    assert consumer.step() == INTERACTIVE_QUEUE  # third failure: given up
+    assert consumer.step() is None and calls == []
+
+
+def test_window_with_collection_errors_is_retried(monkeypatch):
+    class Unavailable:
+        headers = {}
+
+        def raise_for_status(self):
+            raise requests.exceptions.HTTPError("503 Server Error: Service Unavailable")
+
+    monkeypatch.setattr("data_collector.clients.requests.get", lambda url, params=None: Unavailable())
+    donki = DonkiScheduler(NASAClient(rate_limiter=None), event_types=["CME"], max_workers=1)
+    channel = FakeChannel()
+    consumer = PriorityConsumer(channel, donki.collect, window_days=30, sleep=lambda s: None)
+    channel.put(INTERACTIVE_QUEUE, "2024-06-18", "2024-06-20")
+
+    assert consumer.step() == INTERACTIVE_QUEUE  # collect returned {"CME": {"errors": 1}}
+    assert json.loads(channel.queues[INTERACTIVE_QUEUE][0])["attempts"] == 1
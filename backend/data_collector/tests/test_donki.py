@@ -0,0 +1,88 @@
+import threading
+import time
+
+import requests
+
+from common.models.model import CoronalMassEjection, GeomagneticStorm, SolarEnergeticParticle
+from data_collector.clients import NASAClient
+from data_collector.donki import CMESource, DonkiScheduler, GSTSource, SEPSource, collection_errors, date_windows
+from data_collector.ratelimit import TokenBucket
+
+
+def test_token_bucket_paces_concurrent_callers():
+    bucket = TokenBucket(rate=50, capacity=5)
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(15)]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 5 from the burst, the other 10 at 50/s
+    assert time.monotonic() - started >= 0.18
+    assert not bucket.acquire(timeout=0.001) or bucket.available < 1
+
+
+def test_token_bucket_limit_to_server_remaining():
+    bucket = TokenBucket(rate=0.001, capacity=20)
+    bucket.limit_to(2)
+    assert bucket.acquire(timeout=0) and bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0.01)
+
+
+def test_event_source_mappers():
+    client = NASAClient(rate_limiter=None)
+    cme = CMESource(client).map_payload({
+        "activityID": "2024-05-10T06:36:00-CME-001",
+        "startTime": "2024-05-10T06:36Z",
+        "sourceLocation": "S17W25",
+        "cmeAnalyses": [
+            {"speed": 700.0, "halfAngle": 30.0, "type": "C", "isMostAccurate": False},
+            {"speed": 1000.0, "halfAngle": 45.0, "type": "O", "isMostAccurate": True},
+        ],
+        "linkedEvents": [{"activityID": "2024-05-10T06:27:00-FLR-001"}],
+    })
+    assert isinstance(cme, CoronalMassEjection)
+    assert (cme.speed, cme.half_angle, cme.analysis_type) == (1000.0, 45.0, "O")
+
+    gst = GSTSource(client).map_payload({
+        "gstID": "2024-05-10T15:00:00-GST-001",
+        "startTime": "2024-05-10T15:00Z",
+        "allKpValues": [{"kpIndex": 8.33}, {"kpIndex": 9.0}],
+    })
+    assert isinstance(gst, GeomagneticStorm) and gst.max_kp_index == 9.0
+
+    sep = SEPSource(client).map_payload({"sepID": "2024-05-11T02:00:00-SEP-001", "eventTime": "2024-05-11T02:00Z"})
+    assert isinstance(sep, SolarEnergeticParticle)
+    assert SEPSource(client).map_payloads([{"sepID": "x"}]) == []  # missing eventTime
+
+
+def test_date_windows():
+    assert date_windows("2024-01-01", "2024-03-01", 30) == [
+        ("2024-01-01", "2024-01-30"), ("2024-01-31", "2024-02-29"), ("2024-03-01", "2024-03-01"),
+    ]
+    assert date_windows(None, None, 30) == [(None, None)]
+
+
+
+def test_donki_outage_is_reported_as_errors(monkeypatch):
+    class Unavailable:
+        headers = {}
+
+        def raise_for_status(self):
+            raise requests.exceptions.HTTPError("503 Server Error: Service Unavailable")
+
+    monkeypatch.setattr("data_collector.clients.requests.get", lambda url, params=None: Unavailable())
+    client = NASAClient(rate_limiter=None)
+    assert client.get_data(client.url_for("CME")) == []  # callers outside collection still get []
+
+    results = DonkiScheduler(client, event_types=["CME", "GST"], max_workers=2, window_days=30).collect(
+        "2024-01-01", "2024-02-15")
+    assert results == {"CME": {"errors": 2}, "GST": {"errors": 2}}
+    assert collection_errors(results) == 4
+
+
+def test_requests_for_counts_windows_per_type():
+    client = NASAClient(rate_limiter=None)
+    donki = DonkiScheduler(client, event_types=["FLR", "CME", "GST"], window_days=365)
+    assert donki.requests_for("2022-01-01", "2024-06-10") == 3 * 3
+    assert donki.requests_for("2024-06-01", "2024-06-10", event_types=["FLR"]) == 1
@@ -0,0 +1,95 @@
+import random
+
+from data_collector.ratelimit import TokenBucket
+from data_collector.scheduling import JOB_ID, AdaptiveCollector, AdaptivePolicy
+
+HOUR = 3600
+
+
+def _policy():
+    return AdaptivePolicy(min_interval=900, max_interval=24 * HOUR, jitter=0.0)
+
+
+def test_policy_backs_off_when_quiet_and_speeds_up_on_activity():
+    policy = _policy()
+    assert policy.after_success(HOUR, changed=0, strong_flares=0) == 2 * HOUR
+    assert policy.after_success(20 * HOUR, changed=0, strong_flares=0) == 24 * HOUR
+    assert policy.after_success(HOUR, changed=3, strong_flares=0) == HOUR / 2
+    assert policy.after_success(24 * HOUR, changed=0, strong_flares=2) == 900
+    assert [policy.after_failure(n) for n in (1, 2, 3)] == [1800, 3600, 7200]
+
+
+def test_policy_respects_quota_and_jitters():
+    policy = _policy()
+    empty = TokenBucket(rate=1 / 3.6, capacity=20)  # 1000/hour
+    empty.limit_to(0)
+    assert policy.respect_quota(60, empty, tokens_needed=4) >= 4 * 3.6 - 0.1
+    assert policy.respect_quota(60, TokenBucket(rate=1, capacity=20), tokens_needed=4) == 60
+
+    jittery = AdaptivePolicy(900, 24 * HOUR, jitter=0.1, rng=random.Random(1))
+    delays = [jittery.jittered(HOUR) for _ in range(50)]
+    assert min(delays) >= 0.9 * HOUR and max(delays) <= 1.1 * HOUR
+    assert len(set(delays)) > 1
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.jobs = {}
+
+    def add_job(self, func, trigger, id, replace_existing, run_date):
+        self.jobs[id] = (func, trigger, run_date)
+
+
+def test_collector_reschedules_itself(monkeypatch):
+    import data_collector.scheduling as scheduling
+
+    scheduler = FakeScheduler()
+    windows = []
+    monkeypatch.setattr(scheduling, "collection_range", lambda days: ("2024-06-07", "2024-06-10"))
+    monkeypatch.setattr(scheduling, "recent_strong_flares", lambda: 0)
+
+    def collect(start_date, end_date):
+        windows.append((start_date, end_date))
+        return {"FLR": {"inserted": 0, "updated": 0}, "CME": {"inserted": 0, "updated": 0}}
+
+    collector = AdaptiveCollector(scheduler, collect, policy=_policy(), budget=None)
+    collector.interval = HOUR
+    collector.start()
+    assert scheduler.jobs[JOB_ID][1] == "date"
+
+    collector.run()
+    assert windows == [("2024-06-07", "2024-06-10")]
+    assert collector.interval == 2 * HOUR  # quiet run
+
+    def failing(start_date, end_date):
+        raise RuntimeError("DONKI down")
+
+    collector.collect = failing
+    collector.run()
+    assert collector.failures == 1
+    assert JOB_ID in scheduler.jobs  # still rescheduled after a failure
+
+
+def test_errors_back_off_and_quota_follows_the_window_count(monkeypatch):
+    import data_collector.scheduling as scheduling
+
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(scheduling, "collection_range", lambda days: ("2022-01-01", "2024-06-10"))
+    monkeypatch.setattr(scheduling, "recent_strong_flares", lambda: 0)
+    empty = TokenBucket(rate=1, capacity=100)
+    empty.limit_to(0)
+    requested = []
+
+    def tokens_for(start_date, end_date):
+        requested.append((start_date, end_date))
+        return 30  # e.g. 3 yearly windows x 10 event types
+
+    collector = AdaptiveCollector(scheduler, lambda s, e: {"FLR": {"inserted": 1}, "CME": {"errors": 1}},
+                                  policy=_policy(), budget=empty, tokens_for=tokens_for)
+    collector.interval = HOUR
+    collector.run()
+    assert collector.failures == 1  # a type that errored is not a quiet run
+    assert collector.interval == HOUR
+    assert requested[-1] == ("2022-01-01", "2024-06-10")
+    assert collector.tokens_needed == 30
+    assert collector.policy.respect_quota(0, empty, collector.tokens_needed) >= 30 - 0.1
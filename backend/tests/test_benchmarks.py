@@ -0,0 +1,94 @@
+import requests
+
+from benchmarks.nasa_stub import NASAStubServer
+from benchmarks.stats import percentile, summarize
+from benchmarks.synthetic import generate_donki_payloads, generate_flare_rows, parse_scale
+from data_collector.clients import NASAClient
+
+
+def test_synthetic_payloads_are_deterministic_and_mappable():
+    first = list(generate_donki_payloads(200, seed=7))
+    second = list(generate_donki_payloads(200, seed=7))
+    assert first == second
+
+    flares = NASAClient.process_solar_flares(first)
+    assert len(flares) == 200
+    assert len({f.flr_id for f in flares}) == 200
+
+
+def test_synthetic_rows_carry_coordinates():
+    rows = list(generate_flare_rows(50, seed=7))
+    assert all(row["latitude"] is not None and row["longitude"] is not None for row in rows)
+    assert all(abs(row["latitude"]) <= 35 and abs(row["longitude"]) <= 90 for row in rows)
+
+
+def test_parse_scale():
+    assert parse_scale("10k") == 10_000
+    assert parse_scale("1M") == 1_000_000
+    assert parse_scale("2500") == 2500
+
+
+def test_stats_percentiles():
+    latencies = [i / 1000 for i in range(1, 101)]
+    assert percentile(latencies, 50) == 0.05
+    assert percentile(latencies, 99) == 0.099
+    summary = summarize(latencies, items=1000)
+    assert summary["calls"] == 100
+    assert summary["p95_ms"] == 95.0
+
+
+def test_nasa_stub_filters_by_date():
+    payloads = list(generate_donki_payloads(50, seed=1))
+    day = payloads[10]["beginTime"][:10]
+    with NASAStubServer(payloads) as stub:
+        response = requests.get(stub.url_for("FLR"), params={"startDate": day, "endDate": day})
+    assert response.status_code == 200
+    body = response.json()
+    assert body and all(p["beginTime"][:10] == day for p in body)
+
+
+def test_load_regression_thresholds():
+    from benchmarks.load import check_regressions
+
+    baseline = {"levels": [{"concurrency": 8, "rps": 100.0, "p50_ms": 10.0, "p95_ms": 40.0, "p99_ms": 60.0}]}
+    ok = [{"concurrency": 8, "rps": 95.0, "p50_ms": 11.0, "p95_ms": 45.0, "p99_ms": 65.0, "error_rate": 0.0}]
+    slow = [{"concurrency": 8, "rps": 70.0, "p50_ms": 20.0, "p95_ms": 90.0, "p99_ms": 65.0, "error_rate": 0.05}]
+
+    assert check_regressions(baseline, ok, 0.25, 0.2, 0.01) == []
+    failures = check_regressions(baseline, slow, 0.25, 0.2, 0.01)
+    assert len(failures) == 3
+
+
+def test_load_workload_discovery_is_date_bounded(client):
+    import asyncio
+    import httpx
+    from api.main import app
+    from benchmarks.load import discover_workload
+    from common import db
+    from common.models.model import SolarFlare
+    from datetime import datetime
+
+    with db.DatabaseManager.session_scope() as s:
+        for flr_id, day in (("OLD", 1), ("IN-1", 10), ("IN-2", 12)):
+            begin = datetime(2024, 1, day)
+            s.add(SolarFlare(flr_id=flr_id, begin_time=begin, peak_time=begin, end_time=begin, class_type="C1.0"))
+
+    async def discover():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as http:
+            return await discover_workload(http, "2024-01-05", "2024-01-31")
+
+    ids, span = asyncio.run(discover())
+    assert sorted(ids) == ["IN-1", "IN-2"]
+    assert span == (datetime(2024, 1, 10), datetime(2024, 1, 12))
+
+
+def test_load_missing_baseline_is_skipped(monkeypatch, tmp_path, capsys):
+    import benchmarks.load as load
+
+    async def fake_run(args):
+        return [{"concurrency": 1, "rps": 1.0, "p50_ms": 1.0, "p95_ms": 1.0, "p99_ms": 1.0, "error_rate": 0.0}]
+
+    monkeypatch.setattr(load, "_run", fake_run)
+    assert load.main(["--baseline", str(tmp_path / "missing.json")]) == 0
+    assert "No baseline at" in capsys.readouterr().err
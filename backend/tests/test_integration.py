@@ -3,6 +3,7 @@ import importlib
 from datetime import datetime, timedelta, timezone
 from fastapi.testclient import TestClient
 
+from common.db import DatabaseManager as RealDatabaseManager  # bound at import, before override_db patches it
 from common.models.model import SolarFlare
 
 # Create a TestClient fixture that instantiates the FastAPI app after the DatabaseManager override.
@@ -114,6 +115,17 @@ def test_filter_range(client, seed_three):
     ids = [x["flr_id"] for x in r.json()]
     assert ids == ["B"]
 
+def test_batch_lookup_preserves_order_and_reports_missing(client, seed_three):
+    r = client.post("/api/solar-flares/batch", json={"ids": ["C", "MISSING", "A", "C"]})
+    assert r.status_code == 200
+    body = r.json()
+    assert [f["flr_id"] for f in body["solar_flares"]] == ["C", "A"]
+    assert body["missing"] == ["MISSING"]
+
+    assert client.post("/api/solar-flares/batch", json={"ids": []}).status_code == 422
+    too_many = [f"ID-{i}" for i in range(501)]
+    assert client.post("/api/solar-flares/batch", json={"ids": too_many}).status_code == 422
+
 def test_get_by_id_found_and_missing(client):
     from common import db
     with db.DatabaseManager.session_scope() as s:
@@ -134,3 +146,499 @@ def test_get_by_id_found_and_missing(client):
     assert r1.status_code == 200
     assert r1.json()["flr_id"] == "ID-OK"
     assert r2.status_code == 404
+
+def test_fetch_and_insert_reports_window_stats(monkeypatch):
+    from data_collector.clients import NASAClient
+    payload = {
+        "flrID": "2024-06-10T00:00:00-FLR-001",
+        "beginTime": "2024-06-10T00:00Z",
+        "peakTime": "2024-06-10T00:05Z",
+        "endTime": "2024-06-10T00:10Z",
+        "classType": "C1.0",
+    }
+    invalid = {"flrID": "2024-06-11T00:00:00-FLR-001"}  # no beginTime
+    client = NASAClient()
+    monkeypatch.setattr(client, "fetch_flare_data", lambda **kw: [payload, dict(payload), invalid])
+
+    stats = client.fetch_and_insert_solar_flares("2024-06-10", "2024-06-11")
+    assert stats == {"fetched": 3, "invalid": 1, "inserted": 1, "updated": 0, "skipped": 1}
+
+    stats = client.fetch_and_insert_solar_flares("2024-06-10", "2024-06-11")
+    assert stats["inserted"] == 0 and stats["skipped"] == 2
+
+def test_db_profiling_headers_and_slow_query_log(monkeypatch, test_engine, seed_three, capsys):
+    import api.main as main_module
+    from common.db import QueryProfiler
+
+    monkeypatch.setenv("DB_PROFILING", "1")
+    monkeypatch.setenv("DB_SLOW_QUERY_MS", "0")  # every statement counts as slow
+    importlib.reload(main_module)
+    QueryProfiler.install(test_engine)
+    try:
+        r = TestClient(main_module.app).get("/api/solar-flares")
+    finally:
+        QueryProfiler.uninstall(test_engine)
+        monkeypatch.delenv("DB_PROFILING")
+        importlib.reload(main_module)
+
+    assert r.status_code == 200
+    assert int(r.headers["X-DB-Queries"]) >= 1
+    assert float(r.headers["X-DB-Time-Ms"]) > 0
+    out = capsys.readouterr().out
+    assert "[slow query]" in out and "SCAN solar_flares" in out
+
+def test_api_import_does_not_load_pika():
+    import subprocess, sys
+    code = "import sys, api.main; print('pika' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "False"
+
+@pytest.fixture
+def seed_straddling():
+    from common import db
+    with db.DatabaseManager.session_scope() as s:
+        s.add_all([
+            SolarFlare(flr_id="INSIDE", begin_time=_dt("2024-06-10T01:00:00Z"), peak_time=_dt("2024-06-10T01:05:00Z"),
+                       end_time=_dt("2024-06-10T01:30:00Z"), class_type="C1.0"),
+            SolarFlare(flr_id="STRADDLE", begin_time=_dt("2024-06-09T23:50:00Z"), peak_time=_dt("2024-06-10T00:05:00Z"),
+                       end_time=_dt("2024-06-10T00:20:00Z"), class_type="M2.0"),
+            SolarFlare(flr_id="ONGOING", begin_time=_dt("2024-06-09T18:00:00Z"), peak_time=_dt("2024-06-09T18:30:00Z"),
+                       end_time=None, class_type="X1.0"),
+            SolarFlare(flr_id="BEFORE", begin_time=_dt("2024-06-08T00:00:00Z"), peak_time=_dt("2024-06-08T00:05:00Z"),
+                       end_time=_dt("2024-06-08T00:10:00Z"), class_type="B1.0"),
+        ])
+
+
+def test_overlap_mode_includes_straddling_and_ongoing(client, seed_straddling):
+    window = {"start_date": "2024-06-10T00:00:00", "end_date": "2024-06-10T23:59:59"}
+    contained = client.get("/api/solar-flares", params=window)
+    overlap = client.get("/api/solar-flares", params={**window, "mode": "overlap"})
+    assert [x["flr_id"] for x in contained.json()] == ["INSIDE"]
+    assert sorted(x["flr_id"] for x in overlap.json()) == ["INSIDE", "ONGOING", "STRADDLE"]
+
+    summary = client.get("/api/analysis/activity-summary", params={**window, "mode": "overlap"})
+    assert summary.json()["total_flares"] == 3
+
+
+def test_active_at_endpoint(client, seed_straddling):
+    r = client.get("/api/solar-flares/active", params={"at": "2024-06-10T00:10:00Z"})
+    assert r.status_code == 200
+    assert [x["flr_id"] for x in r.json()] == ["ONGOING", "STRADDLE"]
+    r = client.get("/api/solar-flares/active", params={"at": "2024-06-08T00:05:00"})
+    assert sorted(x["flr_id"] for x in r.json()) == ["BEFORE"]
+
+
+def test_flares_without_end_time_are_capped(client):
+    from common import db
+    from api.snapshot import FlareSnapshot
+    with db.DatabaseManager.session_scope() as s:
+        s.add(SolarFlare(flr_id="STALE", begin_time=datetime(1990, 1, 1), peak_time=datetime(1990, 1, 1, 0, 5),
+                         end_time=None, class_type="C1.0"))
+    window = {"start_date": "1990-01-02T00:00:00", "end_date": "1990-01-03T00:00:00", "mode": "overlap"}
+
+    active = client.get("/api/solar-flares/active", params={"at": "1990-01-01T06:00:00"})
+    assert [x["flr_id"] for x in active.json()] == ["STALE"]
+    assert client.get("/api/solar-flares/active", params={"at": "1990-01-02"}).json() == []
+    assert client.get("/api/solar-flares", params=window).json() == []
+
+    summary = client.get("/api/analysis/activity-summary", params=window).json()
+    FlareSnapshot.load()
+    try:
+        assert client.get("/api/analysis/activity-summary", params=window).json() == summary
+    finally:
+        FlareSnapshot.invalidate()
+    assert summary["total_flares"] == 0
+
+
+def test_interval_index_skips_probe_until_a_write(client, seed_straddling, test_engine):
+    from sqlalchemy import event
+    from common import db
+    from common.queries import FlareIntervalIndex
+
+    window = {"start_date": "2024-06-10T00:00:00", "end_date": "2024-06-10T23:59:59", "mode": "overlap"}
+    client.get("/api/solar-flares", params=window)
+    probes = []
+
+    def count_probes(conn, cursor, statement, *args):
+        if "count(solar_flares.id)" in statement:
+            probes.append(statement)
+
+    event.listen(test_engine, "before_cursor_execute", count_probes)
+    try:
+        client.get("/api/solar-flares", params=window)
+        assert probes == []  # no write since the last probe
+        with db.DatabaseManager.session_scope() as s:
+            s.add(SolarFlare(flr_id="LATE", begin_time=datetime(2024, 6, 10, 12), peak_time=datetime(2024, 6, 10, 12),
+                             class_type="C1.0"))
+        ids = [x["flr_id"] for x in client.get("/api/solar-flares", params=window).json()]
+        assert "LATE" in ids and len(probes) == 1
+    finally:
+        event.remove(test_engine, "before_cursor_execute", count_probes)
+    assert FlareIntervalIndex._tree is not None
+
+
+def test_overlap_filter_handles_large_matches(client):
+    from common import db
+    start = datetime(2023, 1, 1)
+    with db.DatabaseManager.session_scope() as s:
+        for i in range(2500):  # more ids than SQLite's default host parameter limit
+            begin = start + timedelta(minutes=i)
+            s.add(SolarFlare(flr_id=f"MANY-{i}", begin_time=begin, peak_time=begin,
+                             end_time=begin + timedelta(days=1), class_type="C1.0"))
+    r = client.get("/api/solar-flares", params={
+        "start_date": "2023-01-02T00:00:00", "end_date": "2023-01-02T01:00:00", "mode": "overlap", "format": "columns",
+    })
+    assert r.json()["count"] == 1501  # began by 01:00 on the 2nd
+
+
+def test_coalesced_compressed_responses_all_decode(client, monkeypatch):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from common import db
+    from api.endpoints import solar_flare
+    with db.DatabaseManager.session_scope() as s:
+        for i in range(50):
+            begin = datetime(2023, 1, 1) + timedelta(hours=i)
+            s.add(SolarFlare(flr_id=f"SHARED-{i}", begin_time=begin, peak_time=begin,
+                             end_time=begin + timedelta(minutes=30), class_type="C1.0"))
+
+    calls = []
+    columnar = solar_flare.columnar
+
+    def slow_columnar(rows, fields):
+        calls.append(1)
+        time.sleep(0.3)  # keep the leader in flight while the others arrive
+        return columnar(rows, fields)
+
+    monkeypatch.setattr(solar_flare, "columnar", slow_columnar)
+    params = {"start_date": "2023-01-01T00:00:00", "end_date": "2023-01-04T00:00:00", "format": "columns"}
+
+    def fetch(_):
+        return client.get("/api/solar-flares", params=params, headers={"Accept-Encoding": "gzip"})
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        responses = list(pool.map(fetch, range(6)))
+
+    assert len(calls) < 6  # some requests shared the leader's result
+    for r in responses:
+        assert r.headers["content-encoding"] == "gzip"
+        assert r.json()["count"] == 50  # a twice-compressed or mislabelled body wouldn't decode
+        assert "accept" in [v.strip().lower() for v in r.headers["vary"].split(",")]
+    assert "accept" in client.get("/api/solar-flares", params={**params, "format": "json"}).headers["vary"].lower()
+
+
+def test_bad_dates_are_400(client):
+    assert client.get("/api/solar-flares", params={"start_date": "yesterday"}).status_code == 400
+    assert client.get("/api/solar-flares/active", params={"at": "2024-13-01"}).status_code == 400
+    r = client.get("/api/analysis/peak-frequency", params={"start_date": "2024-01-01", "end_date": "nope"})
+    assert r.status_code == 400 and "end_date" in r.json()["detail"]
+
+    backwards = {"start_date": "2024-02-01T00:00:00", "end_date": "2024-01-01T00:00:00"}
+    for path in ("/api/solar-flares", "/api/analysis/activity-summary", "/api/analysis/rolling-rate"):
+        r = client.get(path, params={**backwards, "mode": "overlap"} if path == "/api/solar-flares" else backwards)
+        assert r.status_code == 400 and r.json()["detail"] == "start_date must not be after end_date", path
+
+
+def test_change_feed_returns_inserts_and_revisions(client, monkeypatch):
+    from data_collector.clients import NASAClient
+
+    def payload(n, end="2024-06-10T00:10Z"):
+        return {
+            "flrID": f"2024-06-10T00:0{n}:00-FLR-00{n}",
+            "beginTime": f"2024-06-10T00:0{n}Z",
+            "peakTime": "2024-06-10T00:05Z",
+            "endTime": end,
+            "classType": "C1.0",
+        }
+
+    nasa = NASAClient()
+    monkeypatch.setattr(nasa, "fetch_flare_data", lambda **kw: [payload(1), payload(2), payload(3)])
+    nasa.fetch_and_insert_solar_flares()
+
+    page1 = client.get("/api/solar-flares/changes", params={"limit": 2}).json()
+    assert [c["flr_id"] for c in page1["changes"]] == ["2024-06-10T00:01:00-FLR-001", "2024-06-10T00:02:00-FLR-002"]
+    assert page1["has_more"] is True
+    page2 = client.get("/api/solar-flares/changes", params={"since": page1["next_token"]}).json()
+    assert [c["flr_id"] for c in page2["changes"]] == ["2024-06-10T00:03:00-FLR-003"]
+    assert page2["has_more"] is False
+
+    # DONKI revises an endTime: only that flare shows up after the last token
+    monkeypatch.setattr(nasa, "fetch_flare_data", lambda **kw: [payload(1, end="2024-06-10T00:30Z"), payload(2)])
+    stats = nasa.fetch_and_insert_solar_flares()
+    assert stats["updated"] == 1 and stats["skipped"] == 1
+    page3 = client.get("/api/solar-flares/changes", params={"since": page2["next_token"]}).json()
+    assert [c["flr_id"] for c in page3["changes"]] == ["2024-06-10T00:01:00-FLR-001"]
+    assert page3["changes"][0]["end_time"] == "2024-06-10T00:30:00"
+
+    empty = client.get("/api/solar-flares/changes", params={"since": page3["next_token"]}).json()
+    assert empty == {"changes": [], "next_token": page3["next_token"], "has_more": False}
+    assert client.get("/api/solar-flares/changes", params={"since": "garbage!"}).status_code == 400
+
+
+def test_upgrade_schema_adds_and_backfills_columns():
+    from sqlalchemy import create_engine, inspect as sa_inspect, text
+
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE solar_flares (id INTEGER PRIMARY KEY, flr_id VARCHAR(50) NOT NULL UNIQUE, "
+            "begin_time DATETIME NOT NULL, peak_time DATETIME NOT NULL, end_time DATETIME, "
+            "class_type VARCHAR(5) NOT NULL, source_location VARCHAR(20), active_region_num INTEGER, linked_events JSON)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO solar_flares (id, flr_id, begin_time, peak_time, class_type) "
+            "VALUES (7, 'OLD', '2020-01-01 00:00:00', '2020-01-01 00:05:00', 'C1.0')"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO solar_flares (id, flr_id, begin_time, peak_time, class_type, source_location) "
+            "VALUES (8, 'LOC', '2020-01-02 00:00:00', '2020-01-02 00:05:00', 'M1.0', 'S05W10')"
+        )
+    RealDatabaseManager.upgrade_schema(engine)
+
+    columns = {c["name"] for c in sa_inspect(engine).get_columns("solar_flares")}
+    assert {"ingest_seq", "ingested_at", "latitude", "longitude"} <= columns
+    assert "ix_solar_flares_lat_lon" in {i["name"] for i in sa_inspect(engine).get_indexes("solar_flares")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT ingest_seq FROM solar_flares WHERE id = 7")).scalar() == 7
+        rows = conn.execute(text("SELECT id, latitude, longitude FROM solar_flares ORDER BY id")).all()
+    assert [tuple(row) for row in rows] == [(7, None, None), (8, -5.0, 10.0)]
+
+
+def test_backfill_coordinates_pages_past_unparseable_locations():
+    from sqlalchemy import create_engine, text
+    from common.db import _backfill_coordinates
+
+    engine = create_engine("sqlite://")
+    locations = ["N10E20", "junk", "junk", "S05W10", None, "N01W01", "junk"]
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE solar_flares (id INTEGER PRIMARY KEY, source_location VARCHAR(20), "
+                             "latitude FLOAT, longitude FLOAT)")
+        for row_id, location in enumerate(locations, 1):
+            conn.execute(text("INSERT INTO solar_flares (id, source_location) VALUES (:id, :loc)"),
+                         {"id": row_id, "loc": location})
+        _backfill_coordinates(conn, batch_size=2)  # the second page is all junk
+        rows = conn.execute(text("SELECT id, latitude, longitude FROM solar_flares ORDER BY id")).all()
+    assert [tuple(row) for row in rows if row[1] is not None] == [(1, 10.0, -20.0), (4, -5.0, 10.0), (6, 1.0, 1.0)]
+
+
+def test_scheduler_collects_each_type_into_its_table(db_session, monkeypatch):
+    from common.models.model import GeomagneticStorm
+    from data_collector.clients import NASAClient
+    from data_collector.donki import DonkiScheduler
+
+    calls = []
+    payloads = {
+        "FLR": [{"flrID": "2024-07-01T00:00:00-FLR-001", "beginTime": "2024-07-01T00:00Z",
+                 "peakTime": "2024-07-01T00:05Z", "classType": "M1.0"}],
+        "CME": [{"activityID": "2024-07-01T01:00:00-CME-001", "startTime": "2024-07-01T01:00Z"}],
+        "GST": [{"gstID": "2024-07-02T00:00:00-GST-001", "startTime": "2024-07-02T00:00Z",
+                 "allKpValues": [{"kpIndex": 6.0}]}],
+        "SEP": [],
+    }
+    client = NASAClient(rate_limiter=None)
+
+    def fake_get_data(url, params=None, raise_errors=False):
+        event_type = url.rsplit("/", 1)[-1]
+        calls.append((event_type, params["startDate"], params["endDate"]))
+        return [dict(p) for p in payloads[event_type]]
+
+    monkeypatch.setattr(client, "get_data", fake_get_data)
+    scheduler = DonkiScheduler(client, max_workers=1, window_days=1)  # tests share one session
+
+    results = scheduler.collect("2024-07-01", "2024-07-02")
+    assert len(calls) == 8  # 4 types x 2 one-day windows
+    assert results["CME"] == {"fetched": 2, "invalid": 0, "inserted": 1, "updated": 0, "skipped": 1}
+    assert results["SEP"]["fetched"] == 0
+    assert db_session.query(GeomagneticStorm).one().max_kp_index == 6.0
+
+    payloads["GST"][0]["allKpValues"].append({"kpIndex": 7.67})  # DONKI revises the storm
+    results = scheduler.collect("2024-07-02", "2024-07-02", event_types=["GST"])
+    assert results == {"GST": {"fetched": 1, "invalid": 0, "inserted": 0, "updated": 1, "skipped": 0}}
+    assert db_session.query(GeomagneticStorm).one().max_kp_index == 7.67
+
+@pytest.fixture
+def seed_onsets():
+    from common import db
+    onsets = [
+        ("W1", "2024-01-01T00:00:00Z", "C1.0"),
+        ("W2", "2024-01-01T01:00:00Z", "M1.0"),
+        ("W3", "2024-01-01T03:00:00Z", "C5.0"),
+        ("W4", "2024-01-02T03:00:00Z", "M5.5"),
+        ("W5", "2024-01-05T03:00:00Z", "X1.0"),
+    ]
+    with db.DatabaseManager.session_scope() as s:
+        s.query(SolarFlare).delete()
+        for flr_id, begin, class_type in onsets:
+            s.add(SolarFlare(flr_id=flr_id, begin_time=_dt(begin), peak_time=_dt(begin), class_type=class_type))
+
+def test_class_helpers():
+    from common.utils import class_to_flux, parse_class_type
+    assert parse_class_type("m2.5") == ("M", 2.5)
+    assert parse_class_type("X") == ("X", 1.0)
+    assert class_to_flux("X1.0") == pytest.approx(1e-4)
+    with pytest.raises(ValueError):
+        parse_class_type("Z1.0")
+
+def test_parse_source_location():
+    from common.utils import parse_source_location
+    assert parse_source_location("N12E34") == (12.0, -34.0)
+    assert parse_source_location("s05w90") == (-5.0, 90.0)
+    assert parse_source_location("") is None
+    assert parse_source_location("N95E10") is None
+
+def test_location_filters(client):
+    from common import db
+    from data_collector.clients import NASAClient
+    locations = {"CENTER": "N00E00", "NEAR": "N03W04", "LIMB": "S20W85", "NONE": None}
+    with db.DatabaseManager.session_scope() as s:
+        s.query(SolarFlare).delete()
+        for flr_id, location in locations.items():
+            s.add(NASAClient.map_nasa_payload_to_solar_flare({
+                "flrID": flr_id, "beginTime": "2024-03-01T00:00Z", "peakTime": "2024-03-01T00:05Z",
+                "endTime": "2024-03-01T00:10Z", "classType": "C1.0", "sourceLocation": location,
+            }))
+    window = {"start_date": "2024-03-01T00:00:00Z", "end_date": "2024-03-02T00:00:00Z"}
+
+    near = client.get("/api/solar-flares", params={**window, "near_lat": 0, "near_lon": 0, "within_deg": 5})
+    assert sorted(f["flr_id"] for f in near.json()) == ["CENTER", "NEAR"]
+    # NEAR is inside the search box but about 5 degrees away
+    tight = client.get("/api/solar-flares", params={**window, "near_lat": 0, "near_lon": 0, "within_deg": 4.5})
+    assert [f["flr_id"] for f in tight.json()] == ["CENTER"]
+
+    west = client.get("/api/solar-flares", params={**window, "min_lon": 45, "format": "columns"}).json()
+    assert west["columns"]["flr_id"] == ["LIMB"]
+    assert west["columns"]["latitude"] == [-20.0]
+
+    assert client.get("/api/solar-flares", params={**window, "near_lat": 0}).status_code == 400
+
+def test_waiting_times(client, seed_onsets):
+    params = {"start_date": "2024-01-01T00:00:00Z", "end_date": "2024-01-31T00:00:00Z"}
+    body = client.get("/api/analysis/waiting-times", params=params).json()
+    assert body["count"] == 4
+    assert body["quantiles_seconds"]["p50"] == pytest.approx((7200 + 86400) / 2)
+    assert sum(body["histogram"]["counts"]) == 4
+
+    body = client.get("/api/analysis/waiting-times", params={**params, "min_class": "M5"}).json()
+    assert body["count"] == 1
+    assert body["mean_seconds"] == 3 * 86400  # M5.5 -> X1.0
+
+    r = client.get("/api/analysis/waiting-times", params={**params, "min_class": "Q"})
+    assert r.status_code == 400
+
+def test_class_threshold_guards_non_numeric_classes():
+    from sqlalchemy import select
+    from sqlalchemy.dialects import postgresql
+    from common import db
+    from common.queries import class_threshold_filter
+    sql = str(select(SolarFlare.id).where(class_threshold_filter("M5")).compile(dialect=postgresql.dialect()))
+    assert "CASE WHEN substr(solar_flares.class_type, 2) ~" in sql
+
+    with db.DatabaseManager.session_scope() as s:
+        s.query(SolarFlare).delete()
+        for flr_id, class_type in (("BARE", "M"), ("EMPTY", ""), ("STRONG", "M6.0")):
+            s.add(SolarFlare(flr_id=flr_id, class_type=class_type,
+                             begin_time=datetime(2024, 1, 1), peak_time=datetime(2024, 1, 1)))
+    with db.DatabaseManager.session_scope() as s:
+        assert [f.flr_id for f in s.query(SolarFlare).filter(class_threshold_filter("M5"))] == ["STRONG"]
+
+def test_rolling_rate(client, seed_onsets):
+    body = client.get("/api/analysis/rolling-rate", params={
+        "start_date": "2024-01-02T00:00:00Z", "end_date": "2024-01-05T23:59:59Z", "window_days": 2,
+    }).json()
+    series = body["series"]
+    assert [p["date"] for p in series] == ["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"]
+    assert [p["count"] for p in series] == [1, 0, 0, 1]
+    # the first window reaches back into Jan 1st's three flares
+    assert [p["rolling_count"] for p in series] == [4, 1, 0, 1]
+    assert body["max_rate_per_day"] == 2.0
+
+def test_region_summaries_follow_ingest_and_revisions(client, monkeypatch):
+    from common import db
+    from common.models.model import ActiveRegionSummary
+    from common.regions import rebuild_region_summaries
+    from data_collector.clients import NASAClient
+
+    with db.DatabaseManager.session_scope() as s:
+        s.query(SolarFlare).delete()
+        s.query(ActiveRegionSummary).delete()
+
+    def flare(n, region, class_type, day):
+        return {"flrID": f"2024-08-{day:02d}T00:00:00-FLR-{n:03d}", "beginTime": f"2024-08-{day:02d}T00:00Z",
+                "peakTime": f"2024-08-{day:02d}T00:05Z", "classType": class_type, "activeRegionNum": region}
+
+    payloads = [flare(1, 100, "C1.0", 1), flare(2, 100, "X2.0", 2), flare(3, 100, "X10", 3), flare(4, 200, "M1.0", 4)]
+    nasa = NASAClient(rate_limiter=None)
+    monkeypatch.setattr(nasa, "fetch_flare_data", lambda **kw: [dict(p) for p in payloads])
+    nasa.fetch_and_insert_solar_flares()
+
+    body = client.get("/api/analysis/regions").json()
+    assert body["total"] == 2
+    top = body["regions"][0]
+    assert top["active_region_num"] == 100 and top["flare_count"] == 3
+    assert top["class_counts"]["X"] == 2 and top["strongest_class"] == "X10"
+
+    # DONKI reassigns the X10 flare to region 200
+    payloads[2]["activeRegionNum"] = 200
+    nasa.fetch_and_insert_solar_flares()
+    regions = client.get("/api/analysis/regions", params={"sort_by": "strongest_flux"}).json()["regions"]
+    assert [(r["active_region_num"], r["flare_count"], r["strongest_class"]) for r in regions] == [
+        (200, 2, "X10"), (100, 2, "X2.0"),
+    ]
+
+    page = client.get("/api/analysis/regions", params={
+        "sort_by": "active_region_num", "order": "asc", "limit": 1, "offset": 1,
+    }).json()
+    assert [r["active_region_num"] for r in page["regions"]] == [200]
+
+    incremental = client.get("/api/analysis/regions").json()["regions"]
+    with db.DatabaseManager.session_scope() as s:
+        rebuild_region_summaries(s)
+    assert client.get("/api/analysis/regions").json()["regions"] == incremental
+
+def test_listing_in_columnar_and_msgpack_formats(client, seed_three):
+    import msgpack
+
+    r = client.get("/api/solar-flares", headers={"Accept": "application/vnd.solarimpact.columns+json"})
+    assert r.headers["content-type"].startswith("application/vnd.solarimpact.columns+json")
+    body = r.json()
+    assert body["count"] == 3
+    assert body["columns"]["flr_id"] == ["A", "B", "C"]
+    assert body["columns"]["begin_time"][0] == 1717977600  # 2024-06-10T00:00:00Z
+
+    r = client.get("/api/solar-flares", params={"format": "msgpack"})
+    assert r.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(r.content)["columns"]["class_type"] == ["C1.0", "M1.0", "X1.0"]
+
+    r = client.get("/api/solar-flares/changes", headers={"Accept": "application/msgpack"})
+    changes = msgpack.unpackb(r.content)
+    assert changes["has_more"] is False and "next_token" in changes
+
+def test_large_listing_is_compressed(client, seed_three):
+    small = client.get("/api/solar-flares", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers  # three flares stay under the threshold
+
+    from common import db
+    with db.DatabaseManager.session_scope() as s:
+        for i in range(50):
+            s.add(SolarFlare(flr_id=f"BULK-{i}", begin_time=_dt("2024-06-12T00:00:00Z"),
+                             peak_time=_dt("2024-06-12T00:05:00Z"), class_type="C1.0"))
+    r = client.get("/api/solar-flares", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert int(r.headers["content-length"]) < len(r.content)
+    assert len(r.json()) == 53
+
+def test_collection_range_repolls_trailing_window_and_catches_up():
+    from common import db
+    from data_collector.scheduling import collection_range
+
+    now = datetime(2024, 6, 20, 12, 0, tzinfo=timezone.utc)
+    with db.DatabaseManager.session_scope() as s:
+        s.query(SolarFlare).delete()
+    assert collection_range(3, now=now) == ("2024-06-13", "2024-06-20")  # empty: last 7 days
+
+    with db.DatabaseManager.session_scope() as s:
+        s.add(SolarFlare(flr_id="RECENT", begin_time=datetime(2024, 6, 19), peak_time=datetime(2024, 6, 19),
+                         class_type="C1.0"))
+    assert collection_range(3, now=now) == ("2024-06-17", "2024-06-20")  # trailing re-poll
+
+    assert collection_range(3, now=now + timedelta(days=30)) == ("2024-06-19", "2024-07-20")  # downtime
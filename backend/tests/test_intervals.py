@@ -0,0 +1,34 @@
+import random
+from datetime import datetime, timedelta
+
+from common.intervals import IntervalTree
+
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(3)
+    base = datetime(2020, 1, 1)
+    intervals = []
+    for i in range(2000):
+        begin = base + timedelta(minutes=rng.randint(0, 50_000))
+        end = None if rng.random() < 0.02 else begin + timedelta(minutes=rng.randint(0, 600))
+        intervals.append((begin, end, i))
+    tree = IntervalTree(intervals)
+
+    for _ in range(200):
+        start = base + timedelta(minutes=rng.randint(0, 50_000))
+        stop = start + timedelta(minutes=rng.randint(0, 2_000))
+        expected = [v for b, e, v in sorted(intervals, key=lambda x: x[0])
+                    if b <= stop and (e is None or e >= start)]
+        assert sorted(tree.overlapping(start, stop)) == sorted(expected)
+
+
+def test_interval_tree_edges_and_open_ended():
+    t0 = datetime(2024, 1, 1)
+    tree = IntervalTree([
+        (t0, t0 + timedelta(hours=1), "a"),
+        (t0 + timedelta(hours=2), None, "ongoing"),
+    ])
+    assert tree.at(t0 + timedelta(hours=1)) == ["a"]  # closed interval
+    assert tree.at(t0 + timedelta(days=365)) == ["ongoing"]
+    assert tree.overlapping(t0 - timedelta(hours=1), t0 + timedelta(hours=3)) == ["a", "ongoing"]
+    assert IntervalTree([]).at(t0) == []
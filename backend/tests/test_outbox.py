@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+import pytest
+
+from common.models.model import CollectionOutbox
+from common.outbox import OutboxRelay, RabbitMQPublisher, _utcnow
+
+
+class FakePublisher:
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.sent = []
+
+    def publish(self, queue, message):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("broker unavailable")
+        self.sent.append((queue, message))
+
+    def close(self):
+        pass
+
+
+def _rows():
+    from common import db
+    with db.DatabaseManager.session_scope() as s:
+        return s.query(CollectionOutbox).order_by(CollectionOutbox.id).all()
+
+
+def test_trigger_writes_outbox_row_without_touching_rabbitmq(client, monkeypatch):
+    monkeypatch.setattr("pika.BlockingConnection", lambda *a, **kw: pytest.fail("connected to RabbitMQ inline"))
+    monkeypatch.setattr(RabbitMQPublisher, "publish", lambda *a, **kw: pytest.fail("published inline"))
+    r = client.post("/api/start-data-collection",
+                    json={"start_date": "2024-01-01T00:00:00Z", "end_date": "2024-01-31T00:00:00Z"})
+    assert r.status_code == 202
+    assert r.json()["status"] == "Data collection queued"
+
+    (row,) = _rows()
+    assert row.id == r.json()["outbox_id"]
+    assert row.queue == "data_collection_bulk" and row.published_at is None  # 31 days
+    assert row.payload["start_date"].startswith("2024-01-01")
+
+
+def test_trigger_routes_short_ranges_to_interactive_queue(client):
+    r = client.post("/api/start-data-collection",
+                    json={"start_date": "2024-01-01T00:00:00Z", "end_date": "2024-01-02T00:00:00Z"})
+    assert r.json()["queue"] == "data_collection_interactive"
+    assert _rows()[-1].queue == "data_collection_interactive"
+
+
+def test_relay_publishes_in_order_and_retries_after_failure(client):
+    for day in (1, 2, 3):
+        client.post("/api/start-data-collection",
+                    json={"start_date": f"2024-01-0{day}T00:00:00", "end_date": f"2024-01-0{day}T00:00:00"})
+
+    publisher = FakePublisher(fail=1)
+    relay = OutboxRelay(publisher=publisher)
+    assert relay.publish_pending() == 0  # broker down: first row pushed back, rest left alone
+    first = _rows()[0]
+    assert first.attempts == 1 and "broker unavailable" in first.last_error
+    assert first.available_at > _utcnow()
+
+    assert relay.publish_pending() == 2  # the other two are still due
+    from common import db
+    with db.DatabaseManager.session_scope() as s:
+        s.query(CollectionOutbox).update({CollectionOutbox.available_at: _utcnow() - timedelta(seconds=1)})
+    assert relay.publish_pending() == 1
+    assert [m["start_date"][:10] for _, m in publisher.sent] == ["2024-01-02", "2024-01-03", "2024-01-01"]
+    assert all(row.published_at is not None for row in _rows())
+    assert relay.publish_pending() == 0
+
+    assert relay.prune(older_than=timedelta(0)) == 3
+    assert _rows() == []
+
+
+def test_relay_clears_wakeup_before_publishing():
+    import time
+
+    class Relay(OutboxRelay):
+        calls = []
+
+        def publish_pending(self):
+            self.calls.append(OutboxRelay._wakeup.is_set())
+            if len(self.calls) == 1:
+                OutboxRelay.notify()  # a request committed while this batch was being published
+            else:
+                OutboxRelay.stop()
+            return 0
+
+    OutboxRelay.notify()  # left over from before the relay started
+    started = time.monotonic()
+    try:
+        Relay(publisher=FakePublisher()).run(poll_seconds=5)
+    finally:
+        OutboxRelay._stop.clear()
+        OutboxRelay._wakeup.clear()
+    assert Relay.calls == [False, False]
+    assert time.monotonic() - started < 5  # the mid-batch notify woke it right away
@@ -0,0 +1,108 @@
+from sqlalchemy.dialects import postgresql
+
+from common.models.model import SolarFlare
+from common.partitioning import NEW_TABLE, _index_ddl, partition_name
+from common.queries import RangeMode, apply_range_filter
+
+
+def test_partitioned_index_ddl():
+    ddl = _index_ddl(NEW_TABLE, "_new")
+    assert f"CREATE INDEX IF NOT EXISTS ix_solar_flares_flr_id_new ON {NEW_TABLE} (flr_id)" in ddl
+    assert any("ix_solar_flares_active_span_new" in s and "USING gist" in s for s in ddl)
+    assert partition_name(2024) == "solar_flares_y2024"
+
+
+def test_range_filters_bound_begin_time_for_pruning(db_session):
+    for mode in RangeMode:
+        query = apply_range_filter(db_session.query(SolarFlare), db_session,
+                                   "2024-01-01T00:00:00", "2024-02-01T00:00:00", mode)
+        sql = str(query.statement.compile(dialect=postgresql.dialect()))
+        assert "solar_flares.begin_time <=" in sql, mode
+
+
+class _Result:
+    def __init__(self, value):
+        self.value = value
+
+    def first(self):
+        return self.value
+
+    def one(self):
+        return self.value
+
+    def scalar(self):
+        return self.value
+
+
+class RecordingEngine:
+    """Stands in for a Postgres engine: records SQL and answers the migration's few queries."""
+    def __init__(self, partitioned=False, span=(2022, 2024, 25_000)):
+        self.partitioned = partitioned
+        self.span = span
+        self.statements = []
+
+    def begin(self):
+        return self
+
+    connect = begin
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def exec_driver_sql(self, sql):
+        self.statements.append(" ".join(sql.split()))
+
+    def execute(self, clause, params=None):
+        sql = str(clause)
+        if "pg_partitioned_table" in sql:
+            return _Result((1,) if self.partitioned else None)
+        if "EXTRACT(YEAR" in sql:
+            return _Result(self.span)
+        if "to_regclass" in sql:
+            return _Result(False)
+        if "MAX(id)" in sql:
+            return _Result(0)
+        raise AssertionError(f"unexpected query {sql}")
+
+
+def test_migrate_copies_in_batches_and_keeps_flr_id_unique():
+    from common.partitioning import FLR_ID_REGISTRY, migrate_to_partitioned
+
+    engine = RecordingEngine()
+    migrate_to_partitioned(engine, batch_size=10_000)
+    sql = engine.statements
+
+    assert sql[0].startswith(f"CREATE TABLE {NEW_TABLE} (LIKE solar_flares")
+    assert any(f"CREATE TABLE IF NOT EXISTS {partition_name(2022)} PARTITION OF {NEW_TABLE}" in s for s in sql)
+    # flr_id uniqueness across partitions: registry keyed on flr_id, trigger on the new table
+    assert f"CREATE TABLE IF NOT EXISTS {FLR_ID_REGISTRY} (flr_id varchar(50) PRIMARY KEY)" in sql
+    trigger = next(s for s in sql if s.startswith(f"CREATE TRIGGER {FLR_ID_REGISTRY}_trg"))
+    assert f"ON {NEW_TABLE}" in trigger and "AFTER INSERT OR DELETE OR UPDATE OF flr_id" in trigger
+
+    batches = [s for s in sql if s.startswith(f"INSERT INTO {NEW_TABLE} SELECT") and "id <=" in s]
+    assert len(batches) == 3  # 25k rows in 10k batches
+    lock = sql.index("LOCK TABLE solar_flares IN ACCESS EXCLUSIVE MODE")
+    assert sql.index(f"ALTER TABLE {NEW_TABLE} RENAME TO solar_flares") > lock
+    assert not any(s.startswith("DROP TABLE solar_flares_unpartitioned") for s in sql)
+
+
+def test_migrate_on_partitioned_table_only_installs_registry():
+    from common.partitioning import FLR_ID_REGISTRY, migrate_to_partitioned
+
+    engine = RecordingEngine(partitioned=True)
+    migrate_to_partitioned(engine)
+    assert any(s.startswith(f"CREATE TRIGGER {FLR_ID_REGISTRY}_trg") and "ON solar_flares " in s
+               for s in engine.statements)
+    assert not any("RENAME" in s or "LOCK" in s for s in engine.statements)
+
+
+def test_startup_hook_never_migrates(capsys):
+    from common.partitioning import ensure_partitioned
+
+    engine = RecordingEngine()
+    assert ensure_partitioned(engine) is False
+    assert engine.statements == []
+    assert "python -m common.partitioning migrate" in capsys.readouterr().out
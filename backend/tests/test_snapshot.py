@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from api.snapshot import FlareSnapshot
+from common.models.model import SolarFlare
+
+
+@pytest.fixture
+def seeded():
+    from common import db
+    classes = ["C1.0", "M2.5", "C1.0", "X1.0", "B5.0", "M2.5", "X10", "C3.3"]
+    with db.DatabaseManager.session_scope() as s:
+        s.query(SolarFlare).delete()
+        start = datetime(2024, 3, 1)
+        for i in range(40):
+            begin = start + timedelta(hours=7 * i)
+            s.add(SolarFlare(
+                flr_id=f"SNAP-{i:02d}", begin_time=begin, peak_time=begin + timedelta(minutes=5),
+                end_time=None if i % 13 == 5 else begin + timedelta(minutes=10 + 11 * (i % 7)),
+                class_type=classes[i % len(classes)], active_region_num=13600 + i % 3, ingest_seq=i + 1,
+            ))
+    yield
+    FlareSnapshot.invalidate()
+
+
+WINDOWS = [
+    {"start_date": "2024-03-02T00:00:00Z", "end_date": "2024-03-08T12:00:00Z"},
+    {"start_date": "2024-03-01T03:00:00", "end_date": "2024-03-12T00:00:00"},
+]
+CALLS = [
+    ("/api/analysis/peak-frequency", {"mode": "contained"}),
+    ("/api/analysis/peak-frequency", {"mode": "overlap"}),
+    ("/api/analysis/activity-summary", {"mode": "began"}),
+    ("/api/analysis/activity-summary", {"mode": "overlap"}),
+    ("/api/analysis/longest-flare", {"mode": "contained"}),
+    ("/api/analysis/longest-flare", {"mode": "overlap"}),
+    ("/api/analysis/waiting-times", {"min_class": "M"}),
+    ("/api/analysis/waiting-times", {"bins": 5}),
+    ("/api/analysis/rolling-rate", {"window_days": 3, "min_class": "C2"}),
+    ("/api/analysis/waiting-times", {"min_class": "M2.5"}),
+    ("/api/analysis/waiting-times", {"min_class": "X"}),
+    ("/api/analysis/rolling-rate", {"window_days": 3, "min_class": "C3.3"}),
+]
+
+
+def test_snapshot_answers_match_database(client, seeded):
+    from_db = [client.get(path, params={**window, **extra}).json() for window in WINDOWS for path, extra in CALLS]
+
+    FlareSnapshot.load()
+    from_snapshot = [client.get(path, params={**window, **extra}).json() for window in WINDOWS for path, extra in CALLS]
+    assert from_snapshot == from_db
+
+
+def test_min_class_below_magnitude_one_is_rejected_on_both_paths(client, seeded):
+    window = WINDOWS[0]
+    for snapshot in (False, True):
+        if snapshot:
+            FlareSnapshot.load()
+        for min_class in ("X0", "M0.5", "M15", "Cnan"):
+            for path in ("/api/analysis/waiting-times", "/api/analysis/rolling-rate"):
+                r = client.get(path, params={**window, "min_class": min_class})
+                assert r.status_code == 400, (snapshot, path, min_class)
+
+
+def test_activity_summary_ties_go_to_the_earliest_class(client):
+    from common import db
+    with db.DatabaseManager.session_scope() as s:
+        # Inserted latest-first, so insertion (and likely scan) order disagrees with begin order
+        for flr_id, day, class_type in (("TIE-3", 4, "C1.0"), ("TIE-2", 3, "M1.0"), ("TIE-1", 2, "M1.0"),
+                                        ("TIE-0", 1, "C1.0")):
+            begin = datetime(2024, 5, day)
+            s.add(SolarFlare(flr_id=flr_id, begin_time=begin, peak_time=begin, class_type=class_type))
+    params = {"start_date": "2024-05-01T00:00:00", "end_date": "2024-05-31T00:00:00"}
+    try:
+        for snapshot in (False, True):
+            if snapshot:
+                FlareSnapshot.load()
+            body = client.get("/api/analysis/activity-summary", params=params).json()
+            assert body["peak_intensity_class"] == "C1.0", snapshot
+            assert list(body["intensity_counts"]) == ["C1.0", "M1.0"], snapshot
+    finally:
+        FlareSnapshot.invalidate()
+
+
+def test_snapshot_refreshes_incrementally(client, seeded, monkeypatch):
+    from data_collector.clients import NASAClient
+
+    snapshot = FlareSnapshot.load()
+    assert len(snapshot) == 40 and snapshot.max_seq == 40
+    assert FlareSnapshot.refresh() is snapshot  # nothing new
+
+    revised = {"flrID": "SNAP-00", "beginTime": "2024-03-01T00:00Z", "peakTime": "2024-03-01T00:05Z",
+               "endTime": "2024-03-01T09:00Z", "classType": "X9.9"}
+    new = {"flrID": "SNAP-NEW", "beginTime": "2024-03-20T00:00Z", "peakTime": "2024-03-20T00:05Z",
+           "classType": "A1.0"}
+    nasa = NASAClient(rate_limiter=None)
+    monkeypatch.setattr(nasa, "fetch_flare_data", lambda **kw: [revised, new])
+    nasa.fetch_and_insert_solar_flares()
+
+    monkeypatch.setattr(FlareSnapshot, "load", lambda: pytest.fail("expected an incremental refresh"))
+    refreshed = FlareSnapshot.refresh()
+    assert len(refreshed) == 41 and refreshed.max_seq == 42
+    first = refreshed.select(end_date="2024-03-01T00:00:00", mode="began")
+    assert refreshed.class_names[refreshed.class_codes[first[0]]] == "X9.9"
+    assert "A1.0" in refreshed.class_names
+
+    window = {"start_date": "2024-03-01T00:00:00", "end_date": "2024-03-31T00:00:00"}
+    longest = client.get("/api/analysis/longest-flare", params=window).json()
+    assert longest == {"flr_id": "SNAP-00", "duration_seconds": 9 * 3600.0, "class_type": "X9.9"}
+
+
+def test_snapshot_reloads_after_deletes(seeded):
+    from common import db
+
+    FlareSnapshot.load()
+    with db.DatabaseManager.session_scope() as s:
+        s.query(SolarFlare).filter(SolarFlare.flr_id == "SNAP-39").delete()
+    assert len(FlareSnapshot.refresh()) == 39
+
+
+def test_stop_joins_the_refresh_thread(seeded):
+    FlareSnapshot.start(interval=0.01)
+    thread = FlareSnapshot._thread
+    FlareSnapshot.stop()
+    assert not thread.is_alive()
+    assert FlareSnapshot._thread is None